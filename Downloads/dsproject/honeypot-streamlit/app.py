@@ -1,12 +1,21 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
-import json
 import os
+import shutil
+import tempfile
 from pathlib import Path
-import time
+
+from config.settings import (
+    EXPORT_DIR, EXPORT_DOWNLOAD_MAX_BYTES, EXPORT_RETENTION_HOURS, REFRESH_INTERVAL_SECONDS
+)
+from utils.data_processor import parse_timestamp
+from utils.export import EventExport, available_formats, compressions, prune_exports
+from utils.live_counters import get_counters
+from utils.live_feed import LiveFeed
+from utils.rollups import get_rollups
+from utils.system_metrics import format_bytes
 
 # Page configuration
 st.set_page_config(
@@ -51,85 +60,31 @@ if 'last_update' not in st.session_state:
     st.session_state.last_update = datetime.now()
 
 # Helper functions
-def load_logs(log_file='logs/honeypot.log', max_lines=10000):
-    """Load and parse log files"""
-    events = []
-    
-    if not os.path.exists(log_file):
-        return pd.DataFrame()
-    
-    try:
-        with open(log_file, 'r') as f:
-            lines = f.readlines()
-            recent_lines = lines[-max_lines:] if len(lines) > max_lines else lines
-            
-            for line in recent_lines:
-                try:
-                    event = json.loads(line.strip())
-                    events.append(event)
-                except:
-                    continue
-        
-        if events:
-            df = pd.DataFrame(events)
-            if 'timestamp' in df.columns:
-                df['timestamp'] = pd.to_datetime(df['timestamp'])
-            return df
-        return pd.DataFrame()
-    except Exception as e:
-        st.error(f"Error loading logs: {e}")
-        return pd.DataFrame()
+def attacks_last_hour():
+    """Events in the last hour, from the live counters when a honeypot writes them"""
+    live = get_counters()
+    if live.available:
+        return live.count(3600)
+    return get_rollups().total(start=datetime.now() - timedelta(hours=1), exact=True)
 
-def get_stats(df):
-    """Calculate statistics from dataframe"""
-    if df.empty:
-        return {
-            'total_attacks': 0,
-            'unique_ips': 0,
-            'unique_usernames': 0,
-            'success_rate': 0
-        }
-    
+def get_stats(feed):
+    """Calculate statistics from the live feed's rollup sketches"""
     return {
-        'total_attacks': len(df),
-        'unique_ips': df['source_ip'].nunique() if 'source_ip' in df.columns else 0,
-        'unique_usernames': df['username'].nunique() if 'username' in df.columns else 0,
-        'success_rate': 100.0
+        'total_attacks': feed.stats.count,
+        'unique_ips': feed.stats.unique['source_ip'].count(),
+        'unique_usernames': feed.stats.unique['username'].count(),
+        'success_rate': 100.0 if feed.stats.count else 0,
+        'attacks_last_hour': attacks_last_hour(),
+        'ips_today': feed.today.unique['source_ip'].count(),
+        'usernames_today': feed.today.unique['username'].count()
     }
 
-# Main page
-def main():
-    # Header
-    col1, col2, col3 = st.columns([1, 3, 1])
-    
-    with col2:
-        st.markdown("""
-        <div style='text-align: center; padding: 20px;'>
-            <h1 style='font-size: 3em; background: linear-gradient(90deg, #a78bfa, #ec4899); 
-                       -webkit-background-clip: text; -webkit-text-fill-color: transparent;'>
-                🛡️ Honeypot Security Analytics
-            </h1>
-            <p style='color: #9ca3af; font-size: 1.2em;'>Real-Time Threat Intelligence System</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    # Status indicator
-    col1, col2, col3 = st.columns([1, 2, 1])
-    with col2:
-        status_color = "🟢" if st.session_state.honeypot_running else "🔴"
-        status_text = "ACTIVE" if st.session_state.honeypot_running else "INACTIVE"
-        st.markdown(f"""
-        <div style='text-align: center; padding: 10px; background: rgba(16, 185, 129, 0.1); 
-                    border-radius: 10px; border: 1px solid rgba(16, 185, 129, 0.3);'>
-            <h3>{status_color} System Status: {status_text}</h3>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    st.markdown("---")
-    
-    # Load data
-    df = load_logs()
-    stats = get_stats(df)
+@st.fragment(run_every=REFRESH_INTERVAL_SECONDS)
+def live_view():
+    """Counters and recent activity, rerun on their own every refresh interval"""
+    feed = st.session_state.live_feed
+    feed.poll()
+    stats = get_stats(feed)
     
     # Metrics row
     st.markdown("### 📊 Quick Statistics")
@@ -139,7 +94,7 @@ def main():
         st.metric(
             label="🎯 Total Attacks",
             value=f"{stats['total_attacks']:,}",
-            delta="+23 last hour",
+            delta=f"+{stats['attacks_last_hour']:,} last hour",
             delta_color="inverse"
         )
     
@@ -147,14 +102,14 @@ def main():
         st.metric(
             label="🌍 Unique IPs",
             value=f"{stats['unique_ips']:,}",
-            delta="+5 new today"
+            delta=f"{stats['ips_today']:,} seen today"
         )
     
     with col3:
         st.metric(
             label="👤 Unique Usernames",
             value=f"{stats['unique_usernames']:,}",
-            delta="47 common"
+            delta=f"{stats['usernames_today']:,} tried today"
         )
     
     with col4:
@@ -169,25 +124,23 @@ def main():
     # Recent Activity
     st.markdown("### 🔥 Recent Attack Activity")
     
-    if not df.empty:
-        # Show last 10 attacks
-        recent_df = df.tail(10).sort_values('timestamp', ascending=False)
-        
-        for _, row in recent_df.iterrows():
-            time_ago = datetime.now() - row['timestamp']
-            minutes_ago = int(time_ago.total_seconds() / 60)
+    recent = feed.recent_events(10)
+    if recent:
+        for _, event in recent:
+            timestamp = parse_timestamp(event.get('timestamp'))
+            minutes_ago = int((datetime.now() - timestamp).total_seconds() / 60) if timestamp else 0
             
             col1, col2, col3, col4 = st.columns([1, 2, 2, 1])
             
             with col1:
                 st.markdown(f"**{minutes_ago}m ago**")
             with col2:
-                attack_type = row.get('type', 'unknown')
+                attack_type = event.get('type', 'unknown')
                 color = "#ef4444" if 'ssh' in attack_type else "#f59e0b"
                 st.markdown(f"<span style='color: {color}; font-weight: bold;'>{attack_type}</span>", 
                           unsafe_allow_html=True)
             with col3:
-                st.code(f"{row.get('source_ip', 'N/A')} → {row.get('username', 'N/A')}")
+                st.code(f"{event.get('source_ip', 'N/A')} → {event.get('username', 'N/A')}")
             with col4:
                 st.markdown("🛡️ **BLOCKED**")
             
@@ -195,6 +148,43 @@ def main():
     else:
         st.info("No attacks recorded yet. Start the honeypot services to begin monitoring.")
     
+    st.caption(f"Last updated: {feed.updated.strftime('%Y-%m-%d %H:%M:%S')}")
+
+# Main page
+def main():
+    # Header
+    col1, col2, col3 = st.columns([1, 3, 1])
+    
+    with col2:
+        st.markdown("""
+        <div style='text-align: center; padding: 20px;'>
+            <h1 style='font-size: 3em; background: linear-gradient(90deg, #a78bfa, #ec4899); 
+                       -webkit-background-clip: text; -webkit-text-fill-color: transparent;'>
+                🛡️ Honeypot Security Analytics
+            </h1>
+            <p style='color: #9ca3af; font-size: 1.2em;'>Real-Time Threat Intelligence System</p>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    # Status indicator
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col2:
+        status_color = "🟢" if st.session_state.honeypot_running else "🔴"
+        status_text = "ACTIVE" if st.session_state.honeypot_running else "INACTIVE"
+        st.markdown(f"""
+        <div style='text-align: center; padding: 10px; background: rgba(16, 185, 129, 0.1); 
+                    border-radius: 10px; border: 1px solid rgba(16, 185, 129, 0.3);'>
+            <h3>{status_color} System Status: {status_text}</h3>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    st.markdown("---")
+    
+    # Live counters and feed, refreshed from log deltas since the last seen event
+    if 'live_feed' not in st.session_state:
+        st.session_state.live_feed = LiveFeed(get_rollups())
+    live_view()
+    
     # Quick Actions
     st.markdown("### ⚡ Quick Actions")
     col1, col2, col3 = st.columns(3)
@@ -208,33 +198,70 @@ def main():
     with col2:
         if st.button("🔄 Refresh Data", use_container_width=True):
             st.session_state.last_update = datetime.now()
+            st.session_state.live_feed.seed()
             st.rerun()
     
     with col3:
-        if st.button("📥 Export Data", use_container_width=True):
-            if not df.empty:
-                csv = df.to_csv(index=False)
-                st.download_button(
-                    label="Download CSV",
-                    data=csv,
-                    file_name=f"honeypot_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                    mime="text/csv"
+        with st.popover("📥 Export Data", use_container_width=True):
+            export_format = st.selectbox("Format", available_formats(), format_func=str.upper)
+            export_compression = st.selectbox(
+                "Compression", compressions(export_format), format_func=lambda value: value or "none"
+            )
+            export_range = st.selectbox("Time Range", ["Last Hour", "Last 24 Hours", "Last Week", "All Time"], index=3)
+            export_type = st.selectbox("Attack Type", ["All"] + sorted(st.session_state.live_feed.stats.types))
+            export_ip = st.text_input("Source IP", placeholder="any").strip()
+            
+            if st.button("Export", use_container_width=True):
+                export = EventExport(
+                    export_format,
+                    export_compression,
+                    start={
+                        "Last Hour": datetime.now() - timedelta(hours=1),
+                        "Last 24 Hours": datetime.now() - timedelta(days=1),
+                        "Last Week": datetime.now() - timedelta(weeks=1),
+                    }.get(export_range),
+                    event_type=None if export_type == "All" else export_type,
+                    source_ip=export_ip
                 )
-            else:
-                st.warning("No data to export")
+                file_name = export.file_name(f"honeypot_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+                # Written to a temp file first: downloads are handed over and
+                # removed, only exports too large to download are kept
+                fd, temp_path = tempfile.mkstemp(suffix=os.path.splitext(file_name)[1])
+                os.close(fd)
+                try:
+                    with st.spinner("Exporting events..."):
+                        exported = export.write_to(temp_path)
+                    size = os.path.getsize(temp_path)
+                    
+                    if not exported:
+                        st.warning("No data to export")
+                    elif size <= EXPORT_DOWNLOAD_MAX_BYTES:
+                        with open(temp_path, 'rb') as f:
+                            data = f.read()
+                        st.download_button(
+                            label=f"Download {exported:,} events ({format_bytes(size)})",
+                            data=data,
+                            file_name=file_name,
+                            mime=export.mime_type
+                        )
+                    else:
+                        prune_exports()
+                        os.makedirs(EXPORT_DIR, exist_ok=True)
+                        path = os.path.join(EXPORT_DIR, file_name)
+                        shutil.move(temp_path, path)
+                        st.info(f"{exported:,} events ({format_bytes(size)}) written to `{path}`, "
+                                f"kept for {EXPORT_RETENTION_HOURS} hours")
+                finally:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
     
     # Footer
     st.markdown("---")
     st.markdown("""
     <div style='text-align: center; color: #6b7280; padding: 20px;'>
-        <p>Last updated: {}</p>
         <p>🛡️ Honeypot Security Analytics v1.0 | Built with Streamlit</p>
     </div>
-    """.format(datetime.now().strftime('%Y-%m-%d %H:%M:%S')), unsafe_allow_html=True)
-    
-    # Auto-refresh
-    time.sleep(5)
-    st.rerun()
+    """, unsafe_allow_html=True)
 
 if __name__ == "__main__":
     # Create necessary directories
@@ -56,18 +56,92 @@ WEBHOOK_URL = ""
 DB_TYPE = "json"  # json or sqlite
 DB_PATH = "data/honeypot.db"
 
+# Index Configuration
+INDEX_DIR = "data/index"
+INDEX_MAX_SEGMENTS = 8  # segments per tier before they are merged
+TIME_INDEX_STRIDE = 1000  # events per sparse timestamp index entry
+
+# Rollup Configuration
+ROLLUP_DIR = "data/rollups"
+HLL_PRECISION = 12  # ~1.6% standard error on unique counts
+EXACT_UNIQUE_WINDOW_HOURS = 1  # count exactly for windows up to this size
+TOP_K_CAPACITY = 100  # heavy-hitter counters kept per field and bucket
+WINDOW_CACHE_ENTRIES = 16  # merged windows kept per bucket store
+INTENSITY_DIR = "data/intensity"  # day-of-week x hour-of-day counts per type
+LOG_TIMEZONE = "UTC"  # zone of event timestamps without an offset
+HEATMAP_TIMEZONE = "UTC"  # zone the intensity heatmap is counted in
+NETWORK_ROLLUP_DIR = "data/networks"  # per-prefix and per-ASN counts
+CREDENTIAL_DIR = "data/credentials"  # username x password x source counts
+SESSION_DIR = "data/sessions"  # attacker sessions by hour of their start
+SESSION_GAP_SECONDS = 1800  # inactivity that ends a session
+CAMPAIGN_SIGNATURE_HASHES = 16  # MinHash values kept per session
+CAMPAIGN_BAND_HASHES = 4  # values that must all match to link two sessions
+CAMPAIGN_CACHE_ENTRIES = 16  # campaign labels and summaries kept across reruns
+QUANTILE_SKETCH_K = 200  # KLL compactor size (~1.7% rank error)
+
+# Live Counters Configuration
+LIVE_COUNTERS_DIR = "data/live"
+LIVE_SECOND_SLOTS = 3600  # per-second counters (last hour)
+LIVE_MINUTE_SLOTS = 1440  # per-minute counters (last day)
+
+# Log Processor Configuration
+PIPELINE_STATUS_FILE = "data/pipeline_status.json"
+PIPELINE_LOCK_FILE = "data/pipeline.lock"  # held by the process writing the stores
+PIPELINE_READ_BYTES = 4 * 1024 * 1024  # raw log bytes per batch
+PIPELINE_COMMIT_BYTES = 64 * 1024 * 1024  # flush sinks at least this often
+PIPELINE_POLL_SECONDS = 1
+
+# Binary Log Configuration
+BINARY_LOG_FILE = "logs/honeypot.evlog"
+BINARY_LOG_CHUNK_EVENTS = 65536  # events per length-prefixed chunk record
+
+# System Metrics Configuration
+METRICS_SAMPLE_SECONDS = 5  # background sampling interval
+METRICS_HISTORY_SAMPLES = 120  # samples kept for sparklines (10 minutes)
+STORAGE_DIRS = ["logs", "data"]  # counted in the storage size
+
+# API Configuration
+API_ENABLED = False
+API_HOST = "127.0.0.1"
+API_PORT = 5000
+API_KEY = ""  # required in the X-API-Key header when set
+API_CACHE_ENTRIES = 1024  # cached responses
+API_SYNC_SECONDS = 1  # reload the stores at most this often
+API_MAX_PAGE_SIZE = 1000
+API_PROFILE_EVENTS = 1000  # latest events summarized in an IP profile
+
 # Backup Configuration
 AUTO_BACKUP = False
 BACKUP_INTERVAL = "daily"  # hourly, daily, weekly, monthly
 BACKUP_DIR = "backups"
 
+# Export Configuration
+EXPORT_DIR = "data/exports"
+EXPORT_CHUNK_EVENTS = 50000  # events held in memory at once while exporting
+EXPORT_DOWNLOAD_MAX_BYTES = 50 * 1024 * 1024  # read into memory for download; larger exports stay on disk
+EXPORT_RETENTION_HOURS = 24  # exports left on disk are removed after this long
+
 # Analytics Configuration
 MAX_DISPLAY_RECORDS = 10000
 REFRESH_INTERVAL_SECONDS = 5
+LIVE_FEED_EVENTS = 20  # recent events kept per viewer
+FEED_PAGE_SIZE = 100  # events per page of the attack feed
+FEED_SCAN_EVENTS = 50000  # events examined at most per filtered page
 
 # GeoIP Configuration
-GEOIP_ENABLED = False
+GEOIP_ENABLED = True
 GEOIP_DATABASE = "data/GeoLite2-City.mmdb"
+GEOIP_ASN_DATABASE = "data/GeoLite2-ASN.mmdb"
+GEOIP_RANGES_DIR = "data/geo_ranges"  # .npy range table used when no MMDB is present
+GEOIP_LRU_SIZE = 65536  # resolved addresses kept in memory
+GEO_CACHE_FILE = "data/geo_cache.json"
+GEO_CACHE_MAX_ENTRIES = 500000
+GEO_CACHE_COMPACT_ENTRIES = 10000  # journal entries before compaction
+GEOIP_ENRICH_ON_INGEST = True  # store location fields on each logged event
+GEO_BIN_DIR = "data/geo_bins"
+GEO_BIN_PRECISION = 5  # geohash characters per stored cell (~5 km)
+GEO_MAP_MAX_POINTS = 2000  # markers sent to the map at most
+GEO_MAP_TOP_SOURCES = 25  # sources always plotted exactly
 
 # Experimental Features
 ML_DETECTION = False
@@ -77,6 +151,7 @@ THREAT_INTEL_INTEGRATION = False
 # UI Configuration
 THEME = "dark"
 CHART_COLOR_SCHEME = ["#ef4444", "#f59e0b", "#3b82f6", "#8b5cf6", "#10b981"]
+CHART_MAX_POINTS = 1000  # points per time-series trace, about a chart's pixel width
 
 # Service Control
 ENABLE_SSH_HONEYPOT = True
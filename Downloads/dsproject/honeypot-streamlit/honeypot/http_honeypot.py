@@ -1,9 +1,13 @@
 from flask import Flask, request, render_template_string, jsonify
-import json
 import logging
 from datetime import datetime
 import hashlib
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.logger import log_event
 
 app = Flask(__name__)
 
@@ -15,9 +19,13 @@ logging.basicConfig(
 
 def log_attack(attack_data):
     """Log attack to file"""
-    os.makedirs('logs', exist_ok=True)
-    with open('logs/honeypot.log', 'a') as f:
-        f.write(json.dumps(attack_data) + '\n')
+    log_event(attack_data)
+
+def request_size():
+    """Bytes of the request line, headers and body as received"""
+    line = len(request.method) + len(request.full_path.rstrip('?')) + len(request.environ.get('SERVER_PROTOCOL', 'HTTP/1.1')) + 4
+    headers = sum(len(name) + len(value) + 4 for name, value in request.headers.items())
+    return line + headers + 2 + (request.content_length or 0)
 
 # Fake login page HTML with modern design
 LOGIN_PAGE = """
@@ -246,6 +254,7 @@ def index():
         "path": request.path,
         "method": request.method,
         "user_agent": request.headers.get('User-Agent'),
+        "request_bytes": request_size(),
         "referer": request.headers.get('Referer', 'direct')
     }
     log_attack(attack_data)
@@ -269,6 +278,7 @@ def login():
         "password": password,
         "password_hash": hashlib.sha256(password.encode()).hexdigest(),
         "user_agent": request.headers.get('User-Agent'),
+        "request_bytes": request_size(),
         "referer": request.headers.get('Referer'),
         "method": request.method
     }
@@ -296,6 +306,7 @@ def common_paths():
         "path": request.path,
         "method": request.method,
         "user_agent": request.headers.get('User-Agent'),
+        "request_bytes": request_size(),
         "query_string": request.query_string.decode()
     }
     log_attack(attack_data)
@@ -314,6 +325,7 @@ def catch_all(path):
         "path": f"/{path}",
         "method": request.method,
         "user_agent": request.headers.get('User-Agent'),
+        "request_bytes": request_size(),
         "query_string": request.query_string.decode()
     }
     log_attack(attack_data)
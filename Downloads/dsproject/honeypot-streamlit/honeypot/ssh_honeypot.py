@@ -1,11 +1,15 @@
 import paramiko
 import socket
 import threading
-import json
 import logging
 from datetime import datetime
 import hashlib
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.logger import log_event
 
 # Configure logging
 logging.basicConfig(
@@ -70,9 +74,7 @@ class SSHHoneypot(paramiko.ServerInterface):
     
     def log_event(self, event):
         """Write event to log file"""
-        os.makedirs('logs', exist_ok=True)
-        with open('logs/honeypot.log', 'a') as f:
-            f.write(json.dumps(event) + '\n')
+        log_event(event)
 
 def generate_host_key():
     """Generate RSA host key for SSH server"""
@@ -129,8 +131,7 @@ def handle_connection(client_socket, client_addr):
                             "source_ip": client_addr[0],
                             "command": command
                         }
-                        with open('logs/honeypot.log', 'a') as f:
-                            f.write(json.dumps(event) + '\n')
+                        log_event(event)
                         logging.info(f"Command from {client_addr[0]}: {command}")
                     
                     command_buffer = b""
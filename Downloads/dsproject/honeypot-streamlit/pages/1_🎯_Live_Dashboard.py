@@ -3,8 +3,18 @@ import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
 from datetime import datetime, timedelta
-import json
-import os
+
+from config.settings import REFRESH_INTERVAL_SECONDS
+from utils.data_processor import events_to_frame, parse_timestamp, read_events_at
+from utils.event_feed import cursor_at, feed_page
+from utils.inverted_index import get_index
+from utils.live_counters import get_counters
+from utils.live_feed import LiveFeed
+from utils.networks import get_networks
+from utils.pipeline import sync_consumer
+from utils.rollups import get_rollups
+from utils.time_index import get_time_index
+from utils.visualizations import timeseries_trace
 
 st.set_page_config(page_title="Live Dashboard", page_icon="🎯", layout="wide")
 
@@ -21,24 +31,6 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def load_logs(log_file='logs/honeypot.log'):
-    """Load logs from file"""
-    events = []
-    if os.path.exists(log_file):
-        with open(log_file, 'r') as f:
-            for line in f:
-                try:
-                    events.append(json.loads(line.strip()))
-                except:
-                    continue
-    
-    if events:
-        df = pd.DataFrame(events)
-        if 'timestamp' in df.columns:
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-        return df
-    return pd.DataFrame()
-
 # Header
 st.markdown("""
 <div style='text-align: center; padding: 20px;'>
@@ -48,63 +40,102 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Load data
-df = load_logs()
+rollups = get_rollups()
+sync_consumer(rollups)
+live = get_counters()
+if 'live_feed' not in st.session_state:
+    st.session_state.live_feed = LiveFeed(rollups)
 
-# Real-time stats
-col1, col2, col3, col4, col5 = st.columns(5)
-
-if not df.empty:
-    with col1:
-        st.markdown("""
-        <div class='metric-card'>
-            <h3 style='color: #ef4444; margin: 0;'>🔥 Live Attacks</h3>
-            <h2 style='margin: 10px 0;'>{}</h2>
-            <p style='color: #9ca3af; margin: 0;'>Total Events</p>
-        </div>
-        """.format(len(df)), unsafe_allow_html=True)
+@st.fragment(run_every=REFRESH_INTERVAL_SECONDS)
+def live_stats():
+    """Stat cards and sparkline, updated from log deltas since the last seen event"""
+    feed = st.session_state.live_feed
+    feed.poll()
     
-    with col2:
-        unique_ips = df['source_ip'].nunique() if 'source_ip' in df.columns else 0
-        st.markdown("""
-        <div class='metric-card'>
-            <h3 style='color: #3b82f6; margin: 0;'>🌐 Source IPs</h3>
-            <h2 style='margin: 10px 0;'>{}</h2>
-            <p style='color: #9ca3af; margin: 0;'>Unique Addresses</p>
-        </div>
-        """.format(unique_ips), unsafe_allow_html=True)
+    # Real-time stats
+    col1, col2, col3, col4, col5 = st.columns(5)
     
-    with col3:
-        if 'timestamp' in df.columns:
-            last_hour = datetime.now() - timedelta(hours=1)
-            recent = len(df[df['timestamp'] > last_hour])
-        else:
-            recent = 0
-        st.markdown("""
-        <div class='metric-card'>
-            <h3 style='color: #f59e0b; margin: 0;'>⏰ Last Hour</h3>
-            <h2 style='margin: 10px 0;'>{}</h2>
-            <p style='color: #9ca3af; margin: 0;'>Recent Attacks</p>
-        </div>
-        """.format(recent), unsafe_allow_html=True)
-    
-    with col4:
-        attack_types = df['type'].nunique() if 'type' in df.columns else 0
-        st.markdown("""
-        <div class='metric-card'>
-            <h3 style='color: #8b5cf6; margin: 0;'>🎯 Attack Types</h3>
-            <h2 style='margin: 10px 0;'>{}</h2>
-            <p style='color: #9ca3af; margin: 0;'>Different Methods</p>
-        </div>
-        """.format(attack_types), unsafe_allow_html=True)
+    if feed.stats.count:
+        with col1:
+            st.markdown("""
+            <div class='metric-card'>
+                <h3 style='color: #ef4444; margin: 0;'>🔥 Live Attacks</h3>
+                <h2 style='margin: 10px 0;'>{}</h2>
+                <p style='color: #9ca3af; margin: 0;'>Total Events</p>
+            </div>
+            """.format(feed.stats.count), unsafe_allow_html=True)
+        
+        with col2:
+            unique_ips = feed.stats.unique['source_ip'].count()
+            st.markdown("""
+            <div class='metric-card'>
+                <h3 style='color: #3b82f6; margin: 0;'>🌐 Source IPs</h3>
+                <h2 style='margin: 10px 0;'>{}</h2>
+                <p style='color: #9ca3af; margin: 0;'>Unique Addresses</p>
+            </div>
+            """.format(unique_ips), unsafe_allow_html=True)
+        
+        with col3:
+            if live.available:
+                recent = live.count(3600)
+            else:
+                last_hour = datetime.now() - timedelta(hours=1)
+                recent = rollups.total(start=last_hour, exact=True)
+            st.markdown("""
+            <div class='metric-card'>
+                <h3 style='color: #f59e0b; margin: 0;'>⏰ Last Hour</h3>
+                <h2 style='margin: 10px 0;'>{}</h2>
+                <p style='color: #9ca3af; margin: 0;'>Recent Attacks</p>
+            </div>
+            """.format(recent), unsafe_allow_html=True)
+        
+        with col4:
+            attack_types = len(feed.stats.types)
+            st.markdown("""
+            <div class='metric-card'>
+                <h3 style='color: #8b5cf6; margin: 0;'>🎯 Attack Types</h3>
+                <h2 style='margin: 10px 0;'>{}</h2>
+                <p style='color: #9ca3af; margin: 0;'>Different Methods</p>
+            </div>
+            """.format(attack_types), unsafe_allow_html=True)
+        
+        with col5:
+            st.markdown("""
+            <div class='metric-card'>
+                <h3 style='color: #10b981; margin: 0;'>🛡️ Block Rate</h3>
+                <h2 style='margin: 10px 0;'>100%</h2>
+                <p style='color: #9ca3af; margin: 0;'>Success Rate</p>
+            </div>
+            """, unsafe_allow_html=True)
     
-    with col5:
-        st.markdown("""
-        <div class='metric-card'>
-            <h3 style='color: #10b981; margin: 0;'>🛡️ Block Rate</h3>
-            <h2 style='margin: 10px 0;'>100%</h2>
-            <p style='color: #9ca3af; margin: 0;'>Success Rate</p>
-        </div>
-        """, unsafe_allow_html=True)
+    # Per-minute sparkline from the live counters
+    if live.available:
+        per_minute = live.series('minute', 60)
+        minutes = pd.date_range(end=datetime.now().replace(second=0, microsecond=0), periods=60, freq='min')
+        
+        fig = go.Figure(timeseries_trace(
+            minutes,
+            per_minute,
+            mode='lines',
+            line=dict(color='#f59e0b', width=2),
+            fill='tozeroy',
+            fillcolor='rgba(245, 158, 11, 0.2)',
+            hovertemplate='%{x|%H:%M}: %{y} attacks<extra></extra>'
+        ))
+        
+        fig.update_layout(
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            font=dict(color='#e5e7eb'),
+            xaxis=dict(showgrid=False),
+            yaxis=dict(showgrid=False),
+            margin=dict(l=0, r=0, t=10, b=0),
+            height=120
+        )
+        
+        st.plotly_chart(fig, use_container_width=True)
+
+live_stats()
 
 st.markdown("---")
 
@@ -113,15 +144,12 @@ col1, col2 = st.columns(2)
 
 with col1:
     st.markdown("### 📈 Attack Timeline (Last 24 Hours)")
-    if not df.empty and 'timestamp' in df.columns:
-        # Prepare timeline data
-        df['hour'] = df['timestamp'].dt.floor('H')
-        timeline = df.groupby('hour').size().reset_index(name='attacks')
-        
+    timeline = rollups.hourly_counts()
+    if not timeline.empty:
         fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=timeline['hour'],
-            y=timeline['attacks'],
+        fig.add_trace(timeseries_trace(
+            timeline.index,
+            timeline.values,
             mode='lines+markers',
             name='Attacks',
             line=dict(color='#8b5cf6', width=3),
@@ -145,8 +173,8 @@ with col1:
 
 with col2:
     st.markdown("### 🔍 Attack Type Distribution")
-    if not df.empty and 'type' in df.columns:
-        type_counts = df['type'].value_counts()
+    type_counts = pd.Series(rollups.window().types, dtype='int64').sort_values(ascending=False)
+    if not type_counts.empty:
         
         colors = ['#ef4444', '#f59e0b', '#3b82f6', '#8b5cf6', '#10b981']
         
@@ -176,12 +204,11 @@ col1, col2 = st.columns(2)
 
 with col1:
     st.markdown("### 👤 Top Usernames Attempted")
-    if not df.empty and 'username' in df.columns:
-        top_users = df['username'].value_counts().head(10)
-        
+    top_users = rollups.top('username', 10)
+    if top_users:
         fig = go.Figure(go.Bar(
-            y=top_users.index,
-            x=top_users.values,
+            y=[user for user, _ in top_users],
+            x=[count for _, count in top_users],
             orientation='h',
             marker=dict(color='#3b82f6', line=dict(color='#1e40af', width=1))
         ))
@@ -201,12 +228,11 @@ with col1:
 
 with col2:
     st.markdown("### 🔑 Top Passwords Attempted")
-    if not df.empty and 'password' in df.columns:
-        top_pass = df['password'].value_counts().head(10)
-        
+    top_pass = rollups.top('password', 10)
+    if top_pass:
         fig = go.Figure(go.Bar(
-            y=top_pass.index,
-            x=top_pass.values,
+            y=[password for password, _ in top_pass],
+            x=[count for _, count in top_pass],
             orientation='h',
             marker=dict(color='#f59e0b', line=dict(color='#b45309', width=1))
         ))
@@ -224,31 +250,215 @@ with col2:
     else:
         st.info("No password data available yet")
 
+# Noisiest networks
+st.markdown("### 🕸️ Noisiest Networks")
+
+network_levels = {
+    "/24 Subnets": "/24",
+    "/16 Blocks": "/16",
+    "IPv6 /48 Prefixes": "/48",
+    "Autonomous Systems": "asn"
+}
+
+col1, col2 = st.columns([1, 3])
+with col1:
+    network_level = st.selectbox("Group Sources By", list(network_levels.keys()))
+    network_range = st.selectbox("Network Time Range", ["Last Hour", "Last 24 Hours", "Last Week", "All Time"], index=1)
+
+network_start = {
+    "Last Hour": datetime.now() - timedelta(hours=1),
+    "Last 24 Hours": datetime.now() - timedelta(days=1),
+    "Last Week": datetime.now() - timedelta(weeks=1),
+}.get(network_range)
+
+networks = get_networks()
+sync_consumer(networks)
+top_networks = networks.top(network_levels[network_level], 15, start=network_start)
+
+with col2:
+    if not top_networks.empty:
+        labels = top_networks['network']
+        if 'as_org' in top_networks.columns:
+            labels = labels + ' ' + top_networks['as_org'].fillna('')
+        
+        fig = go.Figure(go.Bar(
+            y=labels,
+            x=top_networks['attacks'],
+            orientation='h',
+            marker=dict(color='#ef4444', line=dict(color='#b91c1c', width=1)),
+            customdata=top_networks['share'] * 100,
+            hovertemplate='%{y}: %{x} attacks (%{customdata:.1f}%)<extra></extra>'
+        ))
+        
+        fig.update_layout(
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            font=dict(color='#e5e7eb'),
+            xaxis=dict(showgrid=True, gridcolor='rgba(75, 85, 99, 0.3)'),
+            yaxis=dict(showgrid=False, autorange='reversed'),
+            height=400
+        )
+        
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.info("No network data available for this range")
+
 # Recent attacks table
-st.markdown("### 🚨 Live Attack Feed")
-if not df.empty:
-    recent_df = df.tail(20).sort_values('timestamp', ascending=False)
+def move_feed(cursor, older=False):
+    """Move the feed to a cursor (None for the newest events), keeping the way back"""
+    history = st.session_state.setdefault('feed_history', [])
+    if older:
+        history.append(st.query_params.get('feed_before'))
+    elif cursor is None:
+        history.clear()
+    elif history:
+        history.pop()
+    if cursor:
+        st.query_params['feed_before'] = cursor
+    else:
+        st.query_params.pop('feed_before', None)
+
+@st.fragment(run_every=REFRESH_INTERVAL_SECONDS)
+def live_feed():
+    """Feed pages read with a keyset cursor kept in the URL; the newest page follows the log"""
+    st.markdown("### 🚨 Live Attack Feed")
+    params = st.query_params
+    history = st.session_state.setdefault('feed_history', [])
     
-    # Format for display
-    display_df = pd.DataFrame({
-        'Time': recent_df['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S') if 'timestamp' in recent_df.columns else 'N/A',
-        'Source IP': recent_df['source_ip'] if 'source_ip' in recent_df.columns else 'N/A',
-        'Type': recent_df['type'] if 'type' in recent_df.columns else 'N/A',
-        'Username': recent_df['username'] if 'username' in recent_df.columns else 'N/A',
-        'Status': '🛡️ BLOCKED'
-    })
+    types = ["All Types"] + sorted(st.session_state.live_feed.stats.types)
+    # Widgets start from the link's filters
+    if 'feed_type_filter' not in st.session_state:
+        st.session_state.feed_type_filter = params['feed_type'] if params.get('feed_type') in types else "All Types"
+        st.session_state.feed_ip_filter = params.get('feed_ip', '')
+        st.session_state.feed_user_filter = params.get('feed_user', '')
     
-    st.dataframe(
-        display_df,
-        use_container_width=True,
-        height=400
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        feed_type = st.selectbox("Feed Type", types, key='feed_type_filter')
+    with col2:
+        feed_ip = st.text_input("Feed Source IP", key='feed_ip_filter').strip()
+    with col3:
+        feed_user = st.text_input("Feed Username", key='feed_user_filter').strip()
+    with col4:
+        jump_to = st.text_input("Jump To", placeholder="YYYY-MM-DD HH:MM").strip()
+    
+    # Filters are part of the link; changing one starts again from the newest events
+    filters = {
+        'feed_type': feed_type if feed_type != "All Types" else '',
+        'feed_ip': feed_ip,
+        'feed_user': feed_user
+    }
+    if any(params.get(name, '') != value for name, value in filters.items()):
+        for name, value in filters.items():
+            if value:
+                params[name] = value
+            elif name in params:
+                del params[name]
+        params.pop('feed_before', None)
+        history.clear()
+    
+    if jump_to and st.session_state.get('feed_jump') != jump_to:
+        st.session_state.feed_jump = jump_to
+        jump_time = parse_timestamp(jump_to)
+        if jump_time is None:
+            st.warning(f"Could not parse '{jump_to}' as a date and time")
+        else:
+            sync_consumer(get_time_index())
+            cursor = cursor_at(jump_time)
+            if cursor:
+                params['feed_before'] = cursor
+            else:
+                params.pop('feed_before', None)
+            history.clear()
+    
+    if feed_ip or feed_user:
+        sync_consumer(get_index())
+    page, next_cursor = feed_page(
+        params.get('feed_before'),
+        event_type=filters['feed_type'] or None,
+        source_ip=feed_ip or None,
+        username=feed_user or None
     )
-else:
-    st.info("No attack data available. Start the honeypot to see live attacks.")
+    
+    if page:
+        recent_df = events_to_frame([event for _, event in page])
+        
+        # Format for display
+        display_df = pd.DataFrame({
+            'Event ID': [offset for offset, _ in page],
+            'Time': recent_df['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S') if 'timestamp' in recent_df.columns else 'N/A',
+            'Source IP': recent_df['source_ip'] if 'source_ip' in recent_df.columns else 'N/A',
+            'Type': recent_df['type'] if 'type' in recent_df.columns else 'N/A',
+            'Username': recent_df['username'] if 'username' in recent_df.columns else 'N/A',
+            'Status': '🛡️ BLOCKED'
+        })
+        
+        st.dataframe(
+            display_df,
+            use_container_width=True,
+            hide_index=True,
+            height=400
+        )
+    elif next_cursor:
+        st.info("No matching events in this stretch of the log - keep paging for older ones")
+    else:
+        st.info("No attack data available. Start the honeypot to see live attacks.")
+    
+    col1, col2, col3, col4 = st.columns([1, 1, 1, 3])
+    with col1:
+        st.button("⏮️ Newest", use_container_width=True, disabled='feed_before' not in params,
+                  on_click=move_feed, args=(None,))
+    with col2:
+        st.button("◀️ Newer", use_container_width=True, disabled='feed_before' not in params,
+                  on_click=move_feed, args=(history[-1] if history else None,))
+    with col3:
+        st.button("Older ▶️", use_container_width=True, disabled=next_cursor is None,
+                  on_click=move_feed, args=(next_cursor, True))
+    with col4:
+        if 'feed_before' in params:
+            st.caption("Viewing history - the page URL links to this position")
+        else:
+            st.caption(f"Following new events every {REFRESH_INTERVAL_SECONDS}s")
+
+live_feed()
+
+# Attacker drill-down
+st.markdown("### 🔎 Attacker Drill-Down")
+
+search_fields = {
+    "Source IP": "source_ip",
+    "Username": "username",
+    "Password": "password",
+    "HTTP Path": "path",
+    "Command Token": "command"
+}
+
+col1, col2 = st.columns([1, 3])
+with col1:
+    search_by = st.selectbox("Search By", list(search_fields.keys()))
+with col2:
+    search_value = st.text_input("Search Value", placeholder="e.g. 185.220.101.4, root, /wp-admin")
+
+if search_value:
+    index = get_index()
+    sync_consumer(index)
+    matches = index.lookup(search_fields[search_by], search_value.strip())
+    
+    if len(matches) > 0:
+        st.success(f"Found {len(matches):,} events")
+        results_df = events_to_frame(read_events_at(matches[-500:]))
+        st.dataframe(
+            results_df.sort_values('timestamp', ascending=False) if 'timestamp' in results_df.columns else results_df,
+            use_container_width=True,
+            height=400
+        )
+    else:
+        st.info(f"No events found for {search_by.lower()} '{search_value}'")
 
 # Auto refresh
 st.markdown("---")
 col1, col2, col3 = st.columns([1, 1, 1])
 with col2:
     if st.button("🔄 Refresh Dashboard", use_container_width=True):
+        st.session_state.live_feed.seed()
         st.rerun()
\ No newline at end of file
@@ -1,30 +1,21 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
 from datetime import datetime, timedelta
-import json
-import os
 from collections import Counter
 
-st.set_page_config(page_title="Analytics", page_icon="📊", layout="wide")
+from config.settings import HEATMAP_TIMEZONE
+from utils.credentials import CredentialMatrix, get_credentials
+from utils.event_query import load_events
+from utils.intensity import DAYS, get_intensity
+from utils.pipeline import sync_consumer
+from utils.rollups import get_rollups
+from utils.sessions import SessionTable, frame_distributions, get_sessions
+from utils.visualizations import timeseries_trace
 
-def load_logs():
-    events = []
-    if os.path.exists('logs/honeypot.log'):
-        with open('logs/honeypot.log', 'r') as f:
-            for line in f:
-                try:
-                    events.append(json.loads(line.strip()))
-                except:
-                    continue
-    
-    if events:
-        df = pd.DataFrame(events)
-        if 'timestamp' in df.columns:
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-        return df
-    return pd.DataFrame()
+st.set_page_config(page_title="Analytics", page_icon="📊", layout="wide")
 
 # Header
 st.markdown("""
@@ -34,15 +25,21 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-df = load_logs()
+rollups = get_rollups()
+sync_consumer(rollups)
+sessions = get_sessions()
+sync_consumer(sessions)
+
+# Merged once per render; All Time figures below are read from it
+all_time = rollups.window()
 
-if df.empty:
+if all_time.count == 0:
     st.warning("⚠️ No data available for analysis. Start the honeypot services first.")
     st.stop()
 
 # Time range selector
 st.markdown("### ⏰ Analysis Time Range")
-col1, col2, col3 = st.columns(3)
+col1, col2, col3, col4 = st.columns(4)
 
 with col1:
     time_range = st.selectbox(
@@ -50,16 +47,46 @@ with col1:
         ["Last Hour", "Last 6 Hours", "Last 24 Hours", "Last Week", "All Time"]
     )
 
+with col2:
+    attack_type = st.selectbox("Attack Type", ["All Types"] + sorted(all_time.types))
+
+with col3:
+    source_ip = st.text_input("Source IP", placeholder="any").strip()
+
+with col4:
+    username = st.text_input("Username", placeholder="any").strip()
+
 # Filter data based on time range
 now = datetime.now()
+window_start = None
 if time_range == "Last Hour":
-    df = df[df['timestamp'] > now - timedelta(hours=1)]
+    window_start = now - timedelta(hours=1)
 elif time_range == "Last 6 Hours":
-    df = df[df['timestamp'] > now - timedelta(hours=6)]
+    window_start = now - timedelta(hours=6)
 elif time_range == "Last 24 Hours":
-    df = df[df['timestamp'] > now - timedelta(days=1)]
+    window_start = now - timedelta(days=1)
 elif time_range == "Last Week":
-    df = df[df['timestamp'] > now - timedelta(weeks=1)]
+    window_start = now - timedelta(weeks=1)
+
+event_type = None if attack_type == "All Types" else attack_type
+filtered = bool(event_type or source_ip or username)
+
+if window_start is None and not (source_ip or username):
+    # All Time is answered from the ingest-time stores without reading events;
+    # a type filter narrows the hourly counts and the sessions
+    df = None
+    hourly = rollups.hourly_counts(event_type=event_type)
+    session_table = sessions.table()
+    if event_type:
+        session_table = session_table.with_type(event_type)
+else:
+    # Only the window's byte range (or the filters' index offsets) is read
+    df = load_events(start=window_start, event_type=event_type, source_ip=source_ip, username=username)
+    if df.empty or 'timestamp' not in df.columns:
+        hourly = pd.Series(dtype='int64')
+    else:
+        hourly = df.groupby(df['timestamp'].dt.floor('h')).size()
+    session_table = SessionTable.from_frame(df)
 
 # Key metrics
 st.markdown("---")
@@ -67,23 +94,40 @@ st.markdown("### 📈 Key Performance Indicators")
 
 col1, col2, col3, col4 = st.columns(4)
 
+def unique_count(field):
+    """Distinct values of a field in the loaded events, or estimated from the rollups"""
+    if df is None and event_type and field == 'source_ip':
+        return int(session_table.frame['source_ip'].nunique())
+    if df is None:
+        return all_time.unique[field].count()
+    return int(df[field].nunique()) if field in df.columns else 0
+
 with col1:
-    total_attacks = len(df)
+    total_attacks = int(hourly.sum())
     st.metric("Total Attacks", f"{total_attacks:,}")
 
 with col2:
-    unique_ips = df['source_ip'].nunique() if 'source_ip' in df.columns else 0
+    unique_ips = unique_count('source_ip')
     st.metric("Unique Sources", f"{unique_ips:,}")
 
 with col3:
-    if 'username' in df.columns:
-        unique_users = df['username'].nunique()
-    else:
-        unique_users = 0
-    st.metric("Username Attempts", f"{unique_users:,}")
+    unique_users = unique_count('username')
+    st.metric(
+        "Username Attempts",
+        f"{unique_users:,}",
+        help="Across all attack types; set a time range to count one type" if df is None and event_type else None
+    )
 
 with col4:
-    avg_per_hour = total_attacks / max(1, (df['timestamp'].max() - df['timestamp'].min()).total_seconds() / 3600) if not df.empty and 'timestamp' in df.columns else 0
+    if window_start is not None:
+        span = now - window_start
+    elif df is not None:
+        span = df['timestamp'].max() - df['timestamp'].min() if not df.empty and 'timestamp' in df.columns else timedelta(0)
+    else:
+        # First to last event, to the hour, from the rollups
+        active = hourly[hourly > 0].index
+        span = active.max() - active.min() if len(active) else timedelta(0)
+    avg_per_hour = total_attacks / max(1, span.total_seconds() / 3600)
     st.metric("Avg Attacks/Hour", f"{avg_per_hour:.1f}")
 
 st.markdown("---")
@@ -98,9 +142,8 @@ with tab1:
     
     with col1:
         # Hourly distribution
-        if 'timestamp' in df.columns:
-            df['hour'] = df['timestamp'].dt.hour
-            hourly_dist = df.groupby('hour').size().reset_index(name='count')
+        if not hourly.empty:
+            hourly_dist = hourly.groupby(hourly.index.hour).sum().rename_axis('hour').reset_index(name='count')
             
             fig = go.Figure()
             fig.add_trace(go.Bar(
@@ -129,14 +172,13 @@ with tab1:
     
     with col2:
         # Daily distribution
-        if 'timestamp' in df.columns:
-            df['date'] = df['timestamp'].dt.date
-            daily_dist = df.groupby('date').size().reset_index(name='count')
+        if not hourly.empty:
+            daily_dist = hourly.groupby(hourly.index.date).sum().rename_axis('date').reset_index(name='count')
             
             fig = go.Figure()
-            fig.add_trace(go.Scatter(
-                x=daily_dist['date'],
-                y=daily_dist['count'],
+            fig.add_trace(timeseries_trace(
+                daily_dist['date'],
+                daily_dist['count'],
                 mode='lines+markers',
                 line=dict(color='#8b5cf6', width=3),
                 marker=dict(size=10, color='#a78bfa'),
@@ -158,33 +200,40 @@ with tab1:
     
 # Heatmap
 st.markdown("#### 🔥 Attack Intensity Heatmap")
-if 'timestamp' in df.columns:
-    df['day_of_week'] = df['timestamp'].dt.day_name()
-    df['hour_of_day'] = df['timestamp'].dt.hour
-    
-    # Build pivot table
-    heatmap_data = df.pivot_table(
-        index='day_of_week',
-        columns='hour_of_day',
-        values='source_ip',  # or just count rows
-        aggfunc='count',
-        fill_value=0
+intensity = get_intensity()
+sync_consumer(intensity)
+
+if source_ip or username:
+    # The ingest-time matrix has no per-IP or per-user counts
+    heatmap_data = intensity.from_timestamps(df['timestamp']) if not df.empty else None
+elif intensity.types:
+    heatmap_types = ["All Types"] + intensity.types
+    heatmap_type = st.selectbox(
+        "Heatmap Attack Type",
+        heatmap_types,
+        index=heatmap_types.index(attack_type) if attack_type in heatmap_types else 0
     )
     
-    # Ensure correct day order
-    days_order = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-    heatmap_data = heatmap_data.reindex(days_order)
+    # Counted at ingest; a time range subtracts the hourly rollups outside it
+    heatmap_data = intensity.window(
+        rollups,
+        start=window_start,
+        event_type=None if heatmap_type == "All Types" else heatmap_type
+    )
+else:
+    heatmap_data = None
 
+if heatmap_data is not None:
     fig = px.imshow(
-        heatmap_data.values,
+        heatmap_data,
         labels=dict(x="Hour of Day", y="Day of Week", color="Attacks"),
-        x=heatmap_data.columns,
-        y=heatmap_data.index,
+        x=list(range(24)),
+        y=list(DAYS),
         color_continuous_scale="Viridis"
     )
     
     fig.update_layout(
-        title="Heatmap of Attack Intensity",
+        title=f"Heatmap of Attack Intensity ({HEATMAP_TIMEZONE})",
         xaxis=dict(side="top"),
         plot_bgcolor="rgba(0,0,0,0)",
         paper_bgcolor="rgba(0,0,0,0)",
@@ -193,3 +242,305 @@ if 'timestamp' in df.columns:
     )
     
     st.plotly_chart(fig, use_container_width=True)
+
+with tab2:
+    st.markdown("#### 🔑 Credential Pairs")
+    credentials = get_credentials()
+    sync_consumer(credentials)
+    
+    if df is None:
+        # All Time comes from the ingest-time store; only the newest hour is merged again
+        matrix = credentials.matrix()
+        if event_type:
+            st.caption("Credentials across all attack types; set a time range to filter by type")
+    else:
+        matrix = CredentialMatrix.from_frame(df)
+    
+    if matrix.attempts:
+        reused_pairs, reused_share = matrix.reuse()
+        
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Login Attempts", f"{matrix.attempts:,}")
+        with col2:
+            st.metric("Distinct Pairs", f"{len(matrix.pair_totals()[0]):,}")
+        with col3:
+            st.metric("Pairs Shared by 2+ Sources", f"{reused_pairs:,}", f"{reused_share * 100:.1f}% of attempts", delta_color="off")
+        with col4:
+            st.metric("Distinct Passwords", f"{matrix.distinct('password'):,}")
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            top_pairs = matrix.top_pairs(15)
+            fig = go.Figure(go.Bar(
+                y=top_pairs['username'] + ' : ' + top_pairs['password'],
+                x=top_pairs['attempts'],
+                orientation='h',
+                marker=dict(color='#8b5cf6', line=dict(color='#6d28d9', width=1)),
+                customdata=top_pairs['sources'],
+                hovertemplate='%{y}: %{x} attempts from %{customdata} sources<extra></extra>'
+            ))
+            
+            fig.update_layout(
+                title="Most Attempted Username : Password Pairs",
+                plot_bgcolor='rgba(0,0,0,0)',
+                paper_bgcolor='rgba(0,0,0,0)',
+                font=dict(color='#e5e7eb'),
+                xaxis=dict(showgrid=True, gridcolor='rgba(75, 85, 99, 0.3)'),
+                yaxis=dict(showgrid=False, autorange='reversed'),
+                height=450
+            )
+            
+            st.plotly_chart(fig, use_container_width=True)
+        
+        with col2:
+            spread_field = st.radio("Spread Across Sources", ["Usernames", "Passwords"], horizontal=True)
+            spread = matrix.spread('username' if spread_field == "Usernames" else 'password', 15)
+            
+            fig = go.Figure(go.Bar(
+                y=spread.iloc[:, 0].astype(str),
+                x=spread['sources'],
+                orientation='h',
+                marker=dict(color='#10b981', line=dict(color='#047857', width=1)),
+                customdata=spread[['attempts', 'share']].assign(share=spread['share'] * 100),
+                hovertemplate='%{y}: %{x} sources (%{customdata[1]:.1f}%), %{customdata[0]} attempts<extra></extra>'
+            ))
+            
+            fig.update_layout(
+                title=f"{spread_field} Tried From the Most Sources",
+                plot_bgcolor='rgba(0,0,0,0)',
+                paper_bgcolor='rgba(0,0,0,0)',
+                font=dict(color='#e5e7eb'),
+                xaxis=dict(showgrid=True, gridcolor='rgba(75, 85, 99, 0.3)'),
+                yaxis=dict(showgrid=False, autorange='reversed'),
+                height=400
+            )
+            
+            st.plotly_chart(fig, use_container_width=True)
+        
+        st.markdown("#### 📚 Dictionary Overlap")
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            overlap = matrix.overlap(15)
+            fig = px.imshow(
+                overlap.values,
+                labels=dict(x="Source", y="Source", color="Jaccard"),
+                x=list(overlap.columns),
+                y=list(overlap.index),
+                zmin=0,
+                zmax=1,
+                color_continuous_scale="Viridis"
+            )
+            
+            fig.update_layout(
+                title="Shared Pairs Between the Most Active Sources",
+                plot_bgcolor="rgba(0,0,0,0)",
+                paper_bgcolor="rgba(0,0,0,0)",
+                font=dict(color="#e5e7eb"),
+                height=450
+            )
+            
+            st.plotly_chart(fig, use_container_width=True)
+        
+        with col2:
+            coverage = matrix.coverage()
+            fig = go.Figure()
+            fig.add_trace(timeseries_trace(
+                np.arange(1, len(coverage) + 1),
+                coverage * 100,
+                mode='lines',
+                line=dict(color='#f59e0b', width=3),
+                fill='tozeroy',
+                fillcolor='rgba(245, 158, 11, 0.2)'
+            ))
+            
+            fig.update_layout(
+                title="Attempts Covered by the Most Common Pairs",
+                xaxis_title="Pairs (most common first)",
+                yaxis_title="% of Attempts",
+                xaxis_type="log",
+                plot_bgcolor='rgba(0,0,0,0)',
+                paper_bgcolor='rgba(0,0,0,0)',
+                font=dict(color='#e5e7eb'),
+                height=450
+            )
+            
+            st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.info("No credential attempts in this range")
+
+with tab3:
+    st.markdown("#### 🧭 Attacker Sessions")
+    if event_type and df is None:
+        st.caption(f"Sessions cut at ingest that include {event_type} events")
+    
+    if len(session_table):
+        campaign_labels = session_table.campaigns()
+        campaigns = session_table.campaign_summary()
+        durations = session_table.durations()
+        
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Sessions", f"{len(session_table):,}")
+        with col2:
+            st.metric("Median Session Length", f"{np.median(durations) / 60:.1f} min")
+        with col3:
+            st.metric("Median Events per Session", f"{np.median(session_table.frame['events']):.0f}")
+        with col4:
+            st.metric("Campaigns (2+ Sources)", f"{len(campaigns):,}")
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            fig = go.Figure(go.Histogram(
+                x=np.log10(np.maximum(durations, 1)),
+                nbinsx=40,
+                marker=dict(color='#8b5cf6', line=dict(color='#6d28d9', width=1))
+            ))
+            
+            fig.update_layout(
+                title="Session Length",
+                xaxis=dict(
+                    title="Duration",
+                    tickvals=[0, 1, np.log10(60), np.log10(600), np.log10(3600), np.log10(86400)],
+                    ticktext=["1s", "10s", "1m", "10m", "1h", "1d"]
+                ),
+                yaxis_title="Sessions",
+                plot_bgcolor='rgba(0,0,0,0)',
+                paper_bgcolor='rgba(0,0,0,0)',
+                font=dict(color='#e5e7eb'),
+                height=400
+            )
+            
+            st.plotly_chart(fig, use_container_width=True)
+        
+        with col2:
+            top_campaigns = campaigns.head(15)
+            fig = go.Figure(go.Bar(
+                y=[f"#{number} {tool}" for number, tool in zip(top_campaigns['campaign'], top_campaigns['tool'])],
+                x=top_campaigns['sources'],
+                orientation='h',
+                marker=dict(color='#ef4444', line=dict(color='#b91c1c', width=1)),
+                customdata=top_campaigns[['sessions', 'events']],
+                hovertemplate='%{y}: %{x} sources, %{customdata[0]} sessions, %{customdata[1]} events<extra></extra>'
+            ))
+            
+            fig.update_layout(
+                title="Largest Campaigns by Sources",
+                plot_bgcolor='rgba(0,0,0,0)',
+                paper_bgcolor='rgba(0,0,0,0)',
+                font=dict(color='#e5e7eb'),
+                xaxis=dict(showgrid=True, gridcolor='rgba(75, 85, 99, 0.3)'),
+                yaxis=dict(showgrid=False, autorange='reversed'),
+                height=400
+            )
+            
+            st.plotly_chart(fig, use_container_width=True)
+        
+        if not campaigns.empty:
+            st.markdown("#### 🕸️ Campaigns")
+            st.caption("Sessions with the same tool and cadence that tried overlapping credentials, paths or commands")
+            
+            # Sessions of the largest campaigns over time
+            shown = campaigns['campaign'].head(10).to_numpy()
+            rows = np.flatnonzero(np.isin(campaign_labels, shown))
+            timeline = session_table.frame.iloc[rows].assign(campaign=campaign_labels[rows])
+            fig = px.scatter(
+                timeline,
+                x=pd.to_datetime(timeline['start'], unit='us'),
+                y=timeline['campaign'].map(lambda number: f"#{number}"),
+                size=np.sqrt(timeline['events']),
+                color=timeline['campaign'].astype(str),
+                hover_data={'source_ip': True, 'events': True, 'tool': True}
+            )
+            
+            fig.update_layout(
+                title="Sessions of the Largest Campaigns",
+                xaxis_title="Session Start",
+                yaxis_title="Campaign",
+                showlegend=False,
+                plot_bgcolor='rgba(0,0,0,0)',
+                paper_bgcolor='rgba(0,0,0,0)',
+                font=dict(color='#e5e7eb'),
+                height=450
+            )
+            
+            st.plotly_chart(fig, use_container_width=True)
+            
+            st.dataframe(
+                campaigns.head(50).rename(columns={
+                    'campaign': 'Campaign', 'sessions': 'Sessions', 'sources': 'Sources',
+                    'events': 'Events', 'first_seen': 'First Seen', 'last_seen': 'Last Seen',
+                    'tool': 'Tool', 'types': 'Types', 'interval': 'Seconds Between Events'
+                }),
+                use_container_width=True,
+                hide_index=True
+            )
+    else:
+        st.info("No sessions in this range")
+
+with tab4:
+    st.markdown("#### 📐 Distributions")
+    
+    if filtered and df is not None:
+        # Per-source, per-user or per-type figures are computed from the loaded events
+        distributions = frame_distributions(df, session_table)
+        st.caption("From quantile sketches over the filtered events (about 1.7% rank error)")
+    else:
+        distributions = sessions.distributions(start=window_start)
+        st.caption("From quantile sketches kept per hour at ingest (about 1.7% rank error); ranges start on the hour and sessions count once closed"
+                   + ("; all attack types" if event_type else ""))
+    
+    labels = {
+        'interarrival': ("Time Between Attacks", "s"),
+        'source_interarrival': ("Time Between a Source's Attacks", "s"),
+        'session_length': ("Session Length", "s"),
+        'session_events': ("Events per Session", "events"),
+        'request_bytes': ("HTTP Request Size", "bytes"),
+    }
+    percentiles = [0.5, 0.9, 0.95, 0.99]
+    
+    summary = []
+    for name, (label, unit) in labels.items():
+        sketch = distributions[name]
+        if sketch.count:
+            summary.append([label, unit, sketch.count, sketch.min] + list(sketch.quantiles(percentiles)) + [sketch.max])
+    
+    if summary:
+        st.dataframe(
+            pd.DataFrame(summary, columns=["Statistic", "Unit", "Count", "Min", "p50", "p90", "p95", "p99", "Max"]),
+            use_container_width=True,
+            hide_index=True
+        )
+        
+        shown = [name for name in labels if distributions[name].count]
+        selected = st.selectbox("Distribution", shown, format_func=lambda name: labels[name][0])
+        ranks = np.linspace(0, 1, 201)
+        values = distributions[selected].quantiles(ranks)
+        
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(
+            x=values,
+            y=ranks * 100,
+            mode='lines',
+            line=dict(color='#06b6d4', width=3),
+            fill='tozeroy',
+            fillcolor='rgba(6, 182, 212, 0.2)'
+        ))
+        
+        fig.update_layout(
+            title=f"Cumulative Distribution of {labels[selected][0]}",
+            xaxis_title=labels[selected][1],
+            yaxis_title="% at or Below",
+            xaxis_type="log" if values[0] > 0 else "linear",
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            font=dict(color='#e5e7eb'),
+            height=450
+        )
+        
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.info("No events in this range")
@@ -1,48 +1,19 @@
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
-import json
-import os
 from collections import Counter
+from datetime import datetime, timedelta
+
+from config.settings import GEOIP_DATABASE, GEOIP_RANGES_DIR
+from utils.data_processor import load_logs
+from utils.geo_bins import get_geo_bins, marker_sizes
+from utils.geoip import fill_geo_columns, get_locator
+from utils.pipeline import sync_consumer
 
 st.set_page_config(page_title="Geographic Map", page_icon="🌍", layout="wide")
 
-def load_logs():
-    events = []
-    if os.path.exists('logs/honeypot.log'):
-        with open('logs/honeypot.log', 'r') as f:
-            for line in f:
-                try:
-                    events.append(json.loads(line.strip()))
-                except:
-                    continue
-    
-    if events:
-        df = pd.DataFrame(events)
-        if 'timestamp' in df.columns:
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-        return df
-    return pd.DataFrame()
-
-# Sample country mapping (in production, use a GeoIP database)
-def get_country_from_ip(ip):
-    """Mock function - in production use GeoIP2 or similar"""
-    # Common country codes for demonstration
-    ip_ranges = {
-        '185': 'Russia',
-        '192': 'United States',
-        '203': 'China',
-        '91': 'India',
-        '45': 'Brazil',
-        '103': 'Singapore',
-        '80': 'Germany',
-        '151': 'Australia',
-        '41': 'Switzerland',
-        '195': 'United Kingdom'
-    }
-    
-    prefix = ip.split('.')[0]
-    return ip_ranges.get(prefix, 'Unknown')
+# Geohash precision per map detail level (None lets the point budget decide)
+MAP_PRECISION = {'Auto': None, 'City': 5, 'Region': 3}
 
 # Header
 st.markdown("""
@@ -58,15 +29,48 @@ if df.empty:
     st.warning("⚠️ No data available. Start the honeypot services first.")
     st.stop()
 
-# Add country information
+if not get_locator().available:
+    st.info(
+        f"ℹ️ No GeoIP database found at `{GEOIP_DATABASE}` and no range table in `{GEOIP_RANGES_DIR}` "
+        "- only cached locations are shown."
+    )
+
+# One time range for the statistics and the map
+map_range = st.selectbox(
+    "Time Range",
+    ["Last Hour", "Last 24 Hours", "Last Week", "All Time"],
+    index=3
+)
+
+map_start = {
+    "Last Hour": datetime.now() - timedelta(hours=1),
+    "Last 24 Hours": datetime.now() - timedelta(days=1),
+    "Last Week": datetime.now() - timedelta(weeks=1),
+}.get(map_range)
+
+if map_start is not None and 'timestamp' in df.columns:
+    df = df[df['timestamp'] >= map_start]
+    if df.empty:
+        st.info(f"No attacks in the {map_range.lower()}")
+        st.stop()
+
+# Location fields are stored at ingest; older events are resolved here
 if 'source_ip' in df.columns:
-    df['country'] = df['source_ip'].apply(get_country_from_ip)
+    df = fill_geo_columns(df, ('country', 'country_code', 'lat', 'lon'))
 else:
     st.error("No source IP data available")
     st.stop()
 
-# Country statistics
-country_stats = df['country'].value_counts()
+# Country statistics in a single grouped pass
+country_details = df.groupby('country', observed=True, sort=False).agg(
+    attacks=('source_ip', 'size'),
+    unique_ips=('source_ip', 'nunique'),
+    lat=('lat', 'mean'),
+    lon=('lon', 'mean'),
+    code=('country_code', 'first'),
+).sort_values('attacks', ascending=False)
+country_details.index = country_details.index.astype(str)
+country_stats = country_details['attacks']
 
 # Metrics
 st.markdown("### 🌐 Global Statistics")
@@ -88,52 +92,76 @@ with col4:
 
 st.markdown("---")
 
-# World map (simplified choropleth)
-st.markdown("### 🗺️ Attack Heatmap by Country")
-
-# Country coordinates (sample data)
-country_coords = {
-    'United States': {'lat': 37.0902, 'lon': -95.7129, 'code': 'USA'},
-    'China': {'lat': 35.8617, 'lon': 104.1954, 'code': 'CHN'},
-    'Russia': {'lat': 61.5240, 'lon': 105.3188, 'code': 'RUS'},
-    'India': {'lat': 20.5937, 'lon': 78.9629, 'code': 'IND'},
-    'Brazil': {'lat': -14.2350, 'lon': -51.9253, 'code': 'BRA'},
-    'Germany': {'lat': 51.1657, 'lon': 10.4515, 'code': 'DEU'},
-    'United Kingdom': {'lat': 55.3781, 'lon': -3.4360, 'code': 'GBR'},
-    'Singapore': {'lat': 1.3521, 'lon': 103.8198, 'code': 'SGP'},
-    'Australia': {'lat': -25.2744, 'lon': 133.7751, 'code': 'AUS'},
-    'Switzerland': {'lat': 46.8182, 'lon': 8.2275, 'code': 'CHE'}
-}
+# World map
+st.markdown("### 🗺️ Attack Heatmap")
+
+map_detail = st.selectbox("Map Detail", ["Auto", "City", "Region", "Country"])
 
-# Prepare map data
+# Marker at the mean resolved location of each country's attackers
 map_data = []
-for country, count in country_stats.items():
-    if country in country_coords:
+for country, row in country_details.iterrows():
+    if pd.notna(row['lat']) and pd.notna(row['lon']):
         map_data.append({
             'country': country,
-            'lat': country_coords[country]['lat'],
-            'lon': country_coords[country]['lon'],
-            'attacks': count,
-            'code': country_coords[country]['code']
+            'lat': row['lat'],
+            'lon': row['lon'],
+            'attacks': row['attacks'],
+            'code': row['code']
         })
-    else:
+    elif country == "Unknown":
         # Fallback: place "Unknown" attacks at (0,0)
-        if country == "Unknown":
-            map_data.append({
-                'country': "Unknown",
-                'lat': 0,
-                'lon': 0,
-                'attacks': count,
-                'code': "UNK"
-            })
+        map_data.append({
+            'country': "Unknown",
+            'lat': 0,
+            'lon': 0,
+            'attacks': row['attacks'],
+            'code': "UNK"
+        })
 
 map_df = pd.DataFrame(map_data)
 
+# Binned cells plus exact top sources, precomputed per hour at ingest
+geo_bins = get_geo_bins()
+sync_consumer(geo_bins)
+cells, top_sources = geo_bins.map_points(start=map_start, precision=MAP_PRECISION.get(map_detail))
+top_sources = top_sources.dropna(subset=['lat', 'lon'])
+use_bins = map_detail != "Country" and not (cells.empty and top_sources.empty)
 
-if not map_df.empty:
-    # Create scatter map
-    fig = go.Figure()
-    
+fig = go.Figure()
+
+if use_bins:
+    fig.add_trace(go.Scattergeo(
+        lon=cells['lon'],
+        lat=cells['lat'],
+        text='Attacks: ' + cells['attacks'].astype(str),
+        mode='markers',
+        name='Attack density',
+        marker=dict(
+            size=marker_sizes(cells['attacks']),
+            color=cells['attacks'],
+            colorscale='Reds',
+            showscale=True,
+            colorbar=dict(title="Attacks"),
+            opacity=0.8,
+            line=dict(width=0.5, color='white')
+        ),
+        hoverinfo='text'
+    ))
+    fig.add_trace(go.Scattergeo(
+        lon=top_sources['lon'],
+        lat=top_sources['lat'],
+        text=top_sources['source_ip'] + '<br>Attacks: ' + top_sources['attacks'].astype(str),
+        mode='markers',
+        name=f'Top {len(top_sources)} sources',
+        marker=dict(
+            size=marker_sizes(top_sources['attacks'], smallest=8, largest=24),
+            color='#a78bfa',
+            symbol='diamond',
+            line=dict(width=1, color='white')
+        ),
+        hoverinfo='text'
+    ))
+elif not map_df.empty:
     # Add markers for each country
     fig.add_trace(go.Scattergeo(
         lon=map_df['lon'],
@@ -141,7 +169,7 @@ if not map_df.empty:
         text=map_df['country'] + '<br>Attacks: ' + map_df['attacks'].astype(str),
         mode='markers+text',
         marker=dict(
-            size=map_df['attacks'] / map_df['attacks'].max() * 50 + 10,
+            size=marker_sizes(map_df['attacks'], smallest=10, largest=60),
             color=map_df['attacks'],
             colorscale='Reds',
             showscale=True,
@@ -152,7 +180,8 @@ if not map_df.empty:
         textfont=dict(size=10, color='white'),
         hoverinfo='text'
     ))
-    
+
+if fig.data:
     fig.update_layout(
         geo=dict(
             projection_type='natural earth',
@@ -168,10 +197,16 @@ if not map_df.empty:
         paper_bgcolor='rgba(0,0,0,0)',
         font=dict(color='#e5e7eb'),
         height=600,
+        legend=dict(orientation='h', y=-0.05),
         title='Global Attack Distribution'
     )
     
     st.plotly_chart(fig, use_container_width=True)
+    if use_bins:
+        st.caption(
+            f"{len(cells):,} cells at geohash precision {int(cells['precision'].iloc[0]) if not cells.empty else '-'} "
+            f"plus the {len(top_sources)} most active sources plotted exactly"
+        )
 else:
     st.info("No geographic data available for mapping")
 
@@ -247,16 +282,16 @@ with col2:
 # Detailed country table
 st.markdown("### 📋 Detailed Country Statistics")
 
-country_details = pd.DataFrame({
-    'Rank': range(1, len(country_stats) + 1),
-    'Country': country_stats.index,
-    'Total Attacks': country_stats.values,
-    'Percentage': (country_stats.values / len(df) * 100).round(2),
-    'Unique IPs': [df[df['country'] == country]['source_ip'].nunique() for country in country_stats.index]
+country_table = pd.DataFrame({
+    'Rank': range(1, len(country_details) + 1),
+    'Country': country_details.index,
+    'Total Attacks': country_details['attacks'].values,
+    'Percentage': (country_details['attacks'].values / len(df) * 100).round(2),
+    'Unique IPs': country_details['unique_ips'].values
 })
 
 st.dataframe(
-    country_details,
+    country_table,
     use_container_width=True,
     height=400
 )
@@ -322,7 +357,7 @@ col1, col2, col3 = st.columns(3)
 
 with col1:
     if st.button("📥 Export Country Data", use_container_width=True):
-        csv = country_details.to_csv(index=False)
+        csv = country_table.to_csv(index=False)
         st.download_button(
             label="Download CSV",
             data=csv,
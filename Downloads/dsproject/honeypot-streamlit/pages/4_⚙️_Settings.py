@@ -2,9 +2,15 @@ import streamlit as st
 import json
 import os
 import subprocess
-import psutil
+import pandas as pd
+import plotly.graph_objects as go
 from datetime import datetime
 
+from config.settings import API_ENABLED, API_PORT, METRICS_SAMPLE_SECONDS
+from utils.pipeline import processor_status
+from utils.system_metrics import format_bytes, format_uptime, get_sampler
+from utils.visualizations import timeseries_trace
+
 st.set_page_config(page_title="Settings", page_icon="⚙️", layout="wide")
 
 # Header
@@ -38,6 +44,7 @@ def save_config(config):
         json.dump(config, f, indent=4)
 
 config = load_config()
+sampler = get_sampler()
 
 # Service Control
 st.markdown("### 🎛️ Service Control")
@@ -213,8 +220,9 @@ with tab4:
         compress_old_data = st.checkbox("Compress Old Data", value=True)
         
         st.markdown("##### Database")
-        db_size = "23.4 MB"
-        st.metric("Current Database Size", db_size)
+        sample = sampler.latest()
+        db_size = format_bytes(sample['storage']) if sample else "-"
+        st.metric("Current Database Size", db_size, help="Size of the logs and data directories")
         
         if st.button("🗜️ Optimize Database", use_container_width=True):
             st.info("Optimizing database...")
@@ -270,48 +278,99 @@ with col3:
 st.markdown("---")
 st.markdown("### 🖥️ System Information")
 
-col1, col2, col3, col4 = st.columns(4)
-
-with col1:
-    cpu_percent = psutil.cpu_percent(interval=1)
-    st.metric("CPU Usage", f"{cpu_percent}%")
-
-with col2:
-    memory = psutil.virtual_memory()
-    st.metric("Memory Usage", f"{memory.percent}%")
-
-with col3:
-    disk = psutil.disk_usage('/')
-    st.metric("Disk Usage", f"{disk.percent}%")
-
-with col4:
-    st.metric("Active Connections", "5")
-
-# Service Status
-st.markdown("### 📊 Service Status")
-
-services = [
-    {"name": "SSH Honeypot", "status": "Running" if ssh_enabled else "Stopped", "port": ssh_port, "uptime": "2h 34m"},
-    {"name": "HTTP Honeypot", "status": "Running" if http_enabled else "Stopped", "port": http_port, "uptime": "2h 34m"},
-    {"name": "Log Processor", "status": "Running", "port": "-", "uptime": "2h 34m"},
-    {"name": "Analytics Engine", "status": "Running", "port": "-", "uptime": "2h 34m"}
-]
-
-for service in services:
-    col1, col2, col3, col4 = st.columns([3, 2, 2, 2])
+def sparkline(times, values, color):
+    """Small line chart of a metric's recent history"""
+    fig = go.Figure(timeseries_trace(
+        pd.to_datetime(times, unit='s'),
+        values,
+        mode='lines',
+        line=dict(color=color, width=2),
+        fill='tozeroy',
+        hovertemplate='%{x|%H:%M:%S}: %{y}<extra></extra>'
+    ))
+    
+    fig.update_layout(
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        xaxis=dict(visible=False),
+        yaxis=dict(visible=False),
+        margin=dict(l=0, r=0, t=0, b=0),
+        height=60
+    )
+    
+    st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False})
+
+@st.fragment(run_every=METRICS_SAMPLE_SECONDS)
+def system_information():
+    """Latest sampled host and service metrics, read from the sampler's buffer"""
+    sample = sampler.latest()
+    if sample is None:
+        st.info("⏳ Collecting system metrics...")
+        return
+    
+    running = {name: stats for name, stats in sample['services'].items() if stats}
+    honeypots = ('SSH Honeypot', 'HTTP Honeypot')
+    connections = sum(running[name]['connections'] for name in honeypots if name in running)
+    
+    col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        status_color = "🟢" if service['status'] == "Running" else "🔴"
-        st.markdown(f"**{status_color} {service['name']}**")
+        st.metric("CPU Usage", f"{sample['cpu']}%")
+        sparkline(*sampler.history('cpu'), '#ef4444')
     
     with col2:
-        st.text(service['status'])
+        st.metric("Memory Usage", f"{sample['memory']}%")
+        sparkline(*sampler.history('memory'), '#3b82f6')
     
     with col3:
-        st.text(f"Port: {service['port']}")
+        st.metric("Disk Usage", f"{sample['disk']}%")
+        sparkline(*sampler.history('disk'), '#8b5cf6')
     
     with col4:
-        st.text(f"Uptime: {service['uptime']}")
+        st.metric("Active Connections", f"{connections:,}")
+        times, ssh = sampler.history('connections', 'SSH Honeypot')
+        _, http = sampler.history('connections', 'HTTP Honeypot')
+        sparkline(times, [(a or 0) + (b or 0) for a, b in zip(ssh, http)], '#10b981')
+    
+    # Service Status
+    st.markdown("### 📊 Service Status")
+    
+    ports = {'SSH Honeypot': ssh_port, 'HTTP Honeypot': http_port}
+    for name in sample['services']:
+        stats = running.get(name)
+        col1, col2, col3, col4, col5 = st.columns([3, 2, 2, 2, 3])
+        
+        with col1:
+            status_color = "🟢" if stats else "🔴"
+            st.markdown(f"**{status_color} {name}**")
+        
+        with col2:
+            st.text("Running" if stats else "Stopped")
+        
+        with col3:
+            st.text(f"Port: {ports.get(name, '-')}")
+        
+        with col4:
+            st.text(f"Uptime: {format_uptime(sample['time'] - stats['started']) if stats else '-'}")
+        
+        with col5:
+            if stats:
+                st.text(f"{format_bytes(stats['rss'])} | {stats['threads']} threads | {stats['sockets']} sockets")
+            else:
+                st.text("-")
+    
+    st.caption(f"Sampled every {METRICS_SAMPLE_SECONDS}s at {datetime.fromtimestamp(sample['time']).strftime('%H:%M:%S')}")
+
+system_information()
+
+processor = processor_status()
+if processor:
+    with st.expander("📈 Log Processor Pipeline"):
+        st.caption(f"Checkpoint: {processor['checkpoint']:,} bytes | Backlog: {processor['lag_bytes']:,} bytes")
+        st.dataframe(
+            [dict(stage=name, **metrics) for name, metrics in processor['stages'].items()],
+            use_container_width=True
+        )
 
 # Advanced Options
 with st.expander("🔬 Advanced Options"):
@@ -322,11 +381,13 @@ with st.expander("🔬 Advanced Options"):
     with col1:
         debug_mode = st.checkbox("Enable Debug Mode", value=False)
         verbose_logging = st.checkbox("Verbose Logging", value=False)
-        api_enabled = st.checkbox("Enable REST API", value=False)
+        api_enabled = st.checkbox("Enable REST API", value=API_ENABLED)
         
         if api_enabled:
             api_key = st.text_input("API Key", type="password")
-            api_port = st.number_input("API Port", min_value=1024, max_value=65535, value=5000)
+            api_port = st.number_input("API Port", min_value=1024, max_value=65535, value=API_PORT)
+            st.caption("Start the query API with:")
+            st.code(f"python scripts/api_server.py --port {api_port}" + (" --api-key <key>" if api_key else ""), language="bash")
     
     with col2:
         st.markdown("##### Experimental Features")
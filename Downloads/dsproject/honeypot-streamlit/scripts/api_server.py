@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""Query API service: serves cached analytics results as JSON"""
+import argparse
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.serving import WSGIRequestHandler
+
+from config.settings import API_HOST, API_KEY, API_PORT, LOG_DIR
+from utils.query_api import create_app
+
+os.makedirs(LOG_DIR, exist_ok=True)
+logging.basicConfig(
+    filename=os.path.join(LOG_DIR, 'api_server.log'),
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--host', default=API_HOST)
+    parser.add_argument('--port', type=int, default=API_PORT)
+    parser.add_argument('--api-key', default=os.environ.get('HONEYPOT_API_KEY', API_KEY),
+                        help="key clients send in X-API-Key (default: HONEYPOT_API_KEY or API_KEY)")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("QUERY API SERVICE")
+    print("=" * 60)
+    print(f"[+] Listening on http://{args.host}:{args.port}/api/v1")
+    if not args.api_key:
+        print("[!] No API key set - any local client can query the API")
+
+    app = create_app(api_key=args.api_key)
+    # Keep connections open between requests from the same client
+    WSGIRequestHandler.protocol_version = "HTTP/1.1"
+    app.run(host=args.host, port=args.port, debug=False, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
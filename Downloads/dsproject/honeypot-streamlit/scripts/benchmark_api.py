@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Load-test the query API with concurrent keep-alive clients"""
+import argparse
+import http.client
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+PATHS = [
+    '/api/v1/summary',
+    '/api/v1/summary?start={day_ago}',
+    '/api/v1/top/username?n=20',
+    '/api/v1/top/source_ip?n=20',
+    '/api/v1/networks/24?n=20',
+    '/api/v1/timeline?limit=168',
+    '/api/v1/events?limit=100',
+]
+
+
+def run_client(url, paths, requests, api_key, conditional, results):
+    """Issue `requests` GETs over one connection, recording latencies"""
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+    etags = {}
+    latencies = []
+    statuses = {}
+    for i in range(requests):
+        path = paths[i % len(paths)]
+        headers = {'X-API-Key': api_key} if api_key else {}
+        if conditional and path in etags:
+            headers['If-None-Match'] = etags[path]
+        started = time.perf_counter()
+        connection.request('GET', path, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - started)
+        statuses[response.status] = statuses.get(response.status, 0) + 1
+        if response.getheader('ETag'):
+            etags[path] = response.getheader('ETag')
+    connection.close()
+    results.append((latencies, statuses))
+
+
+def run_phase(label, url, paths, clients, requests, api_key, conditional=False):
+    results = []
+    threads = [
+        threading.Thread(target=run_client, args=(url, paths, requests, api_key, conditional, results))
+        for _ in range(clients)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for client, _ in results for latency in client)
+    statuses = {}
+    for _, client in results:
+        for status, count in client.items():
+            statuses[status] = statuses.get(status, 0) + count
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+    print(f"    {label:<14} {len(latencies) / elapsed:9.0f} req/s   "
+          f"p50 {statistics.median(latencies) * 1000:7.1f} ms   p95 {p95 * 1000:7.1f} ms   {statuses}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200, help="requests per client and phase")
+    parser.add_argument('--api-key', default='')
+    args = parser.parse_args()
+
+    day_ago = time.strftime('%Y-%m-%dT%H:00:00', time.gmtime(time.time() - 86400))
+    paths = [path.format(day_ago=day_ago) for path in PATHS]
+
+    print(f"[*] {args.clients} clients x {args.requests} requests against {args.url}")
+    # Every request of the first phase is a distinct query, so each one misses the cache
+    cold = [f"/api/v1/timeline?limit={n}" for n in range(1, args.clients * args.requests + 1)]
+    run_phase("uncached", args.url, cold, 1, min(len(cold), 200), args.api_key)
+    run_phase("cached", args.url, paths, args.clients, args.requests, args.api_key)
+    run_phase("conditional", args.url, paths, args.clients, args.requests, args.api_key, conditional=True)
+
+
+if __name__ == "__main__":
+    main()
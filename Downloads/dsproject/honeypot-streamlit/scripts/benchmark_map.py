@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Benchmark the Geographic Map page on a synthetic log of N events"""
+import argparse
+import glob
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+MAP_PAGE = glob.glob(os.path.join(PROJECT_DIR, 'pages', '3_*_Geographic_Map.py'))[0]
+
+
+def write_log(path, events, unique_ips):
+    """Write `events` synthetic attack events drawn from `unique_ips` addresses"""
+    random.seed(42)
+    ips = [
+        f"{random.randint(1, 223)}.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}"
+        for _ in range(unique_ips)
+    ]
+    start = datetime.utcnow() - timedelta(days=7)
+    step = timedelta(days=7) / events
+    with open(path, 'w') as f:
+        for i in range(events):
+            f.write(json.dumps({
+                "timestamp": (start + i * step).isoformat(),
+                "type": "ssh_attack",
+                "source_ip": random.choice(ips),
+                "username": "root",
+                "password": "123456",
+            }) + '\n')
+
+
+def timed(label, func):
+    started = time.perf_counter()
+    result = func()
+    print(f"    {label:<32} {time.perf_counter() - started:8.2f}s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=1_000_000)
+    parser.add_argument('--unique-ips', type=int, default=50_000)
+    parser.add_argument('--baseline', action='store_true',
+                        help="also time the old per-row lookup and per-country filtering")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='honeypot-bench-')
+    try:
+        os.makedirs(os.path.join(work_dir, 'logs'))
+        os.makedirs(os.path.join(work_dir, 'data'))
+        for database in glob.glob(os.path.join(PROJECT_DIR, 'data', '*.mmdb')):
+            shutil.copy(database, os.path.join(work_dir, 'data'))
+        os.chdir(work_dir)
+
+        print(f"[*] Writing {args.events:,} events from {args.unique_ips:,} addresses...")
+        write_log('logs/honeypot.log', args.events, args.unique_ips)
+
+        import pandas as pd
+        from streamlit.testing.v1 import AppTest
+        from utils.data_processor import load_logs
+        from utils.geoip import geo_columns, get_locator
+
+        print("[*] Components:")
+        df = timed("load_logs", load_logs)
+        columns = timed("geo_columns (cold)", lambda: geo_columns(df['source_ip'], ('country', 'lat', 'lon')))
+        columns = timed("geo_columns (warm)", lambda: geo_columns(df['source_ip'], ('country', 'lat', 'lon')))
+        df['country'] = columns['country']
+        timed("country aggregation", lambda: df.groupby('country', observed=True).agg(
+            attacks=('source_ip', 'size'), unique_ips=('source_ip', 'nunique')))
+
+        if args.baseline:
+            locator = get_locator()
+            countries = timed("baseline per-row lookup", lambda: df['source_ip'].apply(
+                lambda ip: locator.lookup(ip)['country']))
+            plain = pd.DataFrame({'source_ip': df['source_ip'], 'country': countries})
+            timed("baseline per-country filtering", lambda: [
+                plain[plain['country'] == country]['source_ip'].nunique()
+                for country in plain['country'].value_counts().index
+            ])
+
+        print("[*] Page render:")
+        for run in ('cold', 'warm'):
+            app = AppTest.from_file(MAP_PAGE, default_timeout=600)
+            timed(f"Geographic Map ({run})", app.run)
+            if app.exception:
+                print(f"[!] Page raised: {app.exception[0].value}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
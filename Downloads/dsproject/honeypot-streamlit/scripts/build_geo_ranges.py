@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""Build the NumPy IP range table used for geolocation without an MMDB database"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import GEOIP_RANGES_DIR
+from utils.geo_ranges import RANGE_FIELDS, build_range_table
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        epilog=f"CSV columns: start, end, {', '.join(RANGE_FIELDS)} (all but start, end and country optional)"
+    )
+    parser.add_argument('csv_file', help="CSV file of IP ranges")
+    parser.add_argument('--output', default=GEOIP_RANGES_DIR, help="directory for the .npy table")
+    args = parser.parse_args()
+
+    started = time.time()
+    count = build_range_table(args.csv_file, args.output)
+    print(f"[+] Built {count:,} ranges into {args.output} in {time.time() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
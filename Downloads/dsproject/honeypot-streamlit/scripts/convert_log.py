@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""Convert the honeypot log between JSON lines and the binary event format"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import BINARY_LOG_FILE, MAIN_LOG_FILE
+from utils.binary_log import binary_to_json, json_to_binary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('direction', choices=['to-binary', 'to-json'])
+    parser.add_argument('--json', help=f"JSON-lines log file (to-binary reads {MAIN_LOG_FILE} by default; "
+                                       "to-json requires an explicit output)")
+    parser.add_argument('--binary', default=BINARY_LOG_FILE, help="binary event log file")
+    parser.add_argument('--force', action='store_true', help="replace an existing JSON output file")
+    args = parser.parse_args()
+
+    started = time.time()
+    if args.direction == 'to-binary':
+        source, target = args.json or MAIN_LOG_FILE, args.binary
+        count = json_to_binary(source, target)
+    else:
+        if not args.json:
+            parser.error("to-json needs --json <output file>")
+        if os.path.exists(args.json) and not args.force:
+            print(f"[!] {args.json} already exists - pass --force to replace it")
+            sys.exit(1)
+        source, target = args.binary, args.json
+        count = binary_to_json(source, target, overwrite=True)
+
+    print(f"[+] Converted {count:,} events from {source} to {target} in {time.time() - started:.2f}s")
+    print(f"[+] {os.path.getsize(source):,} bytes -> {os.path.getsize(target):,} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Export logged events to CSV, JSON lines or Parquet in bounded memory"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import EXPORT_CHUNK_EVENTS, MAIN_LOG_FILE
+from utils.data_processor import parse_timestamp
+from utils.export import FORMATS, EventExport
+
+
+def timestamp_arg(value):
+    timestamp = parse_timestamp(value)
+    if timestamp is None:
+        raise argparse.ArgumentTypeError(f"invalid timestamp: {value}")
+    return timestamp
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('output', help="file to write ('-' for standard output)")
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--compression', help="gzip, bz2 or xz (Parquet: snappy, gzip or zstd)")
+    parser.add_argument('--start', type=timestamp_arg, help="ISO timestamp of the first event")
+    parser.add_argument('--end', type=timestamp_arg, help="ISO timestamp of the last event")
+    parser.add_argument('--type', help="only events of this type")
+    parser.add_argument('--source-ip', help="only events from this address")
+    parser.add_argument('--username', help="only events trying this username")
+    parser.add_argument('--chunk-events', type=int, default=EXPORT_CHUNK_EVENTS)
+    parser.add_argument('--log', default=MAIN_LOG_FILE)
+    args = parser.parse_args()
+
+    try:
+        export = EventExport(
+            args.format, args.compression, start=args.start, end=args.end, event_type=args.type,
+            source_ip=args.source_ip, username=args.username, log_file=args.log,
+            chunk_events=args.chunk_events
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    started = time.time()
+    if args.output == '-':
+        for data in export.chunks():
+            sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+        return
+
+    events = export.write_to(args.output)
+    print(f"[+] {events:,} events written to {args.output} "
+          f"({os.path.getsize(args.output):,} bytes) in {time.time() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Log Processor service: feeds the honeypot log through the ingest pipeline"""
+import logging
+import os
+import signal
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import LOG_DIR, PIPELINE_POLL_SECONDS, PIPELINE_STATUS_FILE
+from utils.pipeline import Pipeline, WriterLock
+
+os.makedirs(LOG_DIR, exist_ok=True)
+logging.basicConfig(
+    filename=os.path.join(LOG_DIR, 'log_processor.log'),
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+
+def main():
+    """Tail the log until stopped, catching up on any backlog first"""
+    print("=" * 60)
+    print("LOG PROCESSOR SERVICE")
+    print("=" * 60)
+
+    pipeline = Pipeline(status_file=PIPELINE_STATUS_FILE)
+
+    def handle_signal(signum, frame):
+        logging.info("Stopping log processor...")
+        pipeline.stop()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    # Pages write the stores themselves until the lock is ours
+    lock = WriterLock()
+    if not lock.acquire():
+        print("[*] Waiting for the writer lock held by another process...")
+        logging.info("Waiting for the writer lock")
+        while not lock.acquire():
+            if pipeline.stopped:
+                return
+            time.sleep(PIPELINE_POLL_SECONDS)
+    pipeline.write_status()
+
+    logging.info("Log processor started")
+    while not pipeline.stopped:
+        started = time.time()
+        try:
+            processed = pipeline.run_once()
+        except Exception as e:
+            logging.error(f"Error processing log: {e}")
+            pipeline.rollback()
+            processed = 0
+        pipeline.write_status()
+
+        if processed:
+            stages = pipeline.status()['stages']
+            rates = ", ".join(
+                f"{name} {metrics['events_per_second']:,.0f}/s" for name, metrics in stages.items()
+            )
+            logging.info(f"Processed {processed:,} bytes in {time.time() - started:.2f}s ({rates})")
+        else:
+            time.sleep(PIPELINE_POLL_SECONDS)
+
+    lock.release()
+    logging.info("Log processor stopped")
+
+
+if __name__ == "__main__":
+    main()
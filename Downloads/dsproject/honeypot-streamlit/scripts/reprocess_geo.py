@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Re-enrich logged events with location fields after a geo database update"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import MAIN_LOG_FILE
+from utils.geoip import GEO_FIELDS, get_locator
+from utils.pipeline import read_batches
+from utils.time_index import log_segments
+
+
+def reprocess_batch(batch, locator):
+    """Rewrite a batch of raw lines with fresh location fields"""
+    events = []
+    for _, _, line in batch:
+        try:
+            event = json.loads(line)
+        except ValueError:
+            event = None
+        events.append(event if isinstance(event, dict) else None)
+
+    # Resolve each distinct address in the batch once
+    ips = sorted({event['source_ip'] for event in events if event and event.get('source_ip')})
+    records = dict(zip(ips, locator.lookup_many(ips)))
+
+    lines = []
+    for (_, _, line), event in zip(batch, events):
+        if event is None or not event.get('source_ip'):
+            lines.append(line + b'\n')
+            continue
+        record = records[event['source_ip']]
+        for field in GEO_FIELDS:
+            if record[field] is None:
+                event.pop(field, None)
+            else:
+                event[field] = record[field]
+        lines.append(json.dumps(event).encode() + b'\n')
+    return b''.join(lines)
+
+
+def reprocess_file(log_file, locator):
+    """Rewrite one log file in place, returning the number of lines written"""
+    tmp_path = log_file + '.reprocess'
+    end = 0
+    lines = 0
+    with open(tmp_path, 'wb') as out:
+        # Keep catching up until no more events were appended meanwhile
+        while True:
+            batches = list(read_batches(log_file, end))
+            if not batches:
+                break
+            for end, batch in batches:
+                out.write(reprocess_batch(batch, locator))
+                lines += len(batch)
+        # Events logged between this copy and the rename are lost, so stop
+        # the honeypots first when a complete rewrite matters
+        with open(log_file, 'rb') as f:
+            f.seek(end)
+            out.write(f.read())
+    os.replace(tmp_path, log_file)
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--log', default=MAIN_LOG_FILE, help="log file (rotated segments are included)")
+    args = parser.parse_args()
+
+    locator = get_locator()
+    if not locator.available:
+        print("[!] No GeoIP database or range table available - nothing to do")
+        sys.exit(1)
+
+    for segment in log_segments(args.log):
+        if not os.path.exists(segment):
+            continue
+        started = time.time()
+        lines = reprocess_file(segment, locator)
+        print(f"[+] {segment}: {lines:,} events re-enriched in {time.time() - started:.2f}s")
+
+    print("[+] Done - the index, rollups and time index rebuild on their next update")
+
+
+if __name__ == "__main__":
+    main()
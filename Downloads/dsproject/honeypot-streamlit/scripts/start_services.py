@@ -5,6 +5,10 @@ import os
 import time
 import signal
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import API_ENABLED, API_PORT
+
 def print_banner():
     """Print startup banner"""
     print("\n" + "="*70)
@@ -92,6 +96,50 @@ def start_http_honeypot():
         print(f"[!] Error starting HTTP honeypot: {e}")
         return None
 
+def start_log_processor():
+    """Start the Log Processor ingest service"""
+    print("[*] Starting Log Processor...")
+    
+    try:
+        process = subprocess.Popen(
+            [sys.executable, 'scripts/log_processor.py'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        time.sleep(1)
+        
+        if process.poll() is None:
+            print("[+] Log Processor started (PID: {})".format(process.pid))
+            return process
+        else:
+            print("[!] Log Processor failed to start")
+            return None
+    except Exception as e:
+        print(f"[!] Error starting Log Processor: {e}")
+        return None
+
+def start_query_api():
+    """Start the Query API service"""
+    print(f"[*] Starting Query API on port {API_PORT}...")
+    
+    try:
+        process = subprocess.Popen(
+            [sys.executable, 'scripts/api_server.py'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        time.sleep(1)
+        
+        if process.poll() is None:
+            print("[+] Query API started (PID: {})".format(process.pid))
+            return process
+        else:
+            print("[!] Query API failed to start")
+            return None
+    except Exception as e:
+        print(f"[!] Error starting Query API: {e}")
+        return None
+
 def start_streamlit():
     """Start Streamlit dashboard"""
     print("[*] Starting Streamlit Dashboard on port 8501...")
@@ -147,6 +195,15 @@ def main():
         
         time.sleep(1)
         
+        processor_process = start_log_processor()
+        if processor_process:
+            processes.append(('Log Processor', processor_process))
+        
+        if API_ENABLED:
+            api_process = start_query_api()
+            if api_process:
+                processes.append(('Query API', api_process))
+        
         streamlit_process = start_streamlit()
         if streamlit_process:
             processes.append(('Streamlit', streamlit_process))
@@ -159,9 +216,12 @@ def main():
         print("  • Streamlit Dashboard: http://localhost:8501")
         print("  • HTTP Honeypot:       http://localhost:8080")
         print("  • SSH Honeypot:        ssh root@localhost -p 2222")
+        if API_ENABLED:
+            print(f"  • Query API:           http://localhost:{API_PORT}/api/v1/summary")
         print("\n📁 Log Files:")
         print("  • Main Log:            logs/honeypot.log")
         print("  • Attack Log:          logs/attacks.log")
+        print("  • Processor Log:       logs/log_processor.log")
         print("\n⚠️  Press Ctrl+C to stop all services")
         print("="*70 + "\n")
         
@@ -0,0 +1,419 @@
+"""
+Binary event log with a zero-copy columnar reader
+
+An optional compact alternative to the JSON-lines log. The file starts
+with a header naming the schema version and the dictionary-coded
+fields, followed by length-prefixed chunk records:
+
+    header : magic, version, schema length, schema JSON (padded to 8)
+    chunk  : record bytes, event count, dictionary bytes, extras bytes,
+             event rows, new dictionary entries, extras JSON (padded to 8)
+
+Each event row has a fixed width: timestamp (int64 microseconds), source
+IP (16 bytes, IPv4 mapped into IPv6) and one uint32 dictionary code per
+coded field (0 when the field is absent). Each distinct value is stored
+once, JSON-encoded, the first time it appears. Keys outside the schema
+and timestamp or IP text that the row cannot reproduce exactly are kept
+in a per-chunk JSON extras list, so conversion round-trips.
+
+The reader maps the file and exposes the rows as NumPy views; columns
+are decoded with vectorized operations rather than per-event objects.
+"""
+import ipaddress
+import json
+import mmap
+import os
+import struct
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from config.settings import BINARY_LOG_CHUNK_EVENTS, BINARY_LOG_FILE, MAIN_LOG_FILE
+from utils.data_processor import parse_timestamp, tail_events
+
+MAGIC = b'HPEVENTS'
+VERSION = 1
+
+CODED_FIELDS = (
+    'type', 'username', 'password', 'password_hash', 'auth_method', 'success',
+    'key_type', 'key_fingerprint', 'command', 'attack_type', 'method', 'path',
+    'query_string', 'user_agent', 'referer'
+)
+
+FILE_HEADER = struct.Struct('<8sII')
+CHUNK_HEADER = struct.Struct('<IIII')
+DICT_ENTRY = struct.Struct('<BI')
+
+NO_TIMESTAMP = np.iinfo(np.int64).min  # reads back as NaT
+EPOCH = datetime(1970, 1, 1)
+IPV4_PREFIX = b'\x00' * 10 + b'\xff\xff'
+OCTET_TEXT = np.array([str(i) for i in range(256)], dtype=object)
+DOTTED_OCTET_TEXT = np.array([f'.{i}' for i in range(256)], dtype=object)
+
+
+def _pad(length):
+    return -length % 8
+
+
+def row_dtype(fields):
+    """Structured dtype of one event row for a list of coded fields"""
+    return np.dtype(
+        [('timestamp', '<i8'), ('source_ip', 'S16')]
+        + [(field, '<u4') for field in fields]
+        + [('extra', '<u4')],
+        align=True
+    )
+
+
+def pack_ip(value):
+    """16-byte form of an IP address string, or None if it is not one"""
+    try:
+        address = ipaddress.ip_address(value)
+    except ValueError:
+        return None
+    if address.version == 4:
+        return IPV4_PREFIX + address.packed
+    return address.packed
+
+
+def unpack_ip(packed):
+    """IP address string from its 16-byte form"""
+    packed = packed.ljust(16, b'\x00')
+    if packed[:12] == IPV4_PREFIX:
+        return str(ipaddress.IPv4Address(packed[12:]))
+    return str(ipaddress.IPv6Address(packed))
+
+
+def format_ips(packed):
+    """Format an 'S16' array of packed addresses (None for empty entries)
+
+    IPv4 addresses, by far the most common, are formatted with vectorized
+    string operations; only IPv6 addresses go through ipaddress.
+    """
+    octets = np.frombuffer(np.ascontiguousarray(packed, dtype='S16').tobytes(), dtype=np.uint8).reshape(-1, 16)
+    ipv4 = (octets[:, :12] == np.frombuffer(IPV4_PREFIX, dtype=np.uint8)).all(axis=1)
+
+    text = OCTET_TEXT[octets[ipv4, 12]]
+    for column in range(13, 16):
+        text = text + DOTTED_OCTET_TEXT[octets[ipv4, column]]
+
+    formatted = np.empty(len(packed), dtype=object)
+    formatted[ipv4] = text
+    for i in np.flatnonzero(~ipv4):
+        formatted[i] = unpack_ip(packed[i]) if packed[i] else None
+    return formatted.tolist()
+
+
+def _value_key(value):
+    """Dictionary key for a value, keeping strings apart from other JSON"""
+    return value if isinstance(value, str) else (json.dumps(value),)
+
+
+def _format_timestamp(micros):
+    return (EPOCH + timedelta(microseconds=int(micros))).isoformat()
+
+
+class BinaryLogWriter:
+    """Appends events to a binary log in chunk records"""
+
+    def __init__(self, path=BINARY_LOG_FILE, fields=CODED_FIELDS):
+        self.path = path
+        if os.path.exists(path) and os.path.getsize(path):
+            # Continue the existing dictionaries so codes stay stable
+            reader = BinaryLogReader(path)
+            self.fields = reader.fields
+            self.codes = [
+                {_value_key(value): code for code, value in enumerate(values, 1)}
+                for values in reader.dictionaries
+            ]
+            self._end = reader.end
+        else:
+            self.fields = tuple(fields)
+            self.codes = [{} for _ in self.fields]
+            self._end = None
+        self.dtype = row_dtype(self.fields)
+
+    def _header(self):
+        schema = json.dumps({'coded_fields': list(self.fields)}).encode()
+        header = FILE_HEADER.pack(MAGIC, VERSION, len(schema)) + schema
+        return header + b'\x00' * _pad(len(header))
+
+    def _encode(self, events):
+        timestamps = []
+        source_ips = []
+        codes = [[] for _ in self.fields]
+        entries = []
+        extras = []
+        refs = []
+        for event in events:
+            extra = {}
+
+            timestamp = event.get('timestamp')
+            parsed = parse_timestamp(timestamp) if timestamp is not None else None
+            if parsed is None:
+                timestamps.append(NO_TIMESTAMP)
+            else:
+                micros = (parsed - EPOCH) // timedelta(microseconds=1)
+                timestamps.append(micros)
+                if _format_timestamp(micros) == timestamp:
+                    timestamp = None
+            if timestamp is not None:
+                extra['timestamp'] = timestamp
+
+            source_ip = event.get('source_ip')
+            packed = pack_ip(source_ip) if isinstance(source_ip, str) else None
+            if packed is not None and packed != bytes(16) and unpack_ip(packed) == source_ip:
+                source_ips.append(packed)
+            else:
+                source_ips.append(b'')
+                if 'source_ip' in event:
+                    extra['source_ip'] = source_ip
+
+            for field_id, field in enumerate(self.fields):
+                if field not in event:
+                    codes[field_id].append(0)
+                    continue
+                value = event[field]
+                key = _value_key(value)
+                dictionary = self.codes[field_id]
+                code = dictionary.get(key)
+                if code is None:
+                    code = dictionary[key] = len(dictionary) + 1
+                    encoded = json.dumps(value).encode()
+                    entries.append(DICT_ENTRY.pack(field_id, len(encoded)) + encoded)
+                codes[field_id].append(code)
+
+            for key, value in event.items():
+                if key not in extra and key not in self.fields and key not in ('timestamp', 'source_ip'):
+                    extra[key] = value
+            if extra:
+                extras.append(extra)
+                refs.append(len(extras))
+            else:
+                refs.append(0)
+
+        rows = np.zeros(len(events), dtype=self.dtype)
+        rows['timestamp'] = timestamps
+        rows['source_ip'] = source_ips
+        for field, values in zip(self.fields, codes):
+            rows[field] = values
+        rows['extra'] = refs
+        return rows, b''.join(entries), json.dumps(extras).encode() if extras else b''
+
+    def write(self, events):
+        """Append a list of event dicts as one chunk record"""
+        if not events:
+            return
+        rows, dictionary, extras = self._encode(events)
+        body = rows.tobytes() + dictionary + b'\x00' * _pad(len(dictionary)) + extras
+        body += b'\x00' * _pad(len(body))
+        record = CHUNK_HEADER.pack(CHUNK_HEADER.size + len(body), len(events), len(dictionary), len(extras))
+
+        with open(self.path, 'r+b' if self._end is not None else 'wb') as f:
+            if self._end is None:
+                f.write(self._header())
+            else:
+                # Drop any partial record left by an interrupted write
+                f.seek(self._end)
+                f.truncate()
+            f.write(record + body)
+            self._end = f.tell()
+
+
+class BinaryLogReader:
+    """Memory-mapped reader exposing the event rows as NumPy arrays"""
+
+    def __init__(self, path=BINARY_LOG_FILE):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, schema_length = FILE_HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not a binary event log: {path}")
+        if version != VERSION:
+            raise ValueError(f"Unsupported binary event log version {version}: {path}")
+        schema = json.loads(bytes(self._mm[FILE_HEADER.size:FILE_HEADER.size + schema_length]))
+        self.fields = tuple(schema['coded_fields'])
+        self.dtype = row_dtype(self.fields)
+
+        self.dictionaries = [[] for _ in self.fields]
+        self.chunks = []
+        self._extras = []
+        self._rows = None
+        self.end = self._scan(FILE_HEADER.size + schema_length + _pad(FILE_HEADER.size + schema_length))
+
+    def _scan(self, position):
+        """Walk the chunk records, collecting row views and dictionary entries"""
+        size = len(self._mm)
+        while position + CHUNK_HEADER.size <= size:
+            record_bytes, count, dict_bytes, extras_bytes = CHUNK_HEADER.unpack_from(self._mm, position)
+            if not record_bytes or position + record_bytes > size:
+                break
+
+            offset = position + CHUNK_HEADER.size
+            self.chunks.append(np.frombuffer(self._mm, dtype=self.dtype, count=count, offset=offset))
+            offset += count * self.dtype.itemsize
+
+            entries_end = offset + dict_bytes
+            while offset < entries_end:
+                field_id, length = DICT_ENTRY.unpack_from(self._mm, offset)
+                offset += DICT_ENTRY.size
+                self.dictionaries[field_id].append(json.loads(self._mm[offset:offset + length]))
+                offset += length
+            offset += _pad(dict_bytes)
+
+            self._extras.append((offset, extras_bytes))
+            position += record_bytes
+        return position
+
+    def __len__(self):
+        return sum(len(chunk) for chunk in self.chunks)
+
+    @property
+    def rows(self):
+        """All event rows; a zero-copy view when the file has one chunk"""
+        if self._rows is None:
+            if len(self.chunks) == 1:
+                self._rows = self.chunks[0]
+            elif not self.chunks:
+                self._rows = np.empty(0, dtype=self.dtype)
+            else:
+                self._rows = np.concatenate(self.chunks)
+        return self._rows
+
+    def timestamps(self):
+        """Event timestamps as datetime64[us] (NaT where missing)"""
+        return self.rows['timestamp'].view('M8[us]')
+
+    def codes(self, field):
+        """Dictionary codes of a coded field (0 where absent)"""
+        return self.rows[field]
+
+    def column(self, field):
+        """A coded field decoded through its dictionary
+
+        Fields holding only strings (and nulls) become a pandas Categorical
+        sharing the dictionary; anything else becomes an object array.
+        Absent values are NaN either way.
+        """
+        values = self.dictionaries[self.fields.index(field)]
+        codes = self.codes(field).astype(np.int32)
+        if all(value is None or isinstance(value, str) for value in values):
+            categories = [value for value in values if value is not None]
+            lookup = np.full(len(values) + 1, -1, dtype=np.int32)
+            lookup[1:][[value is not None for value in values]] = np.arange(len(categories))
+            return pd.Categorical.from_codes(lookup[codes], categories=pd.Index(categories, dtype=object))
+
+        lookup = np.empty(len(values) + 1, dtype=object)
+        lookup[0] = np.nan
+        lookup[1:] = values
+        return lookup[codes]
+
+    def source_ips(self):
+        """Source IPs as a Categorical, formatting each distinct address once"""
+        packed = self.rows['source_ip']
+        unique, inverse = np.unique(packed, return_inverse=True)
+        categories = format_ips(unique)
+        codes = inverse.astype(np.int32)
+        if categories and categories[0] is None:
+            codes -= 1
+            categories = categories[1:]
+        return pd.Categorical.from_codes(codes, categories=pd.Index(categories, dtype=object))
+
+    def extras(self):
+        """Per-event dicts of values kept outside the fixed row (None if none)"""
+        result = []
+        for chunk, (offset, length) in zip(self.chunks, self._extras):
+            values = json.loads(self._mm[offset:offset + length]) if length else []
+            refs = chunk['extra']
+            result.extend(values[ref - 1] if ref else None for ref in refs.tolist())
+        return result
+
+    def to_frame(self):
+        """Load the log as a DataFrame with categorical string columns
+
+        Values held in the extras override the row columns, so the frame
+        matches what load_logs() builds from the equivalent JSON log.
+        """
+        if not len(self):
+            return pd.DataFrame()
+
+        df = pd.DataFrame({'timestamp': self.timestamps(), 'source_ip': self.source_ips()})
+        for field in self.fields:
+            if self.codes(field).any():
+                df[field] = self.column(field)
+
+        extras = self.extras()
+        overrides = {}
+        for i, extra in enumerate(extras):
+            if extra:
+                for key, value in extra.items():
+                    overrides.setdefault(key, {})[i] = value
+        for key, values in overrides.items():
+            column = df[key].astype(object) if key in df.columns else pd.Series(np.nan, index=df.index, dtype=object)
+            column.iloc[list(values)] = list(values.values())
+            df[key] = column
+        if 'timestamp' in overrides:
+            df['timestamp'] = pd.to_datetime(df['timestamp'], format='ISO8601')
+
+        return df
+
+    def iter_events(self):
+        """Yield every event as a dict, as it was written"""
+        extras = iter(self.extras())
+        for chunk in self.chunks:
+            for row in chunk.tolist():
+                event = {}
+                if row[0] != NO_TIMESTAMP:
+                    event['timestamp'] = _format_timestamp(row[0])
+                if row[1]:
+                    event['source_ip'] = unpack_ip(row[1])
+                for field_id, code in enumerate(row[2:-1]):
+                    if code:
+                        event[self.fields[field_id]] = self.dictionaries[field_id][code - 1]
+                extra = next(extras)
+                if extra:
+                    event.update(extra)
+                yield event
+
+
+def json_to_binary(json_file=MAIN_LOG_FILE, binary_file=BINARY_LOG_FILE,
+                   chunk_events=BINARY_LOG_CHUNK_EVENTS):
+    """Convert a JSON-lines log to a new binary log, returning the event count"""
+    if os.path.exists(binary_file):
+        os.remove(binary_file)
+    writer = BinaryLogWriter(binary_file)
+    count = 0
+    chunk = []
+    for _, _, event in tail_events(json_file):
+        chunk.append(event)
+        if len(chunk) >= chunk_events:
+            writer.write(chunk)
+            count += len(chunk)
+            chunk = []
+    writer.write(chunk)
+    return count + len(chunk)
+
+
+def binary_to_json(binary_file, json_file, overwrite=False):
+    """Convert a binary log back to JSON lines, returning the event count
+
+    The output is written next to json_file and moved into place when
+    complete; an existing file is only replaced with overwrite=True.
+    """
+    if os.path.exists(json_file) and not overwrite:
+        raise FileExistsError(f"{json_file} already exists")
+    tmp_path = json_file + '.tmp'
+    count = 0
+    try:
+        with open(tmp_path, 'w') as f:
+            for event in BinaryLogReader(binary_file).iter_events():
+                f.write(json.dumps(event) + '\n')
+                count += 1
+        os.replace(tmp_path, json_file)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return count
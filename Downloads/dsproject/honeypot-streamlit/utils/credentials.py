@@ -0,0 +1,487 @@
+"""
+Username x password x source attempt counts
+
+Credentials are factorized at ingest: each distinct username, password
+and source address gets a stable integer code in an append-only
+vocabulary, and every hourly bucket keeps its attempts as sparse rows of
+(username, password, source, count) codes. Pair statistics, reuse across
+sources and dictionary overlap are then a few np.unique/np.bincount
+calls over the distinct rows of a window, so their cost follows the
+number of distinct (pair, source) combinations rather than attempts.
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from config.settings import CREDENTIAL_DIR, MAIN_LOG_FILE
+from utils.rollups import BucketStore, bucket_key
+
+CREDENTIAL_FIELDS = ('username', 'password', 'source_ip')
+KEY_BITS = 63
+
+
+def _empty():
+    return tuple(np.empty(0, dtype=np.int64) for _ in range(4))
+
+
+def _widths(sizes):
+    """Bits per packed column for codes below each size, with room to grow"""
+    return tuple(int(size).bit_length() + 1 for size in sizes)
+
+
+def _pack(columns, widths):
+    """Pack code columns into one int64 key, first column most significant"""
+    keys = np.zeros(len(columns[0]), dtype=np.int64)
+    for column, width in zip(columns, widths):
+        keys = (keys << width) | column
+    return keys
+
+
+def _unpack(keys, widths, i):
+    """Column i of packed keys"""
+    return (keys >> sum(widths[i + 1:])) & ((1 << widths[i]) - 1)
+
+
+def _insert(keys, counts, new_keys, new_counts=None):
+    """Add sorted distinct keys (and counts) into another sorted distinct set"""
+    if not len(new_keys):
+        return keys, counts
+    position = np.searchsorted(keys, new_keys)
+    found = position < len(keys)
+    found[found] = keys[position[found]] == new_keys[found]
+    missing = ~found
+    if counts is not None:
+        counts = counts.copy()
+        counts[position[found]] += new_counts[found]
+        counts = np.insert(counts, position[missing], new_counts[missing])
+    return np.insert(keys, position[missing], new_keys[missing]), counts
+
+
+def sum_rows(users, passwords, sources, counts):
+    """Combine (username, password, source) rows with the same codes
+
+    Returns the distinct rows, sorted, and their summed counts.
+    """
+    if not len(counts):
+        return _empty()
+    columns = (users, passwords, sources)
+    widths = _widths(int(column.max()) + 1 for column in columns)
+    if sum(widths) > KEY_BITS:
+        raise ValueError("Credential vocabulary too large to pack into 63-bit keys")
+    keys, inverse = np.unique(_pack(columns, widths), return_inverse=True)
+    summed = np.bincount(inverse, weights=counts).astype(np.int64)
+    return tuple(_unpack(keys, widths, i) for i in range(3)) + (summed,)
+
+
+class Vocabulary:
+    """Append-only value-to-code dictionaries, one JSON-lines file per field"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.clear()
+
+    def clear(self):
+        """Forget every value (the files are left alone)"""
+        self.values = {field: [] for field in CREDENTIAL_FIELDS}
+        self.codes = {field: {} for field in CREDENTIAL_FIELDS}
+        self._positions = dict.fromkeys(CREDENTIAL_FIELDS, 0)
+        self._pending = {field: [] for field in CREDENTIAL_FIELDS}
+        self._arrays = {}
+
+    def _path(self, field):
+        return os.path.join(self.directory, field + '.vocab')
+
+    def refresh(self):
+        """Read values appended by another process"""
+        for field in CREDENTIAL_FIELDS:
+            try:
+                with open(self._path(field), 'rb') as f:
+                    f.seek(self._positions[field])
+                    data = f.read()
+            except OSError:
+                continue
+            # A line without its newline is still being written
+            data = data[:data.rfind(b'\n') + 1]
+            self._positions[field] += len(data)
+            values, codes = self.values[field], self.codes[field]
+            for line in data.splitlines():
+                value = json.loads(line)
+                codes[value] = len(values)
+                values.append(value)
+
+    def encode(self, field, values):
+        """Codes for a sequence of values, adding the ones not seen before"""
+        codes, known = [], self.codes[field]
+        for value in values:
+            code = known.get(value)
+            if code is None:
+                code = known[value] = len(self.values[field])
+                self.values[field].append(value)
+                self._pending[field].append(value)
+            codes.append(code)
+        return np.array(codes, dtype=np.int64)
+
+    def code(self, field, value):
+        """Code of one value, or None if it never occurred"""
+        return self.codes[field].get(value)
+
+    def labels(self, field, codes):
+        """Values for an array of codes"""
+        values = self.values[field]
+        if len(codes) and int(codes.max()) >= len(values):
+            # Buckets can be read just after another process extended the files
+            self.refresh()
+        array = self._arrays.get(field)
+        if array is None or len(array) != len(values):
+            array = self._arrays[field] = np.array(values, dtype=object)
+        return array[codes]
+
+    def flush(self):
+        """Append the values added since the last flush"""
+        os.makedirs(self.directory, exist_ok=True)
+        for field, pending in self._pending.items():
+            if not pending:
+                continue
+            data = ''.join(json.dumps(value) + '\n' for value in pending).encode()
+            with open(self._path(field), 'ab') as f:
+                f.write(data)
+            self._positions[field] += len(data)
+            self._pending[field] = []
+
+    def remove(self):
+        """Delete the files and forget every value"""
+        for field in CREDENTIAL_FIELDS:
+            try:
+                os.remove(self._path(field))
+            except OSError:
+                pass
+        self.clear()
+
+
+class CredentialMatrix:
+    """Sparse attempt counts over (username, password, source)
+
+    Rows are kept as sorted packed keys, so the attempts of one pair are
+    contiguous and per-pair totals need no sort. The distinct
+    (username, source) and (password, source) keys are kept alongside
+    for spread across sources. `labels(field, codes)` turns codes back
+    into values.
+    """
+
+    def __init__(self, keys, counts, user_sources, password_sources, widths, labels):
+        self.keys = keys
+        self.counts = counts
+        self.user_sources = user_sources
+        self.password_sources = password_sources
+        self.widths = widths
+        self.labels = labels
+        self._pairs = None
+
+    @classmethod
+    def from_rows(cls, users, passwords, sources, counts, widths, labels):
+        """Matrix of possibly repeated code rows, packed with the given widths"""
+        if sum(widths) > KEY_BITS:
+            raise ValueError("Credential vocabulary too large to pack into 63-bit keys")
+        keys, inverse = np.unique(_pack((users, passwords, sources), widths), return_inverse=True)
+        counts = np.bincount(inverse, weights=counts, minlength=len(keys)).astype(np.int64)
+        users, passwords, sources = (_unpack(keys, widths, i) for i in range(3))
+        return cls(
+            keys, counts,
+            np.unique(_pack((users, sources), widths[::2])),
+            np.unique(_pack((passwords, sources), widths[1:])),
+            widths, labels
+        )
+
+    @classmethod
+    def from_frame(cls, df):
+        """Matrix of a frame of events with username and password columns"""
+        if df.empty or 'username' not in df.columns or 'password' not in df.columns:
+            return cls.from_rows(*_empty(), (1, 1, 1), lambda field, codes: np.empty(0, dtype=object))
+        df = df[df['username'].notna() | df['password'].notna()]
+        columns, uniques = [], {}
+        for field in CREDENTIAL_FIELDS:
+            values = df[field].fillna('').astype(str) if field in df.columns else pd.Series('', index=df.index)
+            codes, uniques[field] = pd.factorize(values, sort=False)
+            columns.append(codes.astype(np.int64))
+        widths = _widths(len(uniques[field]) for field in CREDENTIAL_FIELDS)
+        return cls.from_rows(
+            *columns, np.ones(len(df), dtype=np.int64), widths,
+            lambda field, codes: np.asarray(uniques[field], dtype=object)[codes]
+        )
+
+    def merged(self, other):
+        """A matrix holding the attempts of both (packed with the same widths)"""
+        keys, counts = _insert(self.keys, self.counts, other.keys, other.counts)
+        user_sources, _ = _insert(self.user_sources, None, other.user_sources)
+        password_sources, _ = _insert(self.password_sources, None, other.password_sources)
+        return CredentialMatrix(keys, counts, user_sources, password_sources, self.widths, self.labels)
+
+    def select(self, field, code):
+        """The attempts whose username or source has one code"""
+        column = self.column(field)
+        keep = column == (-1 if code is None else code)
+        columns = [self.column(name)[keep] for name in CREDENTIAL_FIELDS]
+        return CredentialMatrix.from_rows(*columns, self.counts[keep], self.widths, self.labels)
+
+    def column(self, field):
+        """Codes of one field for every row"""
+        return _unpack(self.keys, self.widths, CREDENTIAL_FIELDS.index(field))
+
+    @property
+    def attempts(self):
+        return int(self.counts.sum())
+
+    def distinct(self, field):
+        """Number of distinct values of a field"""
+        if field == 'source_ip':
+            return int(np.count_nonzero(np.bincount(self.column(field)))) if len(self.keys) else 0
+        keys = self.user_sources if field == 'username' else self.password_sources
+        width = self.widths[2]
+        return int(np.count_nonzero(np.diff(keys >> width))) + 1 if len(keys) else 0
+
+    def pair_totals(self):
+        """Pair keys with their attempts and distinct sources, computed once"""
+        if self._pairs is None:
+            pairs = self.keys >> self.widths[2]
+            starts = np.flatnonzero(np.r_[True, pairs[1:] != pairs[:-1]]) if len(pairs) else np.empty(0, dtype=np.int64)
+            # Rows are distinct (pair, source) combinations
+            self._pairs = (
+                pairs[starts],
+                np.add.reduceat(self.counts, starts) if len(starts) else np.empty(0, dtype=np.int64),
+                np.diff(np.r_[starts, len(pairs)]),
+            )
+        return self._pairs
+
+    def top_pairs(self, n=10):
+        """Most attempted username/password pairs with their source spread"""
+        pairs, attempts, sources = self.pair_totals()
+        if len(attempts) > n:
+            best = np.argpartition(attempts, -n)[-n:]
+            pairs, attempts, sources = pairs[best], attempts[best], sources[best]
+        order = np.argsort(-attempts, kind='stable')
+        pairs, attempts, sources = pairs[order], attempts[order], sources[order]
+        return pd.DataFrame({
+            'username': self.labels('username', pairs >> self.widths[1]),
+            'password': self.labels('password', pairs & ((1 << self.widths[1]) - 1)),
+            'attempts': attempts,
+            'sources': sources,
+        })
+
+    def spread(self, field, n=10):
+        """Usernames or passwords tried from the most distinct sources"""
+        codes = self.column(field)
+        if not len(codes):
+            return pd.DataFrame(columns=[field, 'attempts', 'sources', 'share'])
+        attempts = np.bincount(codes, weights=self.counts).astype(np.int64)
+        keys = self.user_sources if field == 'username' else self.password_sources
+        sources = np.bincount(keys >> self.widths[2], minlength=len(attempts))
+        present = np.flatnonzero(attempts)
+        order = present[np.lexsort((-attempts[present], -sources[present]))][:n]
+        return pd.DataFrame({
+            field: self.labels(field, order),
+            'attempts': attempts[order],
+            'sources': sources[order],
+            'share': sources[order] / max(1, self.distinct('source_ip')),
+        })
+
+    def reuse(self, min_sources=2):
+        """(pairs, share of attempts) for pairs tried by at least min_sources sources"""
+        _, attempts, sources = self.pair_totals()
+        if not len(attempts):
+            return 0, 0.0
+        shared = sources >= min_sources
+        return int(shared.sum()), float(attempts[shared].sum() / attempts.sum())
+
+    def coverage(self):
+        """Share of attempts covered by the k most common pairs, for k = 1..pairs"""
+        _, attempts, _ = self.pair_totals()
+        if not len(attempts):
+            return np.empty(0)
+        return np.cumsum(np.sort(attempts)[::-1]) / attempts.sum()
+
+    def overlap(self, n=15):
+        """Jaccard similarity of the pair sets of the n most active sources
+
+        A high value means two sources worked through the same dictionary.
+        """
+        sources = self.column('source_ip')
+        source_attempts = np.bincount(sources, weights=self.counts) if len(sources) else np.empty(0)
+        top = np.flatnonzero(source_attempts)
+        top = top[np.argsort(-source_attempts[top], kind='stable')][:n]
+
+        chosen = np.zeros(len(source_attempts), dtype=bool)
+        chosen[top] = True
+        rows = chosen[sources]
+        columns, column_of_row = np.unique(self.keys[rows] >> self.widths[2], return_inverse=True)
+        position = np.zeros(len(source_attempts), dtype=np.int64)
+        position[top] = np.arange(len(top))
+        tried = np.zeros((len(top), len(columns)), dtype=np.float32)
+        tried[position[sources[rows]], column_of_row] = 1
+
+        shared = tried @ tried.T
+        sizes = np.diag(shared)
+        union = sizes[:, None] + sizes[None, :] - shared
+        labels = self.labels('source_ip', top)
+        return pd.DataFrame(np.divide(shared, union, out=np.zeros_like(shared), where=union > 0),
+                            index=labels, columns=labels)
+
+
+class CredentialBucket:
+    """Credential attempt rows for one hour of events"""
+
+    def __init__(self):
+        self.parts = []    # (users, passwords, sources, counts) code arrays
+        self.pending = []  # (username, password, source_ip) awaiting codes
+
+    def add(self, event):
+        username, password = event.get('username'), event.get('password')
+        if username is None and password is None:
+            return
+        self.pending.append((str(username or ''), str(password or ''), str(event.get('source_ip') or '')))
+
+    def encode(self, vocabulary):
+        """Turn the queued attempts into code rows"""
+        if not self.pending:
+            return
+        columns = [vocabulary.encode(field, values) for field, values in zip(CREDENTIAL_FIELDS, zip(*self.pending))]
+        self.parts.append(sum_rows(*columns, np.ones(len(self.pending), dtype=np.int64)))
+        self.pending = []
+
+    def rows(self):
+        """Distinct (users, passwords, sources, counts) rows"""
+        parts = [part for part in self.parts if len(part[3])]
+        if not parts:
+            return _empty()
+        summed = parts[0] if len(parts) == 1 else sum_rows(*(np.concatenate(column) for column in zip(*parts)))
+        self.parts = [summed]
+        return summed
+
+    def merge(self, other):
+        self.parts.append(other.rows())
+        return self
+
+    def to_dict(self):
+        return {'rows': [column.tolist() for column in self.rows()]}
+
+    @classmethod
+    def from_dict(cls, data):
+        bucket = cls()
+        bucket.parts = [tuple(np.array(column, dtype=np.int64) for column in data['rows'])]
+        return bucket
+
+
+class CredentialStore(BucketStore):
+    """Hourly credential rows over a shared vocabulary"""
+
+    version = 1
+    bucket_class = CredentialBucket
+
+    def __init__(self, credential_dir=CREDENTIAL_DIR, log_file=MAIN_LOG_FILE):
+        self.vocabulary = Vocabulary(credential_dir)
+        self._generation = None
+        self._closed = None
+        super().__init__(credential_dir, log_file)
+
+    def new_manifest(self):
+        manifest = super().new_manifest()
+        # Codes only mean something within one generation of the vocabulary
+        manifest['generation'] = time.time_ns()
+        return manifest
+
+    def refresh(self):
+        with self._lock:
+            super().refresh()
+            if self.manifest.get('generation') != self._generation:
+                self.vocabulary.clear()
+                self._closed = None
+                self._generation = self.manifest.get('generation')
+            self.vocabulary.refresh()
+
+    def reset(self):
+        with self._lock:
+            self.vocabulary.remove()
+            self._closed = None
+            super().reset()
+            self._generation = self.manifest['generation']
+
+    def rollback(self):
+        with self._lock:
+            # Values encoded but not flushed are read back from the files only
+            self._generation = None
+            self._closed = None
+            super().rollback()
+
+    def flush(self, checkpoint):
+        with self._lock:
+            for key in self._dirty:
+                self.buckets[key].encode(self.vocabulary)
+            # Values are on disk before any bucket refers to them
+            self.vocabulary.flush()
+            super().flush(checkpoint)
+
+    def _matrix(self, keys, widths):
+        parts = [self.buckets[key].rows() for key in keys]
+        columns = [np.concatenate(column) for column in zip(*parts)] if parts else _empty()
+        return CredentialMatrix.from_rows(*columns, widths, self.vocabulary.labels)
+
+    def _closed_matrix(self, keys, sizes):
+        """Matrix of all buckets but the newest, extended as hours close
+
+        Rebuilt only when a closed bucket changed or the vocabulary
+        outgrew the packed widths.
+        """
+        signature = [(key, int(self.buckets[key].rows()[3].sum())) for key in keys]
+        cached = self._closed
+        if cached is not None:
+            cached_signature, matrix = cached
+            fits = all(size <= 1 << width for size, width in zip(sizes, matrix.widths))
+            if fits and signature[:len(cached_signature)] == cached_signature:
+                if len(signature) > len(cached_signature):
+                    matrix = matrix.merged(self._matrix(keys[len(cached_signature):], matrix.widths))
+                self._closed = (signature, matrix)
+                return matrix
+        matrix = self._matrix(keys, _widths(sizes))
+        self._closed = (signature, matrix)
+        return matrix
+
+    def matrix(self, start=None, end=None, source_ip=None, username=None):
+        """CredentialMatrix of the attempts in a window, optionally from one source or username
+
+        The all-time matrix is kept between calls and only the newest
+        hour is merged in again; other windows merge their buckets.
+        """
+        first = bucket_key(start) if start is not None else None
+        last = bucket_key(end) if end is not None else None
+        with self._lock:
+            keys = sorted(
+                key for key in self.buckets
+                if (first is None or key >= first) and (last is None or key <= last)
+            )
+            sizes = [len(self.vocabulary.values[field]) for field in CREDENTIAL_FIELDS]
+            if first is None and last is None and len(keys) > 1:
+                closed = self._closed_matrix(keys[:-1], sizes)
+                matrix = closed.merged(self._matrix(keys[-1:], closed.widths))
+            else:
+                matrix = self._matrix(keys, _widths(sizes))
+
+        for field, value in (('source_ip', source_ip), ('username', username)):
+            if value:
+                matrix = matrix.select(field, self.vocabulary.code(field, value))
+        return matrix
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_credentials(credential_dir=CREDENTIAL_DIR, log_file=MAIN_LOG_FILE):
+    """Return the process-wide CredentialStore for a log file"""
+    key = (os.path.abspath(credential_dir), os.path.abspath(log_file))
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = CredentialStore(credential_dir, log_file)
+        return _stores[key]
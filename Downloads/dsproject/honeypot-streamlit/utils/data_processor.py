@@ -1 +1,317 @@
-# Data processing utilities
+"""
+Data processing utilities for Honeypot Security Analytics System
+
+Every page reads the honeypot log through load_logs(). Parsed frames are
+kept in a process-wide cache keyed on the file's identity (device, inode),
+size and mtime, so page switches and concurrent sessions share one parse.
+When the log only grew since the last read (same file, and the bytes
+before the old end unchanged), just the appended bytes are parsed and
+added to the cached frame.
+"""
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+from config.settings import MAIN_LOG_FILE
+
+REQUIRED_FIELDS = ('timestamp', 'type')
+TAIL_HASH_BYTES = 4096  # bytes before the cached end compared to detect rewrites
+
+# Process-wide cache: abspath -> (signature, end offset, tail hash, frame)
+_frame_cache = {}
+_cache_lock = threading.Lock()
+
+
+def file_signature(log_file):
+    """Return (device, inode, size, mtime) for a file, or None if missing"""
+    try:
+        stat = os.stat(log_file)
+    except OSError:
+        return None
+    return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def write_json_atomic(path, data):
+    """Write JSON to a file so readers never see a partial write"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def parse_timestamp(value):
+    """Parse an event timestamp, returning None if it is missing or invalid"""
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def validate_event(event):
+    """True if an event has the required fields and a parseable timestamp
+
+    The parsed timestamp is kept in `_timestamp`. The ingest paths (the
+    Log Processor and LogConsumer.update()), load_logs() and the live
+    feeds all drop the events failing this check, so counts do not depend
+    on which one ran.
+    """
+    if not all(event.get(field) for field in REQUIRED_FIELDS):
+        return False
+    timestamp = parse_timestamp(event['timestamp'])
+    if timestamp is None:
+        return False
+    event['_timestamp'] = timestamp
+    return True
+
+
+def tail_events(log_file=MAIN_LOG_FILE, start_offset=0):
+    """Yield (offset, next offset, event) for each complete JSON line
+
+    The offset is the byte position of the line in the file and serves as
+    a stable event ID; the next offset is where reading should resume. A
+    trailing line without a newline is still being written and is left
+    for the next read.
+    """
+    if not os.path.exists(log_file):
+        return
+
+    with open(log_file, 'rb') as f:
+        f.seek(start_offset)
+        offset = start_offset
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            line_offset = offset
+            offset += len(line)
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(event, dict):
+                yield line_offset, offset, event
+
+
+def read_events(log_file=MAIN_LOG_FILE, start_offset=0, end_offset=None):
+    """Yield (offset, event) for each event in a byte range of the log"""
+    for offset, _, event in tail_events(log_file, start_offset):
+        if end_offset is not None and offset >= end_offset:
+            break
+        yield offset, event
+
+
+def read_events_at(offsets, log_file=MAIN_LOG_FILE):
+    """Return the events stored at the given byte offsets"""
+    events = []
+    if not os.path.exists(log_file):
+        return events
+
+    with open(log_file, 'rb') as f:
+        for offset in offsets:
+            f.seek(int(offset))
+            try:
+                events.append(json.loads(f.readline()))
+            except ValueError:
+                continue
+    return events
+
+
+def read_recent_events(count, log_file=MAIN_LOG_FILE, end_offset=None, block_bytes=64 * 1024):
+    """Return [(offset, event)] for the last `count` events before end_offset
+
+    The file is read backwards in blocks from end_offset (default: the end
+    of the file), so the cost does not depend on the size of the log.
+    """
+    if count <= 0 or not os.path.exists(log_file):
+        return []
+
+    with open(log_file, 'rb') as f:
+        end = f.seek(0, os.SEEK_END) if end_offset is None else end_offset
+        start = end
+        data = b''
+        # One more line than needed so the first one kept is complete
+        while start > 0 and data.count(b'\n') <= count:
+            start = max(0, start - block_bytes)
+            f.seek(start)
+            data = f.read(end - start)
+
+    lines = data.split(b'\n')
+    offset = end - len(lines[-1])
+    events = []
+    # The text after the last newline is a line still being written
+    for line in reversed(lines[:-1]):
+        offset -= len(line) + 1
+        if offset == start and start > 0:
+            break
+        try:
+            event = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(event, dict):
+            events.append((offset, event))
+            if len(events) == count:
+                break
+    events.reverse()
+    return events
+
+
+def events_to_frame(events):
+    """Build a DataFrame from a list of event dicts"""
+    if not events:
+        return pd.DataFrame()
+
+    df = pd.DataFrame(events)
+    if 'timestamp' in df.columns:
+        df['timestamp'] = pd.to_datetime(df['timestamp'], format='ISO8601')
+    return df
+
+
+def _read_frame(log_file, start_offset):
+    """Parse valid events from start_offset, returning (end offset, frame)"""
+    end_offset = start_offset
+    events = []
+    for _, end_offset, event in tail_events(log_file, start_offset):
+        if validate_event(event):
+            del event['_timestamp']
+            events.append(event)
+    return end_offset, events_to_frame(events)
+
+
+def _tail_hash(log_file, offset, length=TAIL_HASH_BYTES):
+    """Hash of the bytes just before an offset, to tell an append from a rewrite"""
+    try:
+        with open(log_file, 'rb') as f:
+            f.seek(max(0, offset - length))
+            return hashlib.blake2b(f.read(min(offset, length)), digest_size=16).digest()
+    except OSError:
+        return None
+
+
+def load_logs(log_file=MAIN_LOG_FILE, max_lines=None):
+    """Load and parse the honeypot log through the shared cache
+
+    The cached frame is shared by every caller in the process. Callers get
+    a shallow copy, so adding columns stays local, but they must not
+    modify values in place.
+    """
+    key = os.path.abspath(log_file)
+    signature = file_signature(log_file)
+
+    if signature is None:
+        with _cache_lock:
+            _frame_cache.pop(key, None)
+        return pd.DataFrame()
+
+    with _cache_lock:
+        cached = _frame_cache.get(key)
+
+        if cached is None or cached[0] != signature:
+            # An append leaves the bytes before the cached offset as they were;
+            # a log truncated in place and grown again does not
+            appended = cached is not None and cached[0][:2] == signature[:2] \
+                and signature[2] >= cached[1] and _tail_hash(log_file, cached[1]) == cached[2]
+            if appended:
+                # Log was appended to - parse only the new bytes
+                end_offset, new_df = _read_frame(log_file, cached[1])
+                df = cached[3]
+                if not new_df.empty:
+                    df = pd.concat([df, new_df], ignore_index=True)
+            else:
+                end_offset, df = _read_frame(log_file, 0)
+            cached = (signature, end_offset, _tail_hash(log_file, end_offset), df)
+            _frame_cache[key] = cached
+
+    df = cached[3]
+    if max_lines is not None and len(df) > max_lines:
+        df = df.iloc[-max_lines:]
+    return df.copy(deep=False)
+
+
+def clear_cache():
+    """Drop all cached frames"""
+    with _cache_lock:
+        _frame_cache.clear()
+
+
+class LogConsumer:
+    """Base class for structures maintained incrementally from the log
+
+    Subclasses keep a manifest dict with the log's identity and the
+    checkpoint offset up to which events were consumed, and implement
+    add() for each event, flush() to persist a batch and rollback() to
+    forget a batch that failed before it was flushed. update() then
+    catches up with everything appended since the checkpoint, starting
+    over when the log is rotated away or truncated, or when the persisted
+    state was written by a different version of the subclass.
+    """
+
+    version = 1
+
+    def __init__(self, log_file=MAIN_LOG_FILE):
+        self.log_file = log_file
+        self._lock = threading.RLock()
+        self.manifest = self.new_manifest()
+
+    @property
+    def checkpoint(self):
+        """Log offset up to which events have been consumed"""
+        return self.manifest['checkpoint']
+
+    def new_manifest(self):
+        """Manifest for an empty structure over the current log file"""
+        signature = file_signature(self.log_file)
+        return {
+            'version': self.version,
+            'log_identity': list(signature[:2]) if signature else None,
+            'checkpoint': 0,
+        }
+
+    def log_replaced(self):
+        """True if the log was rotated away or truncated under the checkpoint"""
+        signature = file_signature(self.log_file)
+        if signature is None:
+            return self.checkpoint > 0
+        identity = self.manifest['log_identity']
+        return (identity is not None and identity != list(signature[:2])) \
+            or signature[2] < self.checkpoint
+
+    def refresh(self):
+        """Reload persisted state changed by another process"""
+
+    def reset(self):
+        """Drop all state and start over from the beginning of the log"""
+        raise NotImplementedError
+
+    def add(self, offset, event):
+        """Consume one event"""
+        raise NotImplementedError
+
+    def flush(self, checkpoint):
+        """Persist consumed events and advance the checkpoint"""
+        raise NotImplementedError
+
+    def rollback(self):
+        """Drop events consumed since the last flush and reload the persisted state"""
+        raise NotImplementedError
+
+    def prepare(self):
+        """Reload persisted state and reset it if it no longer matches the log"""
+        with self._lock:
+            self.refresh()
+            if self.log_replaced() or self.manifest.get('version') != self.version:
+                self.reset()
+
+    def update(self):
+        """Consume everything appended to the log since the checkpoint"""
+        with self._lock:
+            self.prepare()
+            checkpoint = self.checkpoint
+            for offset, checkpoint, event in tail_events(self.log_file, checkpoint):
+                if validate_event(event):
+                    self.add(offset, event)
+            if checkpoint != self.checkpoint:
+                self.flush(checkpoint)
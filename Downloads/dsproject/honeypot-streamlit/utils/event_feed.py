@@ -0,0 +1,157 @@
+"""
+Keyset pagination over the event log for the attack feed
+
+A position in the feed is a cursor (timestamp, event ID), where the event
+ID is the byte offset of an event in the log. A page holds the events
+stored before the cursor, newest first, so it costs one bounded backwards
+read at any depth and nothing is kept between pages. Source IP and
+username filters go through the inverted index; a type filter is checked
+while reading, with at most FEED_SCAN_EVENTS examined per page so sparse
+types still return promptly (with a partial page and a cursor to go on).
+The timestamp lets a cursor from a deep link be found again with the time
+index after the log was rotated.
+"""
+import os
+from datetime import timedelta
+
+import numpy as np
+
+from config.settings import FEED_PAGE_SIZE, FEED_SCAN_EVENTS, MAIN_LOG_FILE
+from utils.data_processor import (
+    parse_timestamp, read_events_at, read_recent_events, tail_events,
+    validate_event
+)
+from utils.inverted_index import get_index
+from utils.time_index import EPOCH, get_time_index, to_micros
+
+INDEX_FILTERS = ('source_ip', 'username')
+
+
+def encode_cursor(timestamp, offset):
+    """Text form of a cursor for URLs, e.g. 1760871600000000-52311"""
+    return f"{to_micros(timestamp) if timestamp is not None else 0}-{offset}"
+
+
+def decode_cursor(text):
+    """(timestamp in microseconds, offset) from encode_cursor(), or None"""
+    try:
+        micros, offset = str(text).split('-')
+        return int(micros), int(offset)
+    except ValueError:
+        return None
+
+
+def _event_micros(event):
+    timestamp = parse_timestamp(event.get('timestamp'))
+    return to_micros(timestamp) if timestamp is not None else None
+
+
+def cursor_at(timestamp, log_file=MAIN_LOG_FILE):
+    """Cursor just after the last event logged at or before a time
+
+    The time index narrows the search to one block of events, which is
+    then read forwards.
+    """
+    first, _ = get_time_index(log_file).byte_range(start=timestamp)
+    for offset, _, event in tail_events(log_file, first):
+        event_timestamp = parse_timestamp(event.get('timestamp'))
+        if event_timestamp is not None and event_timestamp > timestamp:
+            return encode_cursor(event_timestamp, offset)
+    return None
+
+
+def _resolve(cursor, log_file):
+    """Log offset a cursor points at, found by time if the log changed"""
+    size = os.path.getsize(log_file) if os.path.exists(log_file) else 0
+    decoded = decode_cursor(cursor) if cursor else None
+    if decoded is None:
+        return size
+    micros, offset = decoded
+    if offset < size:
+        events = read_events_at([offset], log_file)
+        if events and _event_micros(events[0]) == micros:
+            return offset
+    elif offset == size:
+        return offset
+
+    # The log was rotated or truncated since the cursor was made
+    first, _ = get_time_index(log_file).byte_range(start=EPOCH + timedelta(microseconds=micros))
+    for event_offset, _, event in tail_events(log_file, first):
+        event_micros = _event_micros(event)
+        if event_micros is not None and event_micros >= micros:
+            return event_offset
+    return size
+
+
+def _matches(event, event_type):
+    # Events the ingest paths drop are left out of the feed as well
+    if not validate_event(event):
+        return False
+    del event['_timestamp']
+    return event_type is None or event.get('type') == event_type
+
+
+def _index_page(end, page_size, event_type, filters, log_file):
+    """Events before `end` among the offsets matching all index filters"""
+    index = get_index(log_file=log_file)
+    offsets = None
+    for field, value in filters.items():
+        matches = index.lookup(field, value)
+        offsets = matches if offsets is None else np.intersect1d(offsets, matches, assume_unique=True)
+    offsets = offsets[:np.searchsorted(offsets, end)]
+
+    page = []
+    position = len(offsets)
+    while position > 0 and len(page) < page_size and len(offsets) - position < FEED_SCAN_EVENTS:
+        batch = offsets[max(0, position - page_size):position]
+        position -= len(batch)
+        for offset, event in zip(batch[::-1], read_events_at(batch, log_file)[::-1]):
+            if _matches(event, event_type):
+                page.append((int(offset), event))
+                if len(page) == page_size:
+                    return page, int(offset)
+    return page, int(offsets[position]) if position > 0 else 0
+
+
+def _scan_page(end, page_size, event_type, log_file):
+    """Events before `end`, read backwards from the log"""
+    page = []
+    position = end
+    scanned = 0
+    while position > 0 and len(page) < page_size and scanned < FEED_SCAN_EVENTS:
+        events = read_recent_events(page_size, log_file, position)
+        if not events:
+            return page, 0
+        for offset, event in reversed(events):
+            if _matches(event, event_type):
+                page.append((offset, event))
+                if len(page) == page_size:
+                    return page, offset
+        position = events[0][0]
+        scanned += len(events)
+    return page, position
+
+
+def feed_page(cursor=None, page_size=FEED_PAGE_SIZE, event_type=None, source_ip=None,
+              username=None, log_file=MAIN_LOG_FILE):
+    """One page of the feed before a cursor (or the newest events)
+
+    Returns (events, next cursor): [(event ID, event)] newest first, and
+    the cursor of the following (older) page, or None at the beginning of
+    the log.
+    """
+    end = _resolve(cursor, log_file)
+    filters = {field: value for field, value in zip(INDEX_FILTERS, (source_ip, username)) if value}
+
+    if filters:
+        page, position = _index_page(end, page_size, event_type, filters, log_file)
+    else:
+        page, position = _scan_page(end, page_size, event_type, log_file)
+
+    if position <= 0:
+        return page, None
+    if page and page[-1][0] == position:
+        return page, encode_cursor(parse_timestamp(page[-1][1].get('timestamp')), position)
+    events = read_events_at([position], log_file)
+    timestamp = parse_timestamp(events[0].get('timestamp')) if events else None
+    return page, encode_cursor(timestamp, position)
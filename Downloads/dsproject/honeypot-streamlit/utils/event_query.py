@@ -0,0 +1,83 @@
+"""
+Filtered event reads pushed down into storage
+
+Pages and exports ask for events by time range, type, source IP and
+username. The time range is narrowed with the time index and the IP and
+username through the inverted index (intersecting the offset lists when
+both are given), so a query reads only the byte ranges and offsets that
+can match, plus whatever was logged since the indexes were last
+updated. The type is not indexed and is checked while reading.
+"""
+import numpy as np
+
+from config.settings import MAIN_LOG_FILE
+from utils.data_processor import events_to_frame, parse_timestamp, read_events, read_events_at
+from utils.inverted_index import get_index
+from utils.pipeline import sync_consumer
+from utils.time_index import get_time_index, read_window
+
+INDEX_FILTERS = ('source_ip', 'username')
+OFFSET_BATCH = 10000  # indexed events read per batch
+
+
+def _in_window(event, start, end):
+    if start is None and end is None:
+        return True
+    timestamp = parse_timestamp(event.get('timestamp'))
+    return timestamp is not None and (start is None or timestamp >= start) and (end is None or timestamp <= end)
+
+
+def _matches(event, filters):
+    return all(event.get(field) == value for field, value in filters.items())
+
+
+def _indexed_events(filters, start, end, log_file):
+    """Events matching index filters, oldest first, located through the index"""
+    # The inverted index only covers the live log; rotated segments are scanned
+    for segment, _, event in read_window(start, end, log_file):
+        if segment == log_file:
+            break
+        if _matches(event, filters):
+            yield event
+
+    index = get_index(log_file=log_file)
+    time_index = get_time_index(log_file)
+    offsets = None
+    for field, value in filters.items():
+        matches = index.lookup(field, value)
+        offsets = matches if offsets is None else np.intersect1d(offsets, matches, assume_unique=True)
+    first, stop = time_index.byte_range(start, end)
+    keep = (offsets >= first) & (offsets < index.checkpoint)
+    if stop is not None:
+        keep &= (offsets < stop) | (offsets >= time_index.checkpoint)
+    offsets = offsets[keep]
+
+    for i in range(0, len(offsets), OFFSET_BATCH):
+        for event in read_events_at(offsets[i:i + OFFSET_BATCH], log_file):
+            if isinstance(event, dict) and _in_window(event, start, end):
+                yield event
+    # Events logged since the index was last updated
+    for _, event in read_events(log_file, max(index.checkpoint, first)):
+        if _matches(event, filters) and _in_window(event, start, end):
+            yield event
+
+
+def select_events(start=None, end=None, event_type=None, source_ip=None, username=None,
+                  log_file=MAIN_LOG_FILE):
+    """Yield the events matching all given filters, oldest first"""
+    sync_consumer(get_time_index(log_file))
+    filters = {field: value for field, value in zip(INDEX_FILTERS, (source_ip, username)) if value}
+    if filters:
+        sync_consumer(get_index(log_file=log_file))
+        events = _indexed_events(filters, start, end, log_file)
+    else:
+        events = (event for _, _, event in read_window(start, end, log_file))
+    for event in events:
+        if not event_type or event.get('type') == event_type:
+            yield event
+
+
+def load_events(start=None, end=None, event_type=None, source_ip=None, username=None,
+                log_file=MAIN_LOG_FILE):
+    """Load the events matching all given filters into a DataFrame"""
+    return events_to_frame(list(select_events(start, end, event_type, source_ip, username, log_file)))
@@ -0,0 +1,217 @@
+"""
+Streaming export of logged events
+
+Matching events are read from the log a chunk at a time and written out
+as each chunk fills, so an export holds at most EXPORT_CHUNK_EVENTS
+events in memory whatever the size of the result. Filters are pushed
+down into the time and inverted indexes (see utils.event_query), so only
+matching byte ranges and offsets are read. CSV and JSON lines can be
+compressed with gzip, bz2 or xz; Parquet (when pyarrow is installed) is
+written one row group per chunk with its own column codec.
+"""
+import bz2
+import gzip
+import json
+import lzma
+import os
+import time
+
+import pandas as pd
+
+from config.settings import EXPORT_CHUNK_EVENTS, EXPORT_DIR, EXPORT_RETENTION_HOURS, MAIN_LOG_FILE
+from utils.binary_log import CODED_FIELDS
+from utils.event_query import select_events
+from utils.geoip import GEO_FIELDS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+MIME_TYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson', 'parquet': 'application/vnd.apache.parquet'}
+TEXT_COMPRESSORS = {
+    'gzip': lambda f: gzip.GzipFile(fileobj=f, mode='wb'),
+    'bz2': lambda f: bz2.BZ2File(f, 'wb'),
+    'xz': lambda f: lzma.LZMAFile(f, 'wb'),
+}
+COMPRESSED_EXTENSIONS = {'gzip': '.gz', 'bz2': '.bz2', 'xz': '.xz'}
+PARQUET_CODECS = ('snappy', 'gzip', 'zstd')
+
+# CSV and Parquet need a fixed set of columns; JSON lines keeps every key
+EXPORT_COLUMNS = ('timestamp', 'source_ip') + CODED_FIELDS + GEO_FIELDS + ('request_bytes',)
+NUMERIC_COLUMNS = ('lat', 'lon', 'asn', 'request_bytes')
+INTEGER_COLUMNS = ('asn', 'request_bytes')
+
+
+def available_formats():
+    """Export formats usable in this environment"""
+    return [fmt for fmt in FORMATS if fmt != 'parquet' or pq is not None]
+
+
+def compressions(fmt):
+    """Compression choices for a format, None meaning uncompressed"""
+    return [None] + list(PARQUET_CODECS if fmt == 'parquet' else TEXT_COMPRESSORS)
+
+
+def prune_exports(directory=EXPORT_DIR, max_age=EXPORT_RETENTION_HOURS * 3600):
+    """Remove exports older than max_age seconds, returning how many went"""
+    if not os.path.isdir(directory):
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+def _parquet_schema():
+    fields = []
+    for column in EXPORT_COLUMNS:
+        if column == 'timestamp':
+            fields.append(pa.field(column, pa.timestamp('us')))
+        elif column in INTEGER_COLUMNS:
+            fields.append(pa.field(column, pa.int64()))
+        elif column in NUMERIC_COLUMNS:
+            fields.append(pa.field(column, pa.float64()))
+        else:
+            fields.append(pa.field(column, pa.string()))
+    return pa.schema(fields)
+
+
+def _parquet_frame(events):
+    """Chunk of events as a frame with the Parquet schema's column types"""
+    df = pd.DataFrame.from_records(events, columns=EXPORT_COLUMNS)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], format='ISO8601', errors='coerce', utc=True).dt.tz_localize(None)
+    for column in EXPORT_COLUMNS:
+        if column in INTEGER_COLUMNS:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype('Int64')
+        elif column in NUMERIC_COLUMNS:
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+        elif column != 'timestamp':
+            values = df[column].to_numpy(dtype=object)
+            present = pd.notna(values)
+            values[present] = [str(value) for value in values[present]]
+            df[column] = values
+    return df
+
+
+class _Drain:
+    """Write-only file object whose contents are taken out as they arrive"""
+
+    closed = False
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+class EventExport:
+    """One export of the log: filters, format and compression"""
+
+    def __init__(self, fmt='csv', compression=None, start=None, end=None, event_type=None,
+                 source_ip=None, username=None, log_file=MAIN_LOG_FILE, chunk_events=EXPORT_CHUNK_EVENTS):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        if fmt == 'parquet' and pq is None:
+            raise ValueError("Parquet export needs pyarrow (pip install pyarrow)")
+        if compression not in compressions(fmt):
+            raise ValueError(f"Unsupported compression for {fmt}: {compression}")
+        self.fmt = fmt
+        self.compression = compression
+        self.filters = dict(
+            start=start, end=end, event_type=event_type or None,
+            source_ip=source_ip or None, username=username or None
+        )
+        self.log_file = log_file
+        self.chunk_events = chunk_events
+        self.events = 0
+
+    @property
+    def mime_type(self):
+        if self.compression and self.fmt != 'parquet':
+            return 'application/octet-stream'
+        return MIME_TYPES[self.fmt]
+
+    def file_name(self, stem):
+        """File name for the export with the right extensions"""
+        name = f"{stem}.{self.fmt}"
+        if self.compression and self.fmt != 'parquet':
+            name += COMPRESSED_EXTENSIONS[self.compression]
+        return name
+
+    def _event_chunks(self):
+        chunk = []
+        for event in select_events(log_file=self.log_file, **self.filters):
+            chunk.append(event)
+            if len(chunk) == self.chunk_events:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def chunks(self):
+        """Yield the encoded export as byte strings, one per event chunk"""
+        self.events = 0
+        drain = _Drain()
+        if self.fmt == 'parquet':
+            writer = pq.ParquetWriter(drain, _parquet_schema(), compression=self.compression or 'none')
+            for events in self._event_chunks():
+                writer.write_table(pa.Table.from_pandas(_parquet_frame(events), schema=_parquet_schema(), preserve_index=False))
+                self.events += len(events)
+                yield drain.take()
+            writer.close()
+            yield drain.take()
+            return
+
+        out = TEXT_COMPRESSORS[self.compression](drain) if self.compression else drain
+        if self.fmt == 'csv':
+            out.write(pd.DataFrame(columns=EXPORT_COLUMNS).to_csv(index=False).encode())
+        for events in self._event_chunks():
+            if self.fmt == 'csv':
+                data = pd.DataFrame.from_records(events, columns=EXPORT_COLUMNS).to_csv(index=False, header=False)
+            else:
+                data = ''.join(json.dumps(event) + '\n' for event in events)
+            out.write(data.encode())
+            self.events += len(events)
+            data = drain.take()
+            if data:
+                yield data
+        if out is not drain:
+            out.close()
+        yield drain.take()
+
+    def write_to(self, path):
+        """Write the export to a file, returning the number of events"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            for data in self.chunks():
+                f.write(data)
+        os.replace(tmp_path, path)
+        return self.events
@@ -0,0 +1,197 @@
+"""
+Spatial bins of attack locations for the map
+
+Events carrying coordinates (see GEOIP_ENRICH_ON_INGEST) are counted at
+ingest into geohash cells of GEO_BIN_PRECISION characters, per hourly
+bucket, alongside exact per-source counts. A map query merges the
+buckets in its window, plots the top sources as exact points and folds
+everything else into cells, coarsening the geohash prefix until the
+number of cells fits the point budget.
+"""
+import heapq
+import os
+import threading
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from config.settings import (
+    GEO_BIN_DIR, GEO_BIN_PRECISION, GEO_MAP_MAX_POINTS, GEO_MAP_TOP_SOURCES,
+    MAIN_LOG_FILE
+)
+from utils.rollups import BucketStore
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+@lru_cache(maxsize=65536)
+def geohash(lat, lon, precision=GEO_BIN_PRECISION):
+    """Geohash of a coordinate, cached since sources share city locations"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def _coordinates(event):
+    lat, lon = event.get('lat'), event.get('lon')
+    if isinstance(lat, (int, float)) and isinstance(lon, (int, float)):
+        return float(lat), float(lon)
+    return None
+
+
+class GeoBucket:
+    """Cell and source counts for one hour of events"""
+
+    def __init__(self):
+        self.cells = {}    # geohash -> [count, lat sum, lon sum]
+        self.sources = {}  # ip -> [count, lat, lon]
+
+    def add(self, event):
+        ip = event.get('source_ip')
+        coordinates = _coordinates(event)
+        if ip:
+            source = self.sources.get(ip)
+            if source is None:
+                source = self.sources[ip] = [0, None, None]
+            source[0] += 1
+            if coordinates is not None:
+                source[1], source[2] = coordinates
+        if coordinates is not None:
+            cell = geohash(coordinates[0], coordinates[1])
+            totals = self.cells.get(cell)
+            if totals is None:
+                totals = self.cells[cell] = [0, 0.0, 0.0]
+            totals[0] += 1
+            totals[1] += coordinates[0]
+            totals[2] += coordinates[1]
+
+    def merge(self, other):
+        for cell, (count, lat_sum, lon_sum) in other.cells.items():
+            totals = self.cells.get(cell)
+            if totals is None:
+                self.cells[cell] = [count, lat_sum, lon_sum]
+            else:
+                totals[0] += count
+                totals[1] += lat_sum
+                totals[2] += lon_sum
+        for ip, (count, lat, lon) in other.sources.items():
+            source = self.sources.get(ip)
+            if source is None:
+                self.sources[ip] = [count, lat, lon]
+            else:
+                source[0] += count
+                if lat is not None:
+                    source[1], source[2] = lat, lon
+        return self
+
+    def to_dict(self):
+        return {'cells': self.cells, 'sources': self.sources}
+
+    @classmethod
+    def from_dict(cls, data):
+        bucket = cls()
+        bucket.cells = data['cells']
+        bucket.sources = data['sources']
+        return bucket
+
+
+class GeoBinStore(BucketStore):
+    """Hourly geohash bins persisted as one JSON file per bucket"""
+
+    version = 1
+    bucket_class = GeoBucket
+
+    def __init__(self, bin_dir=GEO_BIN_DIR, log_file=MAIN_LOG_FILE):
+        super().__init__(bin_dir, log_file)
+
+    def map_points(self, start=None, end=None, max_points=GEO_MAP_MAX_POINTS,
+                   top_n=GEO_MAP_TOP_SOURCES, precision=None):
+        """Binned cells and exact top sources for a window
+
+        Returns (cells, sources) DataFrames with lat, lon and attacks
+        columns. The top sources' events are taken out of the cells, and
+        cells are merged by shorter geohash prefixes until at most
+        max_points - top_n remain, so the total number of points is
+        bounded whatever the window holds.
+        """
+        merged = self.window(start, end)
+
+        top = heapq.nlargest(top_n, merged.sources.items(), key=lambda item: item[1][0])
+        sources = pd.DataFrame(
+            [(ip, count, lat, lon) for ip, (count, lat, lon) in top],
+            columns=['source_ip', 'attacks', 'lat', 'lon']
+        )
+
+        cells = pd.DataFrame(
+            [(cell, count, lat_sum, lon_sum) for cell, (count, lat_sum, lon_sum) in merged.cells.items()],
+            columns=['cell', 'attacks', 'lat_sum', 'lon_sum']
+        )
+        located = sources.dropna(subset=['lat', 'lon'])
+        if not cells.empty and not located.empty:
+            # Exact sources are plotted on their own; remove them from the bins
+            removed = pd.DataFrame({
+                'cell': [geohash(lat, lon) for lat, lon in zip(located['lat'], located['lon'])],
+                'attacks': located['attacks'].to_numpy(),
+                'lat_sum': located['attacks'].to_numpy() * located['lat'].to_numpy(),
+                'lon_sum': located['attacks'].to_numpy() * located['lon'].to_numpy(),
+            }).groupby('cell').sum()
+            cells = cells.set_index('cell')
+            cells = cells.sub(removed.reindex(cells.index, fill_value=0)).reset_index()
+            cells = cells[cells['attacks'] > 0]
+
+        budget = max(1, max_points - len(sources))
+        precision = precision or GEO_BIN_PRECISION
+        while not cells.empty:
+            binned = cells.groupby(cells['cell'].str[:precision], sort=False)[['attacks', 'lat_sum', 'lon_sum']].sum()
+            if len(binned) <= budget or precision == 1:
+                break
+            precision -= 1
+        else:
+            binned = cells.set_index('cell')[['attacks', 'lat_sum', 'lon_sum']]
+
+        if len(binned) > budget:
+            binned = binned.nlargest(budget, 'attacks')
+        binned = binned.reset_index().rename(columns={'index': 'cell'})
+        binned['lat'] = binned['lat_sum'] / binned['attacks']
+        binned['lon'] = binned['lon_sum'] / binned['attacks']
+        binned['precision'] = precision
+        return binned[['cell', 'precision', 'attacks', 'lat', 'lon']], sources
+
+
+def marker_sizes(counts, smallest=6, largest=40):
+    """Marker diameters proportional to the square root of counts"""
+    counts = np.asarray(counts, dtype=float)
+    if not len(counts) or counts.max() <= 0:
+        return counts
+    return smallest + (largest - smallest) * np.sqrt(counts / counts.max())
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_geo_bins(bin_dir=GEO_BIN_DIR, log_file=MAIN_LOG_FILE):
+    """Return the process-wide GeoBinStore for a log file"""
+    key = (os.path.abspath(bin_dir), os.path.abspath(log_file))
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = GeoBinStore(bin_dir, log_file)
+        return _stores[key]
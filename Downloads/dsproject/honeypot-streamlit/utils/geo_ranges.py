@@ -0,0 +1,192 @@
+"""
+IP range table for geolocation without an MMDB database
+
+Built once from a CSV of IP ranges (start, end, country and optionally
+country_code, region, city, lat, lon, asn, as_org) into sorted NumPy
+arrays saved as .npy files, which later processes map instantly. IPv4
+ranges are kept as uint32 and IPv6 ranges as 16-byte big-endian strings
+('S16'), whose byte order matches numeric order. A whole column of addresses is resolved
+with one searchsorted call per address family.
+"""
+import ipaddress
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from config.settings import GEOIP_RANGES_DIR
+from utils.data_processor import write_json_atomic
+
+RANGE_FIELDS = ('country', 'country_code', 'region', 'city', 'lat', 'lon', 'asn', 'as_org')
+ARRAYS = ('v4_starts', 'v4_ends', 'v4_records', 'v6_starts', 'v6_ends', 'v6_records')
+
+def _parse_ipv4(texts):
+    """Parse dotted-quad strings with array operations on their bytes
+
+    Returns (valid mask, uint32 values, has-colon mask).
+    """
+    count = len(texts)
+    b = np.frombuffer(('\n'.join(texts) + '\n').encode('utf-8', 'replace'), dtype=np.uint8)
+    newline = b == 10
+    if int(newline.sum()) != count:
+        # An address contained a newline; fall back to parsing one by one
+        valid = np.zeros(count, dtype=bool)
+        values = np.zeros(count, dtype=np.uint32)
+        for i, text in enumerate(texts):
+            try:
+                address = ipaddress.IPv4Address(text)
+            except ValueError:
+                continue
+            valid[i], values[i] = True, int(address)
+        return valid, values, np.array([':' in text for text in texts], dtype=bool)
+
+    dot = b == 46
+    digit = (b >= 48) & (b <= 57)
+    boundary = newline | dot
+    line = np.cumsum(newline) - newline
+    field = np.cumsum(boundary) - boundary
+    field_ends = np.flatnonzero(boundary)
+    fields = len(field_ends)
+
+    # Each digit contributes digit * 10^(digits after it in its field)
+    positions = np.flatnonzero(digit)
+    exponents = field_ends[field[positions]] - positions - 1
+    octets = np.bincount(
+        field[positions], weights=(b[positions] - 48) * 10.0 ** np.minimum(exponents, 9), minlength=fields
+    )
+    digits = np.bincount(field[positions], minlength=fields)
+
+    valid = np.bincount(line[~(digit | boundary)], minlength=count) == 0
+    valid &= np.bincount(line[dot], minlength=count) == 3
+    first = field[np.r_[0, field_ends[newline[field_ends]][:-1] + 1]]
+    values = np.zeros(count, dtype=np.uint32)
+    for k in range(4):
+        index = np.minimum(first + k, fields - 1)
+        valid &= (digits[index] >= 1) & (digits[index] <= 3) & (octets[index] <= 255)
+        values = (values << np.uint32(8)) | np.where(valid, octets[index], 0).astype(np.uint32)
+    values[~valid] = 0
+    return valid, values, np.bincount(line[b == 58], minlength=count) > 0
+
+
+def parse_ips(ips):
+    """Split addresses into IPv4 integers and IPv6 byte strings
+
+    Returns (v4 mask, uint32 values, v6 mask, 'S16' values); entries that
+    are not valid addresses are in neither mask.
+    """
+    texts = [ip if isinstance(ip, str) else str(ip) for ip in ips]
+    v4, v4_values, colon = _parse_ipv4(texts)
+
+    v6 = np.zeros(len(texts), dtype=bool)
+    v6_values = np.zeros(len(texts), dtype='S16')
+    for i in np.flatnonzero(colon):
+        try:
+            address = ipaddress.IPv6Address(texts[i].strip())
+        except ValueError:
+            continue
+        if address.ipv4_mapped is not None:
+            v4[i] = True
+            v4_values[i] = int(address.ipv4_mapped)
+        else:
+            v6[i] = True
+            v6_values[i] = address.packed
+    return v4, v4_values, v6, v6_values
+
+
+def _address_value(value):
+    """Integer (IPv4) or packed bytes (IPv6) for a CSV range bound"""
+    text = str(value).strip()
+    if text.isdigit():
+        number = int(text)
+        return number if number <= 0xFFFFFFFF else number.to_bytes(16, 'big')
+    address = ipaddress.ip_address(text)
+    return int(address) if address.version == 4 else address.packed
+
+
+def build_range_table(csv_file, directory=GEOIP_RANGES_DIR):
+    """Convert a CSV of IP ranges into the .npy range table
+
+    Returns the number of ranges written.
+    """
+    ranges = pd.read_csv(csv_file, dtype=str, keep_default_na=False)
+    for field in RANGE_FIELDS:
+        if field not in ranges.columns:
+            ranges[field] = ''
+
+    # One shared record per distinct location/network
+    record_ids = {}
+    records = []
+    families = {4: ([], [], []), 6: ([], [], [])}
+    for row in ranges.itertuples(index=False):
+        start, end = _address_value(row.start), _address_value(row.end)
+        family = 4 if isinstance(start, int) else 6
+        record = (
+            row.country or 'Unknown',
+            row.country_code or None,
+            row.region or None,
+            row.city or None,
+            float(row.lat) if row.lat else None,
+            float(row.lon) if row.lon else None,
+            int(row.asn) if row.asn else None,
+            row.as_org or None,
+        )
+        if record not in record_ids:
+            record_ids[record] = len(records)
+            records.append(record)
+        starts, ends, ids = families[family]
+        starts.append(start)
+        ends.append(end)
+        ids.append(record_ids[record])
+
+    os.makedirs(directory, exist_ok=True)
+    for family, dtype in ((4, np.uint32), (6, 'S16')):
+        starts, ends, ids = families[family]
+        starts = np.array(starts, dtype=dtype)
+        order = np.argsort(starts, kind='stable')
+        prefix = f'v{family}_'
+        np.save(os.path.join(directory, prefix + 'starts.npy'), starts[order])
+        np.save(os.path.join(directory, prefix + 'ends.npy'), np.array(ends, dtype=dtype)[order])
+        np.save(os.path.join(directory, prefix + 'records.npy'), np.array(ids, dtype=np.int32)[order])
+    write_json_atomic(os.path.join(directory, 'records.json'), {'fields': list(RANGE_FIELDS), 'records': records})
+    return len(ranges)
+
+
+class RangeTable:
+    """Memory-mapped range table resolving addresses with searchsorted"""
+
+    def __init__(self, directory=GEOIP_RANGES_DIR):
+        self.directory = directory
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(directory, name + '.npy'), mmap_mode='r'))
+        with open(os.path.join(directory, 'records.json'), 'r') as f:
+            table = json.load(f)
+        self.records = [
+            dict(dict.fromkeys(RANGE_FIELDS), **dict(zip(table['fields'], record)))
+            for record in table['records']
+        ]
+
+    @staticmethod
+    def exists(directory=GEOIP_RANGES_DIR):
+        """True if a built table is present in a directory"""
+        return os.path.exists(os.path.join(directory, 'records.json'))
+
+    def _search(self, starts, ends, ids, values):
+        if not len(starts) or not len(values):
+            return np.full(len(values), -1, dtype=np.int32)
+        i = np.searchsorted(starts, values, side='right') - 1
+        found = (i >= 0) & (values <= ends[np.maximum(i, 0)])
+        return np.where(found, ids[np.maximum(i, 0)], -1).astype(np.int32)
+
+    def resolve(self, ips):
+        """Record index for each address, -1 where no range matches"""
+        v4, v4_values, v6, v6_values = parse_ips(ips)
+        result = np.full(len(v4), -1, dtype=np.int32)
+        result[v4] = self._search(self.v4_starts, self.v4_ends, self.v4_records, v4_values[v4])
+        result[v6] = self._search(self.v6_starts, self.v6_ends, self.v6_records, v6_values[v6])
+        return result
+
+    def lookup_many(self, ips, unknown):
+        """Record dicts for a sequence of addresses, `unknown` where unmatched"""
+        table = self.records + [unknown]
+        return [table[i] for i in self.resolve(ips).tolist()]
@@ -0,0 +1,329 @@
+"""
+Local GeoIP lookups for attacker addresses
+
+Addresses are resolved against MaxMind-format databases on disk (city and,
+optionally, ASN), opened once per process in memory-mapped mode, or else
+against a range table built from CSV files (see utils.geo_ranges). No
+network service is ever queried. A bounded LRU sits in front of the
+databases, and resolved records are persisted to the geo cache so they
+survive restarts: new records are appended to a journal next to the cache
+file, which is folded into the cache (keeping the most recent entries)
+once it grows past GEO_CACHE_COMPACT_ENTRIES.
+"""
+import ipaddress
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import maxminddb
+import numpy as np
+import pandas as pd
+from maxminddb import MODE_MMAP, MODE_MMAP_EXT
+
+from config.settings import (
+    GEO_CACHE_COMPACT_ENTRIES, GEO_CACHE_FILE, GEO_CACHE_MAX_ENTRIES,
+    GEOIP_ASN_DATABASE, GEOIP_DATABASE, GEOIP_ENABLED, GEOIP_LRU_SIZE,
+    GEOIP_RANGES_DIR
+)
+from utils.data_processor import write_json_atomic
+from utils.geo_ranges import RangeTable
+
+GEO_FIELDS = ('country', 'country_code', 'region', 'city', 'lat', 'lon', 'asn', 'as_org')
+UNKNOWN = {'country': 'Unknown', 'country_code': None, 'region': None, 'city': None,
+           'lat': None, 'lon': None, 'asn': None, 'as_org': None}
+NUMERIC_FIELDS = ('lat', 'lon', 'asn')
+
+CACHE_VERSION = 2
+
+
+def _open_database(path):
+    """Open a database memory-mapped, or return None if it is unavailable
+
+    The C extension reader is used when it is built; the pure-Python
+    reader maps the file the same way.
+    """
+    if not path or not os.path.exists(path):
+        return None
+    for mode in (MODE_MMAP_EXT, MODE_MMAP):
+        try:
+            return maxminddb.open_database(path, mode)
+        except ImportError:
+            continue
+        except (OSError, ValueError) as e:
+            logging.error(f"Error opening GeoIP database {path}: {e}")
+            return None
+    return None
+
+
+def _name(entry):
+    return (entry or {}).get('names', {}).get('en')
+
+
+class GeoLocator:
+    """Resolves IP addresses to location and network records"""
+
+    def __init__(self, database=GEOIP_DATABASE, asn_database=GEOIP_ASN_DATABASE,
+                 cache_file=GEO_CACHE_FILE, cache_size=GEOIP_LRU_SIZE, enabled=GEOIP_ENABLED,
+                 ranges_dir=GEOIP_RANGES_DIR):
+        self.cache_file = cache_file
+        self.journal_file = cache_file + '.journal' if cache_file else None
+        self.cache_size = cache_size
+        self._lock = threading.RLock()
+        self._lru = OrderedDict()
+        self._pending = []
+        self._journal_entries = 0
+
+        self.city_reader = _open_database(database) if enabled else None
+        self.asn_reader = _open_database(asn_database) if enabled else None
+        self.ranges = None
+        if enabled and self.city_reader is None and ranges_dir and RangeTable.exists(ranges_dir):
+            # Range lookups are cheaper than the cache, so they bypass it
+            self.ranges = RangeTable(ranges_dir)
+        self.database_build = self._database_build()
+        self._load_cache()
+
+    @property
+    def available(self):
+        """True if a city database or range table is open"""
+        return self.city_reader is not None or self.ranges is not None
+
+    def _database_build(self):
+        builds = [
+            reader.metadata().build_epoch
+            for reader in (self.city_reader, self.asn_reader) if reader is not None
+        ]
+        return builds or None
+
+    def _read_cache(self):
+        """Cached entries from the compacted cache and its journal, oldest first"""
+        entries = OrderedDict()
+        try:
+            with open(self.cache_file, 'r') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+        # Without a database, whatever was resolved before is still served
+        current = self.database_build is None or cache.get('database') == self.database_build
+        if cache.get('version') == CACHE_VERSION and current:
+            entries.update(cache.get('entries', {}))
+
+        journal_entries = 0
+        try:
+            with open(self.journal_file, 'r') as f:
+                for line in f:
+                    try:
+                        database, ip, record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if len(record) != len(GEO_FIELDS):
+                        continue
+                    journal_entries += 1
+                    if self.database_build is None or database == self.database_build:
+                        entries.pop(ip, None)
+                        entries[ip] = record
+        except OSError:
+            pass
+        return entries, journal_entries
+
+    def _load_cache(self):
+        if not self.cache_file:
+            return
+        entries, self._journal_entries = self._read_cache()
+        # Keep the most recently resolved entries in memory
+        for ip in list(entries)[-self.cache_size:]:
+            self._lru[ip] = dict(zip(GEO_FIELDS, entries[ip]))
+
+    def _resolve(self, ip):
+        """Look an address up in the databases"""
+        record = dict(UNKNOWN)
+        city = self.city_reader.get(ip) if self.city_reader is not None else None
+        if city:
+            country = city.get('country') or city.get('registered_country') or {}
+            location = city.get('location', {})
+            subdivisions = city.get('subdivisions') or [None]
+            record.update(
+                country=_name(country) or 'Unknown',
+                country_code=country.get('iso_code'),
+                region=_name(subdivisions[0]),
+                city=_name(city.get('city')),
+                lat=location.get('latitude'),
+                lon=location.get('longitude'),
+            )
+        asn = self.asn_reader.get(ip) if self.asn_reader is not None else None
+        if asn:
+            record.update(asn=asn.get('autonomous_system_number'), as_org=asn.get('autonomous_system_organization'))
+        return record
+
+    def lookup(self, ip):
+        """Location record for one address (country 'Unknown' if unresolved)"""
+        if self.ranges is not None:
+            return self.ranges.lookup_many([ip], UNKNOWN)[0]
+
+        with self._lock:
+            record = self._lru.get(ip)
+            if record is not None:
+                self._lru.move_to_end(ip)
+                return record
+
+        try:
+            ip = str(ipaddress.ip_address(str(ip).strip()))
+        except ValueError:
+            return dict(UNKNOWN)
+        with self._lock:
+            record = self._lru.get(ip)
+            if record is not None:
+                self._lru.move_to_end(ip)
+                return record
+
+        if self.city_reader is None and self.asn_reader is None:
+            return dict(UNKNOWN)
+
+        record = self._resolve(ip)
+        with self._lock:
+            self._lru[ip] = record
+            if len(self._lru) > self.cache_size:
+                self._lru.popitem(last=False)
+            self._pending.append((ip, record))
+        return record
+
+    def lookup_many(self, ips):
+        """Records for a sequence of addresses, persisting new ones once"""
+        if self.ranges is not None:
+            return self.ranges.lookup_many(ips, UNKNOWN)
+        records = [self.lookup(ip) for ip in ips]
+        self.flush()
+        return records
+
+    def flush(self):
+        """Append newly resolved records to the cache journal"""
+        if not self.cache_file:
+            return
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, []
+            try:
+                os.makedirs(os.path.dirname(self.journal_file) or '.', exist_ok=True)
+                with open(self.journal_file, 'a') as f:
+                    for ip, record in pending:
+                        f.write(json.dumps([self.database_build, ip, [record[field] for field in GEO_FIELDS]]) + '\n')
+            except OSError as e:
+                logging.error(f"Error writing geo cache journal: {e}")
+                return
+            self._journal_entries += len(pending)
+            if self._journal_entries >= GEO_CACHE_COMPACT_ENTRIES:
+                self.compact()
+
+    def compact(self, max_entries=GEO_CACHE_MAX_ENTRIES):
+        """Fold the journal into the cache file, keeping the newest entries"""
+        with self._lock:
+            entries, _ = self._read_cache()
+            keep = list(entries.items())[-max_entries:]
+            write_json_atomic(self.cache_file, {
+                'version': CACHE_VERSION,
+                'database': self.database_build,
+                'entries': dict(keep),
+            })
+            with open(self.journal_file, 'w'):
+                pass
+            self._journal_entries = 0
+            return len(keep)
+
+
+_locator = None
+_locator_lock = threading.Lock()
+
+
+def get_locator():
+    """Return the process-wide GeoLocator"""
+    global _locator
+    with _locator_lock:
+        if _locator is None:
+            _locator = GeoLocator()
+        return _locator
+
+
+def geo_columns(ips, fields=('country',)):
+    """Resolve a column of addresses, looking each distinct one up once
+
+    Returns {field: values} aligned with `ips`. String fields come back as
+    Categoricals built from the per-address results, so the per-event work
+    is a single integer gather; numeric fields come back as float arrays.
+    """
+    codes, uniques = pd.factorize(pd.Series(ips, dtype=object), sort=False)
+    if len(uniques) == 0:
+        return {
+            field: np.full(len(codes), np.nan) if field in NUMERIC_FIELDS
+            else pd.Categorical.from_codes(codes, categories=pd.Index([], dtype=object))
+            for field in fields
+        }
+    records = get_locator().lookup_many(uniques.tolist())
+    missing = codes < 0
+
+    columns = {}
+    for field in fields:
+        values = [record[field] for record in records]
+        if field in NUMERIC_FIELDS:
+            lookup = np.array([np.nan if value is None else value for value in values], dtype=float)
+            column = lookup[codes]
+            column[missing] = np.nan
+        else:
+            value_codes, categories = pd.factorize(pd.Series(values, dtype=object), sort=False)
+            column = pd.Categorical.from_codes(
+                np.where(missing, -1, value_codes[codes]), categories=categories
+            )
+        columns[field] = column
+    return columns
+
+
+def fill_geo_columns(df, fields=('country',)):
+    """Add location columns to an event frame
+
+    Events enriched at ingest already carry the fields; only events stored
+    without them (older logs, or enrichment disabled) are looked up.
+    """
+    if df.empty or 'source_ip' not in df.columns:
+        return df
+
+    missing = df['country'].isna().to_numpy() if 'country' in df.columns else np.ones(len(df), dtype=bool)
+    if not missing.any() and all(field in df.columns for field in fields):
+        return df
+
+    resolved = geo_columns(df['source_ip'].to_numpy()[missing], fields) if missing.any() else {}
+    for field in fields:
+        if field in df.columns:
+            column = df[field].to_numpy(dtype=object, copy=True)
+        else:
+            column = np.full(len(df), None, dtype=object)
+        if field in resolved:
+            column[missing] = np.asarray(resolved[field], dtype=object)
+        if field in NUMERIC_FIELDS:
+            df[field] = pd.to_numeric(column, errors='coerce')
+        else:
+            df[field] = pd.Categorical(column)
+    return df
+
+
+def enrich_event(event):
+    """Attach location and network fields for an event's source address
+
+    Called on the write path, so lookups go through the locator's hot
+    cache and nothing is added when no database is available.
+    """
+    locator = get_locator()
+    if not event.get('source_ip') or not locator.available:
+        return event
+
+    record = locator.lookup(event['source_ip'])
+    locator.flush()
+    for field in GEO_FIELDS:
+        if record[field] is not None:
+            event[field] = record[field]
+    return event
+
+
+def get_country_from_ip(ip):
+    """Country name for an address, or 'Unknown'"""
+    return get_locator().lookup(ip)['country']
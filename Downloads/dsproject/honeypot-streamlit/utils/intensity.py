@@ -0,0 +1,222 @@
+"""
+Day-of-week by hour-of-day attack intensity
+
+Events are counted at ingest into a (types x 7 x 24) array in
+HEATMAP_TIMEZONE, persisted as a small .npy file next to its state.
+Timestamps without an offset are taken to be in LOG_TIMEZONE. The
+all-time heatmap is read straight from the array; for a date range the
+hourly rollup buckets outside it are subtracted, or the ones inside it
+summed when they are fewer. Buckets are hours of LOG_TIMEZONE, so this
+only works when the two zones are a whole number of hours apart; for
+zones such as Asia/Kolkata against UTC a range is counted from its raw
+events instead.
+"""
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+from config.settings import (
+    HEATMAP_TIMEZONE, INTENSITY_DIR, LOG_TIMEZONE, MAIN_LOG_FILE
+)
+from utils.data_processor import LogConsumer, write_json_atomic
+from utils.rollups import BUCKET_FORMAT, STATE_FILE
+from utils.time_index import read_window
+
+DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+MATRIX_FILE = 'counts.npy'
+
+
+def whole_hours_apart(zone, other, years=3):
+    """True if two zones stayed a whole number of hours apart over recent years"""
+    moment = datetime.now(dt_timezone.utc) - timedelta(days=365 * (years - 1))
+    for _ in range(366 * years):
+        if (moment.astimezone(zone).utcoffset() - moment.astimezone(other).utcoffset()) % timedelta(hours=1):
+            return False
+        moment += timedelta(days=1)
+    return True
+
+
+class IntensityMatrix(LogConsumer):
+    """Per-type 7x24 event counts kept current from the log"""
+
+    version = 1
+
+    def __init__(self, matrix_dir=INTENSITY_DIR, log_file=MAIN_LOG_FILE,
+                 timezone=HEATMAP_TIMEZONE, log_timezone=LOG_TIMEZONE):
+        self.matrix_dir = matrix_dir
+        self.state_path = os.path.join(matrix_dir, STATE_FILE)
+        self.matrix_path = os.path.join(matrix_dir, MATRIX_FILE)
+        self.timezone = timezone
+        self.zone = ZoneInfo(timezone)
+        self.log_zone = ZoneInfo(log_timezone)
+        # Hourly rollup buckets map onto whole heatmap hours
+        self.bucket_aligned = whole_hours_apart(self.zone, self.log_zone)
+        super().__init__(log_file)
+        self.counts = np.zeros((0, 7, 24), dtype=np.int64)
+        self._mtime = None
+        self._dirty = False
+        self.refresh()
+
+    @property
+    def types(self):
+        return self.manifest['types']
+
+    def new_manifest(self):
+        manifest = super().new_manifest()
+        manifest.update(timezone=self.timezone, types=[])
+        return manifest
+
+    def localize(self, timestamp):
+        """A timestamp in the heatmap's time zone"""
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=self.log_zone)
+        return timestamp.astimezone(self.zone)
+
+    def refresh(self):
+        with self._lock:
+            if self._dirty:
+                return
+            try:
+                mtime = os.stat(self.state_path).st_mtime_ns
+            except OSError:
+                return
+            if mtime == self._mtime:
+                return
+            try:
+                with open(self.state_path, 'r') as f:
+                    manifest = json.load(f)
+                counts = np.load(self.matrix_path)
+            except (OSError, ValueError):
+                return
+            self.manifest, self.counts, self._mtime = manifest, counts, mtime
+
+    def prepare(self):
+        with self._lock:
+            super().prepare()
+            if self.manifest.get('timezone') != self.timezone:
+                # Counted in another zone; the hours no longer line up
+                self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.manifest = self.new_manifest()
+            self.counts = np.zeros((0, 7, 24), dtype=np.int64)
+            self._dirty = True
+            self.flush(0)
+
+    def rollback(self):
+        with self._lock:
+            self.manifest = self.new_manifest()
+            self.counts = np.zeros((0, 7, 24), dtype=np.int64)
+            self._dirty = False
+            self._mtime = None
+            self.refresh()
+
+    def _local_time(self, event):
+        try:
+            timestamp = datetime.fromisoformat(str(event.get('timestamp')).replace('Z', '+00:00'))
+        except ValueError:
+            return None
+        return self.localize(timestamp)
+
+    def add(self, offset, event):
+        local = self._local_time(event)
+        if local is None:
+            return
+
+        event_type = event.get('type', 'unknown')
+        types = self.manifest['types']
+        if event_type not in types:
+            types.append(event_type)
+            self.counts = np.concatenate([self.counts, np.zeros((1, 7, 24), dtype=np.int64)])
+        self.counts[types.index(event_type), local.weekday(), local.hour] += 1
+        self._dirty = True
+
+    def flush(self, checkpoint):
+        with self._lock:
+            os.makedirs(self.matrix_dir, exist_ok=True)
+            tmp_path = self.matrix_path + '.tmp.npy'
+            np.save(tmp_path, self.counts)
+            os.replace(tmp_path, self.matrix_path)
+
+            self.manifest['checkpoint'] = checkpoint
+            if self.manifest['log_identity'] is None:
+                self.manifest['log_identity'] = super().new_manifest()['log_identity']
+            write_json_atomic(self.state_path, self.manifest)
+            self._mtime = os.stat(self.state_path).st_mtime_ns
+            self._dirty = False
+
+    def matrix(self, event_type=None):
+        """All-time 7x24 counts, for one event type or all of them"""
+        with self._lock:
+            if event_type is None:
+                return self.counts.sum(axis=0)
+            if event_type not in self.types:
+                return np.zeros((7, 24), dtype=np.int64)
+            return self.counts[self.types.index(event_type)].copy()
+
+    def from_timestamps(self, timestamps):
+        """7x24 counts for a column of event timestamps, such as a filtered frame's"""
+        timestamps = pd.Series(pd.to_datetime(timestamps, errors='coerce')).dropna()
+        if timestamps.dt.tz is None:
+            timestamps = timestamps.dt.tz_localize(self.log_zone, ambiguous='NaT', nonexistent='NaT').dropna()
+        timestamps = timestamps.dt.tz_convert(self.zone)
+        cells = timestamps.dt.dayofweek.to_numpy() * 24 + timestamps.dt.hour.to_numpy()
+        return np.bincount(cells, minlength=7 * 24).reshape(7, 24)
+
+    def _from_buckets(self, buckets, event_type):
+        counts = np.zeros((7, 24), dtype=np.int64)
+        for key, bucket in buckets:
+            count = bucket.count if event_type is None else bucket.types.get(event_type, 0)
+            local = self.localize(datetime.strptime(key, BUCKET_FORMAT))
+            counts[local.weekday(), local.hour] += count
+        return counts
+
+    def _from_events(self, start, end, event_type):
+        counts = np.zeros((7, 24), dtype=np.int64)
+        for _, _, event in read_window(start, end, self.log_file):
+            if event_type is not None and event.get('type', 'unknown') != event_type:
+                continue
+            local = self._local_time(event)
+            if local is not None:
+                counts[local.weekday(), local.hour] += 1
+        return counts
+
+    def window(self, rollups, start=None, end=None, event_type=None):
+        """7x24 counts for the hours overlapping [start, end]
+
+        Uses the rollup store's hourly buckets, so ranges are rounded out
+        to whole hours. When those hours do not line up with the heatmap's
+        zone the window's events are read and counted exactly.
+        """
+        if start is None and end is None:
+            return self.matrix(event_type)
+        if not self.bucket_aligned:
+            return self._from_events(start, end, event_type)
+
+        inside = rollups.buckets_in(start, end)
+        included = {key for key, _ in inside}
+        outside = [(key, bucket) for key, bucket in rollups.buckets_in() if key not in included]
+
+        if len(inside) <= len(outside):
+            return self._from_buckets(inside, event_type)
+        # The matrix and the rollups may be a batch apart; never go negative
+        return np.maximum(self.matrix(event_type) - self._from_buckets(outside, event_type), 0)
+
+
+_matrices = {}
+_matrices_lock = threading.Lock()
+
+
+def get_intensity(matrix_dir=INTENSITY_DIR, log_file=MAIN_LOG_FILE):
+    """Return the process-wide IntensityMatrix for a log file"""
+    key = (os.path.abspath(matrix_dir), os.path.abspath(log_file))
+    with _matrices_lock:
+        if key not in _matrices:
+            _matrices[key] = IntensityMatrix(matrix_dir, log_file)
+        return _matrices[key]
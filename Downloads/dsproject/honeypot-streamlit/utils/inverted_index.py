@@ -0,0 +1,322 @@
+"""
+Inverted index over the honeypot log
+
+Maps source IPs, usernames, password hashes, HTTP paths and command tokens
+to postings lists of event offsets (byte positions in the log). Postings
+are written in immutable segments as delta-encoded integer arrays, one
+uncompressed .npy file per array in a directory per segment, and are
+memory-mapped when read, so lookups page in only the parts they touch and
+resident memory does not grow with the size of the index. Segments are
+merged in tiers: once INDEX_MAX_SEGMENTS segments share a level they are
+combined into one segment of the next level, which keeps both the segment
+count and the merge cost logarithmic in the log size.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+
+from config.settings import INDEX_DIR, INDEX_MAX_SEGMENTS, MAIN_LOG_FILE
+from utils.data_processor import LogConsumer, read_events_at, write_json_atomic
+
+INDEXED_FIELDS = ('source_ip', 'username', 'password', 'path', 'command')
+
+MANIFEST_FILE = 'manifest.json'
+
+
+def password_term(password):
+    """Index term for a plaintext password"""
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+def index_terms(event):
+    """Yield (field, term) pairs to index for an event"""
+    for field in ('source_ip', 'username', 'path'):
+        value = event.get(field)
+        if value:
+            yield field, str(value)
+
+    if event.get('password_hash'):
+        yield 'password', event['password_hash']
+    elif event.get('password'):
+        yield 'password', password_term(event['password'])
+
+    if event.get('command'):
+        for token in set(str(event['command']).split()):
+            yield 'command', token
+
+
+def encode_postings(terms, codes, offsets):
+    """Encode postings as sorted terms plus delta-encoded offset arrays
+
+    codes[i] is the index into terms of the posting at offsets[i]. Every
+    term must have at least one posting.
+    """
+    order = np.lexsort((offsets, codes))
+    codes = codes[order]
+    offsets = offsets[order].astype(np.int64)
+
+    starts = np.searchsorted(codes, np.arange(len(terms) + 1))
+    firsts = offsets[starts[:-1]]
+    deltas = np.diff(offsets, prepend=0)
+    deltas[starts[:-1]] = 0
+    dtype = np.min_scalar_type(int(deltas.max())) if len(deltas) else np.uint8
+
+    return {
+        'terms': np.asarray(terms),
+        'starts': starts.astype(np.int64),
+        'firsts': firsts,
+        'deltas': deltas.astype(dtype),
+    }
+
+
+def decode_postings(postings, i):
+    """Decode the offsets of the i-th term in an encoded postings block"""
+    start, end = postings['starts'][i], postings['starts'][i + 1]
+    deltas = postings['deltas'][start:end].astype(np.int64)
+    return postings['firsts'][i] + np.cumsum(deltas)
+
+
+def decode_all_postings(postings):
+    """Decode every postings list of a block into one flat offset array"""
+    deltas = postings['deltas'].astype(np.int64)
+    totals = np.cumsum(deltas)
+    lengths = np.diff(postings['starts'])
+    base = postings['firsts'] - totals[postings['starts'][:-1]]
+    return np.repeat(base, lengths) + totals
+
+
+class InvertedIndex(LogConsumer):
+    """Segmented on-disk inverted index for one log file
+
+    update() indexes everything appended to the log since the checkpoint
+    and writes it as a new segment. A single process should write the
+    index, others only read it.
+    """
+
+    def __init__(self, index_dir=INDEX_DIR, log_file=MAIN_LOG_FILE):
+        super().__init__(log_file)
+        self.index_dir = index_dir
+        self.manifest_path = os.path.join(index_dir, MANIFEST_FILE)
+        self._manifest_mtime = None
+        self._segments = {}
+        self._pending = {}
+        self.refresh()
+
+    version = 3
+
+    def new_manifest(self):
+        manifest = super().new_manifest()
+        manifest.update(segments=[], levels={}, next_segment=0)
+        return manifest
+
+    def refresh(self):
+        """Reload the manifest if another process has changed it"""
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._manifest_mtime:
+            return
+
+        with open(self.manifest_path, 'r') as f:
+            self.manifest = json.load(f)
+        self._manifest_mtime = mtime
+        for name in list(self._segments):
+            if name not in self.manifest['segments']:
+                del self._segments[name]
+
+    def _write_manifest(self):
+        write_json_atomic(self.manifest_path, self.manifest)
+        self._manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
+
+    def _load_segment(self, name):
+        """Memory-mapped arrays of a segment as {field: {part: array}}"""
+        segment = self._segments.get(name)
+        if segment is None:
+            segment = {}
+            path = os.path.join(self.index_dir, name)
+            for file_name in os.listdir(path):
+                field, part, _ = file_name.split('.')
+                segment.setdefault(field, {})[part] = np.load(os.path.join(path, file_name), mmap_mode='r')
+            self._segments[name] = segment
+        return segment
+
+    def _write_segment(self, arrays):
+        """Write {field.part: array} as the next segment, returning its name"""
+        name = 'postings-{:06d}'.format(self.manifest['next_segment'])
+        path = os.path.join(self.index_dir, name)
+        tmp_path = path + '.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for key, array in arrays.items():
+            np.save(os.path.join(tmp_path, key + '.npy'), array)
+        os.replace(tmp_path, path)
+        return name
+
+    def _remove_segment(self, name):
+        path = os.path.join(self.index_dir, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def reset(self):
+        """Drop all segments and start indexing the log from the beginning"""
+        with self._lock:
+            for name in self.manifest['segments']:
+                self._remove_segment(name)
+            self._segments.clear()
+            self._pending.clear()
+            self.manifest = self.new_manifest()
+            self._write_manifest()
+
+    def rollback(self):
+        """Drop queued postings and reload the manifest"""
+        with self._lock:
+            self._pending.clear()
+            self.manifest = self.new_manifest()
+            self._manifest_mtime = None
+            self.refresh()
+
+    def add(self, offset, event):
+        """Queue an event's terms for the next flush"""
+        for field, term in index_terms(event):
+            self._pending.setdefault((field, term), []).append(offset)
+
+    def flush(self, checkpoint):
+        """Write queued postings as a new segment and advance the checkpoint"""
+        with self._lock:
+            if self._pending:
+                arrays = {}
+                for field in INDEXED_FIELDS:
+                    keys = sorted(term for f, term in self._pending if f == field)
+                    if not keys:
+                        continue
+                    codes, offsets = [], []
+                    for code, term in enumerate(keys):
+                        postings = self._pending[(field, term)]
+                        codes.extend([code] * len(postings))
+                        offsets.extend(postings)
+                    encoded = encode_postings(keys, np.array(codes), np.array(offsets))
+                    for part, array in encoded.items():
+                        arrays[field + '.' + part] = array
+
+                name = self._write_segment(arrays)
+                self.manifest['segments'].append(name)
+                self.manifest['levels'][name] = 0
+                self.manifest['next_segment'] += 1
+                self._pending.clear()
+
+            self.manifest['checkpoint'] = checkpoint
+            if self.manifest['log_identity'] is None:
+                self.manifest['log_identity'] = self.new_manifest()['log_identity']
+            self._write_manifest()
+            self._merge_tiers()
+
+    def _merge_tiers(self):
+        """Merge every level that has accumulated INDEX_MAX_SEGMENTS segments"""
+        while True:
+            levels = self.manifest['levels']
+            by_level = {}
+            for name in self.manifest['segments']:
+                by_level.setdefault(levels[name], []).append(name)
+            full = [names for names in by_level.values() if len(names) >= INDEX_MAX_SEGMENTS]
+            if not full:
+                return
+            self.merge(full[0])
+
+    def merge(self, names=None):
+        """Compact the given segments (default: all) into one"""
+        with self._lock:
+            old_segments = list(names or self.manifest['segments'])
+            if len(old_segments) < 2:
+                return
+
+            arrays = {}
+            for field in INDEXED_FIELDS:
+                terms, codes, offsets = [], [], []
+                for name in old_segments:
+                    postings = self._load_segment(name).get(field)
+                    if postings is None:
+                        continue
+                    lengths = np.diff(postings['starts'])
+                    base = sum(len(t) for t in terms)
+                    codes.append(np.repeat(np.arange(len(lengths)) + base, lengths))
+                    terms.append(postings['terms'])
+                    offsets.append(decode_all_postings(postings))
+                if not terms:
+                    continue
+
+                unique_terms, inverse = np.unique(np.concatenate(terms), return_inverse=True)
+                encoded = encode_postings(
+                    unique_terms, inverse[np.concatenate(codes)], np.concatenate(offsets)
+                )
+                for part, array in encoded.items():
+                    arrays[field + '.' + part] = array
+
+            name = self._write_segment(arrays)
+            levels = self.manifest['levels']
+            level = max(levels[old] for old in old_segments) + 1
+            self.manifest['segments'] = [
+                segment for segment in self.manifest['segments'] if segment not in old_segments
+            ] + [name]
+            for old in old_segments:
+                del levels[old]
+            levels[name] = level
+            self.manifest['next_segment'] += 1
+            self._write_manifest()
+
+            for old in old_segments:
+                self._segments.pop(old, None)
+                self._remove_segment(old)
+
+    def lookup(self, field, value):
+        """Return the sorted log offsets of all events matching a term"""
+        if field not in INDEXED_FIELDS:
+            raise ValueError(f"Unknown index field: {field}")
+        term = password_term(value) if field == 'password' else str(value)
+
+        with self._lock:
+            self.refresh()
+            results = []
+            for name in self.manifest['segments']:
+                postings = self._load_segment(name).get(field)
+                if postings is None:
+                    continue
+                i = np.searchsorted(postings['terms'], term)
+                if i < len(postings['terms']) and postings['terms'][i] == term:
+                    results.append(decode_postings(postings, i))
+            pending = self._pending.get((field, term))
+            if pending:
+                results.append(np.array(pending, dtype=np.int64))
+
+        if not results:
+            return np.array([], dtype=np.int64)
+        return np.unique(np.concatenate(results))
+
+    def search(self, field, value, limit=None):
+        """Return the events matching a term, most recent last"""
+        offsets = self.lookup(field, value)
+        if limit is not None:
+            offsets = offsets[-limit:]
+        return read_events_at(offsets, self.log_file)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(index_dir=INDEX_DIR, log_file=MAIN_LOG_FILE):
+    """Return the process-wide InvertedIndex for a log file"""
+    key = (os.path.abspath(index_dir), os.path.abspath(log_file))
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = InvertedIndex(index_dir, log_file)
+        return _indexes[key]
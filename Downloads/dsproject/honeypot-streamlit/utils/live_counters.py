@@ -0,0 +1,166 @@
+"""
+Live event counters in memory-mapped ring buffers
+
+Each honeypot process owns one ring file holding per-second and
+per-minute counters for the total and for each event type. Writers bump
+the counters as events are logged; the dashboard maps every ring file
+read-only and sums the slots it needs without locks or log parsing.
+
+Ring file layout (native-endian uint64):
+    header  : magic, version, second slots, minute slots
+    seconds : second slots x [epoch second, total, one count per type]
+    minutes : minute slots x [epoch minute, total, one count per type]
+"""
+import glob
+import mmap
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from config.settings import LIVE_COUNTERS_DIR, LIVE_MINUTE_SLOTS, LIVE_SECOND_SLOTS
+
+MAGIC = 0x484F4E45594C4956  # "HONEYLIV"
+VERSION = 1
+
+LIVE_TYPES = ('ssh_attack', 'ssh_command', 'http_attack', 'http_visit')
+SLOT_WIDTH = 2 + len(LIVE_TYPES)
+HEADER_WORDS = 4
+
+
+def _ring_size(second_slots, minute_slots):
+    return 8 * (HEADER_WORDS + (second_slots + minute_slots) * SLOT_WIDTH)
+
+
+def _map_ring(path, writable):
+    """Map a ring file, returning (mmap, seconds array, minutes array)"""
+    with open(path, 'r+b' if writable else 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+    header = np.frombuffer(mm, dtype='=u8', count=HEADER_WORDS)
+    if header[0] != MAGIC or header[1] != VERSION:
+        mm.close()
+        raise ValueError(f"Not a live counter ring: {path}")
+
+    second_slots, minute_slots = int(header[2]), int(header[3])
+    offset = 8 * HEADER_WORDS
+    seconds = np.frombuffer(mm, dtype='=u8', count=second_slots * SLOT_WIDTH, offset=offset)
+    offset += 8 * second_slots * SLOT_WIDTH
+    minutes = np.frombuffer(mm, dtype='=u8', count=minute_slots * SLOT_WIDTH, offset=offset)
+    return mm, seconds.reshape(second_slots, SLOT_WIDTH), minutes.reshape(minute_slots, SLOT_WIDTH)
+
+
+class LiveCounterWriter:
+    """Single-process writer for one ring file"""
+
+    def __init__(self, name, counters_dir=LIVE_COUNTERS_DIR,
+                 second_slots=LIVE_SECOND_SLOTS, minute_slots=LIVE_MINUTE_SLOTS):
+        self.path = os.path.join(counters_dir, name + '.ring')
+        self._lock = threading.Lock()
+
+        size = _ring_size(second_slots, minute_slots)
+        if not os.path.exists(self.path) or os.path.getsize(self.path) != size:
+            os.makedirs(counters_dir, exist_ok=True)
+            header = np.array([MAGIC, VERSION, second_slots, minute_slots], dtype='=u8')
+            with open(self.path, 'wb') as f:
+                f.write(header.tobytes())
+                f.truncate(size)
+        self._mm, seconds, minutes = _map_ring(self.path, writable=True)
+        # Plain memoryview access is much cheaper than NumPy scalar indexing
+        self._words = memoryview(self._mm).cast('Q')
+        self._rings = (
+            (HEADER_WORDS, len(seconds), 1),
+            (HEADER_WORDS + seconds.size, len(minutes), 60),
+        )
+
+    def increment(self, event_type=None, now=None):
+        """Count one event at the current time"""
+        now = int(time.time() if now is None else now)
+        column = 2 + LIVE_TYPES.index(event_type) if event_type in LIVE_TYPES else None
+        words = self._words
+        with self._lock:
+            for base, slots, step in self._rings:
+                epoch = now // step
+                i = base + (epoch % slots) * SLOT_WIDTH
+                if words[i] != epoch:
+                    # Slot holds an older period: clear counts before claiming it
+                    for j in range(i + 1, i + SLOT_WIDTH):
+                        words[j] = 0
+                    words[i] = epoch
+                words[i + 1] += 1
+                if column is not None:
+                    words[i + column] += 1
+
+
+class LiveCounters:
+    """Lock-free reader summing every ring file in a directory"""
+
+    def __init__(self, counters_dir=LIVE_COUNTERS_DIR):
+        self.counters_dir = counters_dir
+        self._rings = {}
+
+    def _rings_now(self):
+        paths = set(glob.glob(os.path.join(self.counters_dir, '*.ring')))
+        for path in set(self._rings) - paths:
+            del self._rings[path]
+        for path in paths - set(self._rings):
+            try:
+                self._rings[path] = _map_ring(path, writable=False)
+            except (OSError, ValueError):
+                continue
+        return list(self._rings.values())
+
+    @property
+    def available(self):
+        """True if at least one writer has created a ring"""
+        return bool(self._rings_now())
+
+    def series(self, resolution='minute', length=60, event_type=None, now=None):
+        """Counts for the last `length` seconds or minutes, oldest first"""
+        now = int(time.time() if now is None else now)
+        step = 1 if resolution == 'second' else 60
+        current = now // step
+        epochs = np.arange(current - length + 1, current + 1, dtype=np.uint64)
+        column = 1 if event_type is None else 2 + LIVE_TYPES.index(event_type)
+
+        totals = np.zeros(length, dtype=np.int64)
+        for _, seconds, minutes in self._rings_now():
+            ring = seconds if step == 1 else minutes
+            if length > len(ring):
+                raise ValueError(f"Ring only holds {len(ring)} {resolution}s")
+            slots = ring[(epochs % np.uint64(len(ring))).astype(np.intp)]
+            totals += np.where(slots[:, 0] == epochs, slots[:, column], 0).astype(np.int64)
+        return totals
+
+    def count(self, seconds=3600, event_type=None, now=None):
+        """Number of events in the last `seconds` seconds"""
+        if seconds <= LIVE_SECOND_SLOTS:
+            return int(self.series('second', seconds, event_type, now).sum())
+        return int(self.series('minute', -(-seconds // 60), event_type, now).sum())
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer(name=None):
+    """Return this process's ring writer, named after the running script"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            name = name or os.path.splitext(os.path.basename(sys.argv[0]))[0] or 'events'
+            _writer = LiveCounterWriter(name)
+        return _writer
+
+
+_reader = None
+
+
+def get_counters():
+    """Return the process-wide live counter reader"""
+    global _reader
+    with _writer_lock:
+        if _reader is None:
+            _reader = LiveCounters()
+        return _reader
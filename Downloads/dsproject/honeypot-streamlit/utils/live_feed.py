@@ -0,0 +1,79 @@
+"""
+Per-viewer state for the auto-refreshing live views
+
+A LiveFeed starts from the rollup store's merged sketches and the last
+few events before its checkpoint. Each poll then reads only the log
+lines appended after the last seen event ID (a byte offset, see
+tail_events) and folds them into the counters and the recent-events
+list, so a refresh costs a file stat plus the new events instead of a
+full reload of the log.
+"""
+from collections import deque
+from datetime import datetime, timedelta
+
+from config.settings import LIVE_FEED_EVENTS
+from utils.data_processor import (
+    file_signature, read_recent_events, tail_events, validate_event
+)
+from utils.pipeline import sync_consumer
+
+ONE_DAY = timedelta(days=1)
+
+
+class LiveFeed:
+    """Counters and recent events kept current from log deltas"""
+
+    def __init__(self, rollups, size=LIVE_FEED_EVENTS):
+        self.rollups = rollups
+        self.log_file = rollups.log_file
+        self.size = size
+        self.seed()
+
+    def seed(self):
+        """Start over from the rollups and the tail of the log"""
+        sync_consumer(self.rollups)
+        self.day_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        with self.rollups._lock:
+            self.last_id = self.rollups.checkpoint
+            self.stats = self.rollups.window()
+            self.today = self.rollups.window(start=self.day_start)
+        signature = file_signature(self.log_file)
+        self.identity = list(signature[:2]) if signature else None
+        self.recent = deque(
+            [(offset, event) for offset, event in read_recent_events(self.size, self.log_file, self.last_id)
+             if validate_event(event)],
+            maxlen=self.size
+        )
+        self.updated = datetime.now()
+
+    def poll(self):
+        """Fold in events appended since the last seen event ID
+
+        Returns the number of new events.
+        """
+        signature = file_signature(self.log_file)
+        replaced = signature is None or list(signature[:2]) != self.identity \
+            or signature[2] < self.last_id
+        if replaced or datetime.now() - self.day_start >= ONE_DAY:
+            self.seed()
+            return 0
+
+        new = 0
+        if signature[2] > self.last_id:
+            for offset, end, event in tail_events(self.log_file, self.last_id):
+                self.last_id = end
+                # Skipped by the rollups as well, so the counters stay in step
+                if not validate_event(event):
+                    continue
+                self.stats.add(event)
+                if event['_timestamp'] >= self.day_start:
+                    self.today.add(event)
+                self.recent.append((offset, event))
+                new += 1
+        self.updated = datetime.now()
+        return new
+
+    def recent_events(self, count=None):
+        """The most recent (event ID, event) pairs, newest first"""
+        events = list(self.recent)[::-1]
+        return events[:count] if count else events
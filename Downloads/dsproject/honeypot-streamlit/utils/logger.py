@@ -1 +1,37 @@
-# Logging utilities
+"""
+Logging utilities for Honeypot Security Analytics System
+
+All honeypot services write events through log_event() so the JSON log
+and the live counters stay in step. Events are enriched with location and
+network fields on the way in, so dashboards never look addresses up.
+"""
+import json
+import logging
+import os
+import threading
+
+from config.settings import GEOIP_ENRICH_ON_INGEST, MAIN_LOG_FILE
+from utils.geoip import enrich_event
+from utils.live_counters import get_writer
+
+_write_lock = threading.Lock()
+
+
+def log_event(event, log_file=MAIN_LOG_FILE):
+    """Append an event to the honeypot log and bump the live counters"""
+    if GEOIP_ENRICH_ON_INGEST:
+        # A broken or missing database must never cost the event itself
+        try:
+            enrich_event(event)
+        except Exception as e:
+            logging.error(f"Error enriching event: {e}")
+
+    os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+    with _write_lock:
+        with open(log_file, 'a') as f:
+            f.write(json.dumps(event) + '\n')
+
+    try:
+        get_writer().increment(event.get('type'))
+    except (OSError, ValueError) as e:
+        logging.error(f"Error updating live counters: {e}")
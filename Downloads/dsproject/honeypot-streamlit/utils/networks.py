@@ -0,0 +1,178 @@
+"""
+Network rollups of attack sources
+
+Botnets spread across neighbouring addresses and hosting providers, so
+events are also counted per /16 and /24 (IPv4), per /48 (IPv6) and per
+ASN in hourly buckets. Addresses are queued as events arrive and
+converted to integers a batch at a time; prefixes are then a mask away
+and counted with array operations, so the cost does not grow with the
+number of distinct sources.
+"""
+import ipaddress
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from config.settings import MAIN_LOG_FILE, NETWORK_ROLLUP_DIR
+from utils.geo_ranges import parse_ips
+from utils.rollups import BucketStore
+
+LEVELS = ('/16', '/24', '/48', 'asn')
+MASKS = {'/16': 0xFFFF0000, '/24': 0xFFFFFF00}
+V6_PREFIX_BYTES = 6  # a /48 is the first six bytes of an address
+
+
+def _empty():
+    return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+
+def _count(values):
+    """Distinct values and their counts"""
+    if not len(values):
+        return _empty()
+    keys, counts = np.unique(values, return_counts=True)
+    return keys.astype(np.int64), counts.astype(np.int64)
+
+
+def _sum(parts):
+    """Add up several (keys, counts) pairs by key"""
+    parts = [part for part in parts if len(part[0])]
+    if not parts:
+        return _empty()
+    if len(parts) == 1:
+        return parts[0]
+    keys, inverse = np.unique(np.concatenate([keys for keys, _ in parts]), return_inverse=True)
+    counts = np.bincount(inverse, weights=np.concatenate([counts for _, counts in parts]))
+    return keys, counts.astype(np.int64)
+
+
+def network_keys(ips):
+    """Integer /16, /24, /48 prefixes of a sequence of addresses
+
+    Returns {level: int64 array}; addresses of the other family or that
+    do not parse are left out of a level.
+    """
+    v4, v4_values, v6, v6_values = parse_ips(ips)
+    v4_values = v4_values[v4]
+    keys = {level: (v4_values & np.uint32(mask)).astype(np.int64) for level, mask in MASKS.items()}
+
+    octets = np.frombuffer(v6_values[v6].tobytes(), dtype=np.uint8).reshape(-1, 16)[:, :V6_PREFIX_BYTES]
+    shifts = np.arange(V6_PREFIX_BYTES - 1, -1, -1, dtype=np.int64) * 8
+    keys['/48'] = (octets.astype(np.int64) << shifts).sum(axis=1) if len(octets) else np.empty(0, dtype=np.int64)
+    return keys
+
+
+def network_label(level, key):
+    """Display form of a network key, e.g. 203.0.113.0/24 or AS64500"""
+    key = int(key)
+    if level == 'asn':
+        return f"AS{key}"
+    if level == '/48':
+        return str(ipaddress.IPv6Network((key << 80, 48)))
+    return str(ipaddress.IPv4Network((key, int(level[1:]))))
+
+
+class NetworkBucket:
+    """Per-network event counts for one hour of events"""
+
+    def __init__(self):
+        self.parts = {level: [] for level in LEVELS}
+        self.as_orgs = {}
+        self._ips = []
+        self._asns = []
+
+    def add(self, event):
+        ip = event.get('source_ip')
+        if not ip:
+            return
+        self._ips.append(ip)
+        asn = event.get('asn')
+        self._asns.append(asn if isinstance(asn, int) else -1)
+        if asn and event.get('as_org'):
+            self.as_orgs[asn] = event['as_org']
+
+    def _count_pending(self):
+        """Convert and count the addresses queued since the last call"""
+        if not self._ips:
+            return
+        for level, values in network_keys(self._ips).items():
+            self.parts[level].append(_count(values))
+        asns = np.array(self._asns, dtype=np.int64)
+        self.parts['asn'].append(_count(asns[asns >= 0]))
+        self._ips, self._asns = [], []
+
+    def counts(self, level):
+        """(keys, counts) arrays for one level"""
+        self._count_pending()
+        summed = _sum(self.parts[level])
+        self.parts[level] = [summed]
+        return summed
+
+    def merge(self, other):
+        for level in LEVELS:
+            self.parts[level].append(other.counts(level))
+        self.as_orgs.update(other.as_orgs)
+        return self
+
+    def to_dict(self):
+        return {
+            'counts': {level: [values.tolist() for values in self.counts(level)] for level in LEVELS},
+            'as_orgs': {str(asn): org for asn, org in self.as_orgs.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        bucket = cls()
+        for level, (keys, counts) in data['counts'].items():
+            bucket.parts[level] = [(np.array(keys, dtype=np.int64), np.array(counts, dtype=np.int64))]
+        bucket.as_orgs = {int(asn): org for asn, org in data['as_orgs'].items()}
+        return bucket
+
+
+class NetworkStore(BucketStore):
+    """Hourly per-prefix and per-ASN counts"""
+
+    version = 1
+    bucket_class = NetworkBucket
+
+    def __init__(self, network_dir=NETWORK_ROLLUP_DIR, log_file=MAIN_LOG_FILE):
+        super().__init__(network_dir, log_file)
+
+    def top(self, level, n=10, start=None, end=None):
+        """Noisiest networks of a level in a window
+
+        Returns a DataFrame with network, attacks and share columns (plus
+        as_org for ASNs), ordered by attacks.
+        """
+        merged = self.window(start, end)
+        keys, counts = merged.counts(level)
+        if len(counts) > n:
+            best = np.argpartition(counts, -n)[-n:]
+            keys, counts = keys[best], counts[best]
+        order = np.argsort(-counts, kind='stable')
+        keys, counts = keys[order], counts[order]
+
+        total = int(merged.counts(level)[1].sum())
+        top = pd.DataFrame({
+            'network': [network_label(level, key) for key in keys],
+            'attacks': counts,
+            'share': counts / total if total else 0.0,
+        })
+        if level == 'asn':
+            top['as_org'] = [merged.as_orgs.get(int(key)) for key in keys]
+        return top
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_networks(network_dir=NETWORK_ROLLUP_DIR, log_file=MAIN_LOG_FILE):
+    """Return the process-wide NetworkStore for a log file"""
+    key = (os.path.abspath(network_dir), os.path.abspath(log_file))
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = NetworkStore(network_dir, log_file)
+        return _stores[key]
@@ -0,0 +1,344 @@
+"""
+Ingest pipeline run by the Log Processor service
+
+Raw log bytes flow through a chain of generator stages:
+
+    read -> parse -> validate -> enrich -> index -> rollup -> time_index -> geo_bins
+         -> networks -> intensity -> credentials -> sessions
+
+Every stage works on batches of events and records its own throughput.
+The sink stages (index through sessions) keep their own checkpoint
+offsets, so the pipeline resumes after a restart from the oldest sink
+checkpoint and catches up on a backlog with large sequential reads.
+
+Only one process writes the stores at a time: whoever holds the writer
+lock file. The Log Processor holds it for as long as it runs; without it,
+a page takes the lock for the duration of its own catch-up.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+import psutil
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    import msvcrt
+    fcntl = None
+
+from config.settings import (
+    MAIN_LOG_FILE, PIPELINE_COMMIT_BYTES, PIPELINE_LOCK_FILE,
+    PIPELINE_READ_BYTES, PIPELINE_STATUS_FILE
+)
+from utils.data_processor import validate_event, write_json_atomic
+from utils.credentials import get_credentials
+from utils.geo_bins import get_geo_bins
+from utils.intensity import get_intensity
+from utils.inverted_index import get_index
+from utils.networks import get_networks
+from utils.rollups import get_rollups
+from utils.sessions import get_sessions
+from utils.time_index import get_time_index
+
+class WriterLock:
+    """Exclusive lock file naming the one process that writes the stores
+
+    The operating system releases the lock when its holder exits, so a
+    crashed writer never blocks the others.
+    """
+
+    def __init__(self, path=PIPELINE_LOCK_FILE):
+        self.path = path
+        self._file = None
+
+    def acquire(self):
+        """Take the lock if no other process or thread holds it"""
+        if self._file is not None:
+            return True
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        f = open(self.path, 'a+')
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is None:
+            return
+        if fcntl is None:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()
+        self._file = None
+
+    def held_elsewhere(self):
+        """True if another process or thread holds the lock"""
+        if self._file is not None:
+            return False
+        if self.acquire():
+            self.release()
+            return False
+        return True
+
+
+class StageMetrics:
+    """Throughput counters for one pipeline stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.batches = 0
+        self.events_in = 0
+        self.events_out = 0
+        self.seconds = 0.0
+
+    def record(self, events_in, events_out, seconds):
+        self.batches += 1
+        self.events_in += events_in
+        self.events_out += events_out
+        self.seconds += seconds
+
+    @property
+    def events_per_second(self):
+        return self.events_in / self.seconds if self.seconds else 0.0
+
+    def to_dict(self):
+        return {
+            'batches': self.batches,
+            'events_in': self.events_in,
+            'events_out': self.events_out,
+            'dropped': self.events_in - self.events_out,
+            'seconds': round(self.seconds, 3),
+            'events_per_second': round(self.events_per_second, 1),
+        }
+
+
+def read_batches(log_file, start_offset, batch_bytes=PIPELINE_READ_BYTES):
+    """Yield (end offset, [(offset, next offset, raw line)]) in large reads
+
+    Only complete lines are returned; a partial last line is left for the
+    next run.
+    """
+    if not os.path.exists(log_file):
+        return
+
+    with open(log_file, 'rb') as f:
+        f.seek(start_offset)
+        offset = start_offset
+        pending = b''
+        while True:
+            chunk = f.read(batch_bytes)
+            if not chunk:
+                break
+            data = pending + chunk
+            cut = data.rfind(b'\n') + 1
+            pending = data[cut:]
+            if not cut:
+                continue
+
+            batch = []
+            for line in data[:cut].split(b'\n')[:-1]:
+                batch.append((offset, offset + len(line) + 1, line))
+                offset += len(line) + 1
+            yield offset, batch
+
+
+def parse_events(batch):
+    """Decode JSON lines, dropping anything that is not an event object"""
+    events = []
+    for offset, end, line in batch:
+        try:
+            event = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(event, dict):
+            events.append((offset, end, event))
+    return events
+
+
+def validate_events(batch):
+    """Keep events with the required fields and a parseable timestamp"""
+    return [item for item in batch if validate_event(item[2])]
+
+
+def enrich_events(batch):
+    """Add derived fields used by the index and rollups"""
+    for _, _, event in batch:
+        if event.get('password') and not event.get('password_hash'):
+            event['password_hash'] = hashlib.sha256(str(event['password']).encode()).hexdigest()
+    return batch
+
+
+def sink_stage(consumer):
+    """Stage feeding events to a LogConsumer past its own checkpoint"""
+    def stage(batch):
+        checkpoint = consumer.checkpoint
+        for offset, _, event in batch:
+            if offset >= checkpoint:
+                consumer.add(offset, event)
+        return batch
+    return stage
+
+
+class Pipeline:
+    """Staged ingest pipeline from the raw log into the index and rollups"""
+
+    def __init__(self, log_file=MAIN_LOG_FILE, sinks=None, status_file=None):
+        self.log_file = log_file
+        self.status_file = status_file
+        if sinks is None:
+            sinks = [
+                ('index', get_index(log_file=log_file)),
+                ('rollup', get_rollups(log_file=log_file)),
+                ('time_index', get_time_index(log_file)),
+                ('geo_bins', get_geo_bins(log_file=log_file)),
+                ('networks', get_networks(log_file=log_file)),
+                ('intensity', get_intensity(log_file=log_file)),
+                ('credentials', get_credentials(log_file=log_file)),
+                ('sessions', get_sessions(log_file=log_file)),
+            ]
+        self.sinks = sinks
+        self.stages = [
+            ('parse', parse_events),
+            ('validate', validate_events),
+            ('enrich', enrich_events),
+        ] + [(name, sink_stage(consumer)) for name, consumer in sinks]
+
+        self.metrics = {'read': StageMetrics('read')}
+        for name, _ in self.stages:
+            self.metrics[name] = StageMetrics(name)
+        self.started = time.time()
+        self.offset = 0
+        self.position = 0
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Ask a running catch-up to commit and return after the current batch"""
+        self._stop.set()
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    def _read(self, start_offset):
+        metrics = self.metrics['read']
+        batches = read_batches(self.log_file, start_offset)
+        while True:
+            started = time.perf_counter()
+            try:
+                end, batch = next(batches)
+            except StopIteration:
+                return
+            metrics.record(len(batch), len(batch), time.perf_counter() - started)
+            yield end, batch
+
+    def _timed(self, name, stage, batches):
+        metrics = self.metrics[name]
+        for end, batch in batches:
+            started = time.perf_counter()
+            out = stage(batch)
+            metrics.record(len(batch), len(out), time.perf_counter() - started)
+            yield end, out
+
+    def _commit(self, offset):
+        for _, consumer in self.sinks:
+            if offset > consumer.checkpoint:
+                consumer.flush(offset)
+        self.offset = offset
+
+    def rollback(self):
+        """Forget what the sinks consumed since their last commit
+
+        Called after a failed run, which the next run repeats from the
+        committed checkpoints.
+        """
+        for _, consumer in self.sinks:
+            consumer.rollback()
+
+    def run_once(self):
+        """Process everything appended since the sinks' checkpoints
+
+        Returns the number of log bytes processed.
+        """
+        for _, consumer in self.sinks:
+            consumer.prepare()
+        start = min(consumer.checkpoint for _, consumer in self.sinks)
+        self.offset = self.position = start
+
+        batches = self._read(start)
+        for name, stage in self.stages:
+            batches = self._timed(name, stage, batches)
+
+        committed = end = start
+        for end, _ in batches:
+            self.position = end
+            if self.status_file:
+                # Progress through a long catch-up stays visible
+                self.write_status(self.status_file)
+            if end - committed >= PIPELINE_COMMIT_BYTES:
+                self._commit(end)
+                committed = end
+            if self.stopped:
+                break
+        if end > committed:
+            self._commit(end)
+        return end - start
+
+    def status(self):
+        """Current progress and per-stage metrics"""
+        try:
+            log_size = os.path.getsize(self.log_file)
+        except OSError:
+            log_size = 0
+        return {
+            'pid': os.getpid(),
+            'started': self.started,
+            'heartbeat': time.time(),
+            'checkpoint': self.offset,
+            'position': self.position,
+            'log_size': log_size,
+            'lag_bytes': max(0, log_size - self.position),
+            'stages': {name: metrics.to_dict() for name, metrics in self.metrics.items()},
+        }
+
+    def write_status(self, status_file=PIPELINE_STATUS_FILE):
+        write_json_atomic(status_file, self.status())
+
+
+def processor_status(status_file=PIPELINE_STATUS_FILE, lock_file=PIPELINE_LOCK_FILE):
+    """Last status written by the Log Processor, or None if it is not running"""
+    try:
+        with open(status_file, 'r') as f:
+            status = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if not psutil.pid_exists(status.get('pid', -1)) or not WriterLock(lock_file).held_elsewhere():
+        return None
+    return status
+
+
+def sync_consumer(consumer, lock_file=PIPELINE_LOCK_FILE):
+    """Bring a consumer up to date without racing the Log Processor
+
+    The caller catches up itself only if it can take the writer lock;
+    while the processor or another caller holds it, the consumer just
+    reloads what has been persisted.
+    """
+    lock = WriterLock(lock_file)
+    if lock.acquire():
+        try:
+            consumer.update()
+        finally:
+            lock.release()
+    else:
+        consumer.refresh()
@@ -0,0 +1,296 @@
+"""
+Local JSON query API over the analytics stores
+
+Serves pre-aggregated results (summary counts, top values, networks,
+hourly timelines, per-IP profiles and the event feed) from the rollup,
+network and index stores, for tools that should not scrape the
+dashboard. Responses are cached by request and data version: the version
+changes whenever the log grows or the rollups advance, so a cached body
+is never stale. Every response carries an ETag derived from the same
+key, and a matching If-None-Match is answered with 304 before any work
+is done. Lists are paginated with a limit and an opaque cursor, and the
+next page is also given in a Link header. Raw events are exported as a
+streamed, uncached response (see utils.export).
+"""
+import functools
+import hashlib
+import json
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime
+from urllib.parse import urlencode
+
+from flask import Flask, jsonify, request, stream_with_context
+
+from config.settings import (
+    API_CACHE_ENTRIES, API_KEY, API_MAX_PAGE_SIZE, API_PROFILE_EVENTS,
+    API_SYNC_SECONDS, FEED_PAGE_SIZE, MAIN_LOG_FILE
+)
+from utils.data_processor import file_signature, parse_timestamp, read_events_at
+from utils.event_feed import feed_page
+from utils.export import EventExport
+from utils.geoip import get_locator
+from utils.inverted_index import get_index
+from utils.networks import LEVELS, get_networks
+from utils.pipeline import sync_consumer
+from utils.rollups import BUCKET_FORMAT, HEAVY_HITTER_FIELDS, get_rollups
+
+API_PREFIX = '/api/v1'
+
+
+class ApiError(Exception):
+    """Error returned to the client as a JSON body"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class DataVersion:
+    """Keeps the stores current and names the state they are in"""
+
+    def __init__(self, log_file=MAIN_LOG_FILE, sync_seconds=API_SYNC_SECONDS):
+        self.log_file = log_file
+        self.sync_seconds = sync_seconds
+        self.rollups = get_rollups(log_file=log_file)
+        self.networks = get_networks(log_file=log_file)
+        self.index = get_index(log_file=log_file)
+        self._lock = threading.Lock()
+        self._synced = 0
+        self._version = None
+
+    def current(self):
+        """Version string, syncing the stores at most every sync_seconds"""
+        with self._lock:
+            if time.monotonic() - self._synced >= self.sync_seconds:
+                for consumer in (self.rollups, self.networks, self.index):
+                    sync_consumer(consumer)
+                signature = file_signature(self.log_file) or (0, 0, 0)
+                self._version = f"{signature[1]}:{signature[2]}:{self.rollups.checkpoint}"
+                self._synced = time.monotonic()
+            return self._version
+
+
+class ResponseCache:
+    """Bounded LRU of response bodies keyed by request"""
+
+    def __init__(self, size=API_CACHE_ENTRIES):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version):
+        """Cached entry for a request if it was stored at this version"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, version, body):
+        with self._lock:
+            self._entries[key] = (version, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+
+def _time_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    timestamp = parse_timestamp(value)
+    if timestamp is None:
+        raise ApiError(400, f"Invalid {name} timestamp: {value}")
+    return timestamp
+
+
+def _int_arg(name, default, maximum=None):
+    try:
+        value = int(request.args.get(name, default))
+    except ValueError:
+        raise ApiError(400, f"Invalid {name}: {request.args.get(name)}")
+    if value < 1:
+        raise ApiError(400, f"{name} must be positive")
+    return min(value, maximum) if maximum else value
+
+
+def _page(items, next_cursor):
+    return {'items': items, 'next_cursor': next_cursor}
+
+
+def create_app(log_file=MAIN_LOG_FILE, api_key=API_KEY):
+    """Build the Flask application"""
+    app = Flask(__name__)
+    data = DataVersion(log_file)
+    cache = ResponseCache()
+    app.config['response_cache'] = cache
+
+    @app.before_request
+    def check_key():
+        if api_key and request.headers.get('X-API-Key') != api_key:
+            return jsonify(error="Missing or invalid API key"), 401
+
+    @app.errorhandler(ApiError)
+    def api_error(error):
+        return jsonify(error=error.message), error.status
+
+    def cached(view):
+        """Serve a view's JSON from the cache, with ETag and conditional GET"""
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            version = data.current()
+            key = request.path + '?' + '&'.join(
+                f"{name}={value}" for name, value in sorted(request.args.items(multi=True))
+            )
+            etag = hashlib.sha1(f"{key}|{version}".encode()).hexdigest()
+            if etag in request.if_none_match:
+                response = app.response_class(status=304)
+                response.set_etag(etag)
+                return response
+
+            entry = cache.get(key, version)
+            hit = entry is not None
+            if not hit:
+                result = view(*args, **kwargs)
+                entry = (json.dumps(result, default=str), result.get('next_cursor'))
+                cache.put(key, version, entry)
+            body, next_cursor = entry
+
+            response = app.response_class(body, mimetype='application/json')
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+            if next_cursor:
+                query = dict(request.args, cursor=next_cursor)
+                response.headers['Link'] = f'<{request.base_url}?{urlencode(query)}>; rel="next"'
+            return response
+        return wrapper
+
+    @app.route(f'{API_PREFIX}/summary')
+    @cached
+    def summary():
+        start, end = _time_arg('start'), _time_arg('end')
+        window = data.rollups.window(start, end)
+        return {
+            'start': start,
+            'end': end,
+            'total': window.count,
+            'unique_ips': window.unique['source_ip'].count(),
+            'unique_usernames': window.unique['username'].count(),
+            'types': window.types,
+        }
+
+    @app.route(f'{API_PREFIX}/top/<field>')
+    @cached
+    def top(field):
+        if field not in HEAVY_HITTER_FIELDS:
+            raise ApiError(404, f"Unknown field: {field}")
+        n = _int_arg('n', 10, API_MAX_PAGE_SIZE)
+        values = data.rollups.top(field, n, _time_arg('start'), _time_arg('end'))
+        return {'field': field, 'items': [{'value': value, 'count': count} for value, count in values]}
+
+    @app.route(f'{API_PREFIX}/networks/<level>')
+    @cached
+    def networks(level):
+        level = level if level == 'asn' else '/' + level
+        if level not in LEVELS:
+            raise ApiError(404, f"Unknown network level: {level}")
+        n = _int_arg('n', 10, API_MAX_PAGE_SIZE)
+        top = data.networks.top(level, n, _time_arg('start'), _time_arg('end'))
+        return {'level': level, 'items': top.to_dict('records')}
+
+    @app.route(f'{API_PREFIX}/timeline')
+    @cached
+    def timeline():
+        """Hourly counts, oldest first; the cursor is the next hour's key"""
+        start, end = _time_arg('start'), _time_arg('end')
+        limit = _int_arg('limit', 168, API_MAX_PAGE_SIZE)
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                start = datetime.strptime(cursor, BUCKET_FORMAT)
+            except ValueError:
+                raise ApiError(400, f"Invalid cursor: {cursor}")
+        buckets = data.rollups.buckets_in(start, end)
+        items = [
+            {
+                'hour': datetime.strptime(key, BUCKET_FORMAT),
+                'count': bucket.count,
+                'types': bucket.types,
+            }
+            for key, bucket in buckets[:limit]
+        ]
+        return _page(items, buckets[limit][0] if len(buckets) > limit else None)
+
+    @app.route(f'{API_PREFIX}/events')
+    @cached
+    def events():
+        """Event feed, newest first (see utils.event_feed)"""
+        page, next_cursor = feed_page(
+            request.args.get('cursor'),
+            page_size=_int_arg('limit', FEED_PAGE_SIZE, API_MAX_PAGE_SIZE),
+            event_type=request.args.get('type') or None,
+            source_ip=request.args.get('source_ip') or None,
+            username=request.args.get('username') or None,
+            log_file=log_file
+        )
+        return _page([dict(event, event_id=offset) for offset, event in page], next_cursor)
+
+    @app.route(f'{API_PREFIX}/ips/<ip>')
+    @cached
+    def ip_profile(ip):
+        offsets = data.index.lookup('source_ip', ip)
+        if not len(offsets):
+            raise ApiError(404, f"No events from {ip}")
+        # Offsets from before a rotation or truncation may no longer hold the
+        # address's events; the profile then covers what is still readable
+        first = [event for event in read_events_at(offsets[:1], log_file) if event.get('source_ip') == ip]
+        latest = [event for event in read_events_at(offsets[-API_PROFILE_EVENTS:], log_file)
+                  if event.get('source_ip') == ip]
+        location = get_locator().lookup(ip)
+        return {
+            'source_ip': ip,
+            'events': len(offsets),
+            'first_seen': first[0].get('timestamp') if first else None,
+            'last_seen': latest[-1].get('timestamp') if latest else None,
+            'location': location,
+            'sampled_events': len(latest),
+            'types': Counter(event.get('type', 'unknown') for event in latest),
+            'top_usernames': Counter(
+                event['username'] for event in latest if event.get('username')
+            ).most_common(10),
+        }
+
+    @app.route(f'{API_PREFIX}/export')
+    def export():
+        """Matching events as CSV, JSON lines or Parquet, streamed in chunks"""
+        try:
+            export = EventExport(
+                request.args.get('format', 'csv'),
+                request.args.get('compression') or None,
+                start=_time_arg('start'),
+                end=_time_arg('end'),
+                event_type=request.args.get('type'),
+                source_ip=request.args.get('source_ip'),
+                username=request.args.get('username'),
+                log_file=log_file
+            )
+        except ValueError as e:
+            raise ApiError(400, str(e))
+        response = app.response_class(stream_with_context(export.chunks()), mimetype=export.mime_type)
+        response.headers['Content-Disposition'] = f'attachment; filename="{export.file_name("honeypot_events")}"'
+        return response
+
+    @app.route(f'{API_PREFIX}/health')
+    def health():
+        return jsonify(status='ok', version=data.current(), cache_hits=cache.hits, cache_misses=cache.misses)
+
+    return app
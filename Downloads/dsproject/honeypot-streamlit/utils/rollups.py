@@ -0,0 +1,323 @@
+"""
+Time-bucketed rollups of the honeypot log
+
+Events are aggregated at ingest into hourly buckets holding event counts
+and mergeable sketches. Dashboard metrics for any window are answered by
+merging the few buckets it covers instead of scanning raw events.
+
+Merged windows are cached per store. Everything before a window's newest
+day is merged once and kept until one of those days changes, so repeated
+queries only merge the newest day's buckets again, however much history
+the window spans.
+"""
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from config.settings import (
+    EXACT_UNIQUE_WINDOW_HOURS, HLL_PRECISION, MAIN_LOG_FILE, ROLLUP_DIR,
+    TOP_K_CAPACITY, WINDOW_CACHE_ENTRIES
+)
+from utils.data_processor import LogConsumer, parse_timestamp, write_json_atomic
+from utils.sketches import HyperLogLog, SpaceSaving
+from utils.time_index import load_window, read_window
+
+BUCKET_FORMAT = '%Y%m%d%H'
+
+UNIQUE_FIELDS = ('source_ip', 'username')
+HEAVY_HITTER_FIELDS = ('username', 'password', 'source_ip', 'path', 'command')
+
+STATE_FILE = 'state.json'
+
+
+def bucket_key(timestamp):
+    """Key of the hourly bucket containing a timestamp"""
+    return timestamp.strftime(BUCKET_FORMAT)
+
+
+class Bucket:
+    """Aggregates for one hour of events"""
+
+    def __init__(self):
+        self.count = 0
+        self.types = {}
+        self.unique = {field: HyperLogLog(HLL_PRECISION) for field in UNIQUE_FIELDS}
+        self.heavy = {field: SpaceSaving(TOP_K_CAPACITY) for field in HEAVY_HITTER_FIELDS}
+
+    def add(self, event):
+        self.count += 1
+        event_type = event.get('type', 'unknown')
+        self.types[event_type] = self.types.get(event_type, 0) + 1
+        for field in UNIQUE_FIELDS:
+            if event.get(field):
+                self.unique[field].add(event[field])
+        for field in HEAVY_HITTER_FIELDS:
+            if event.get(field):
+                self.heavy[field].add(str(event[field]))
+
+    def merge(self, other):
+        self.count += other.count
+        for event_type, count in other.types.items():
+            self.types[event_type] = self.types.get(event_type, 0) + count
+        for field in UNIQUE_FIELDS:
+            self.unique[field].merge(other.unique[field])
+        for field in HEAVY_HITTER_FIELDS:
+            self.heavy[field].merge(other.heavy[field])
+        return self
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'types': self.types,
+            'unique': {field: sketch.to_dict() for field, sketch in self.unique.items()},
+            'heavy': {field: summary.to_dict() for field, summary in self.heavy.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        bucket = cls()
+        bucket.count = data['count']
+        bucket.types = data['types']
+        for field, sketch in data['unique'].items():
+            bucket.unique[field] = HyperLogLog.from_dict(sketch)
+        for field, summary in data['heavy'].items():
+            bucket.heavy[field] = SpaceSaving.from_dict(summary)
+        return bucket
+
+
+class BucketStore(LogConsumer):
+    """Hourly buckets persisted as one JSON file per bucket
+
+    Subclasses set bucket_class to a class with add(event), merge(other),
+    to_dict() and from_dict(data).
+    """
+
+    bucket_class = None
+
+    def __init__(self, bucket_dir, log_file=MAIN_LOG_FILE):
+        super().__init__(log_file)
+        self.bucket_dir = bucket_dir
+        self.state_path = os.path.join(bucket_dir, STATE_FILE)
+        self.buckets = {}
+        self._mtimes = {}
+        self._dirty = set()
+        self._changes = 0
+        self._day_stamps = {}
+        self._windows = {}
+        self.refresh()
+
+    def _bucket_path(self, key):
+        return os.path.join(self.bucket_dir, key + '.json')
+
+    def _touch(self, keys):
+        """Mark the days of changed buckets so cached windows over them are rebuilt"""
+        for key in keys:
+            self._changes += 1
+            self._day_stamps[key[:8]] = self._changes
+
+    def refresh(self):
+        """Reload state and any bucket files changed by another process"""
+        with self._lock:
+            if os.path.exists(self.state_path):
+                with open(self.state_path, 'r') as f:
+                    self.manifest = json.load(f)
+            if not os.path.isdir(self.bucket_dir):
+                return
+
+            seen = set()
+            for entry in os.scandir(self.bucket_dir):
+                key, ext = os.path.splitext(entry.name)
+                if ext != '.json' or key == 'state':
+                    continue
+                seen.add(key)
+                mtime = entry.stat().st_mtime_ns
+                if self._mtimes.get(key) != mtime and key not in self._dirty:
+                    try:
+                        with open(entry.path, 'r') as f:
+                            self.buckets[key] = self.bucket_class.from_dict(json.load(f))
+                        self._mtimes[key] = mtime
+                        self._touch([key])
+                    except (OSError, ValueError):
+                        continue
+            for key in set(self.buckets) - seen - self._dirty:
+                del self.buckets[key]
+                self._mtimes.pop(key, None)
+                self._touch([key])
+
+    def reset(self):
+        with self._lock:
+            for key in list(self.buckets):
+                try:
+                    os.remove(self._bucket_path(key))
+                except OSError:
+                    pass
+            self.buckets.clear()
+            self._mtimes.clear()
+            self._dirty.clear()
+            self._windows.clear()
+            self.manifest = self.new_manifest()
+            write_json_atomic(self.state_path, self.manifest)
+
+    def rollback(self):
+        with self._lock:
+            # Changed buckets are read again from their files
+            for key in self._dirty:
+                self.buckets.pop(key, None)
+                self._mtimes.pop(key, None)
+            self._touch(self._dirty)
+            self._dirty.clear()
+            self.manifest = self.new_manifest()
+            self.refresh()
+
+    def add(self, offset, event):
+        timestamp = event.get('_timestamp') or parse_timestamp(event.get('timestamp'))
+        if timestamp is None:
+            return
+        key = bucket_key(timestamp)
+        if key not in self.buckets:
+            self.buckets[key] = self.bucket_class()
+        self.buckets[key].add(event)
+        self._dirty.add(key)
+
+    def flush(self, checkpoint):
+        with self._lock:
+            for key in self._dirty:
+                path = self._bucket_path(key)
+                write_json_atomic(path, self.buckets[key].to_dict())
+                self._mtimes[key] = os.stat(path).st_mtime_ns
+            self._touch(self._dirty)
+            self._dirty.clear()
+
+            self.manifest['checkpoint'] = checkpoint
+            if self.manifest['log_identity'] is None:
+                self.manifest['log_identity'] = self.new_manifest()['log_identity']
+            write_json_atomic(self.state_path, self.manifest)
+
+    def buckets_in(self, start=None, end=None):
+        """(key, bucket) pairs of the hours overlapping [start, end], oldest first
+
+        The buckets are the store's own and must not be modified.
+        """
+        first = bucket_key(start) if start is not None else None
+        last = bucket_key(end) if end is not None else None
+        with self._lock:
+            return sorted(
+                (key, bucket) for key, bucket in self.buckets.items()
+                if (first is None or key >= first) and (last is None or key <= last)
+            )
+
+    def window(self, start=None, end=None):
+        """Merge the buckets overlapping [start, end] into one bucket
+
+        The result is a copy the caller may change.
+        """
+        first = bucket_key(start) if start is not None else None
+        last = bucket_key(end) if end is not None else None
+
+        with self._lock:
+            days = {}
+            for key in self.buckets:
+                if (first is None or key >= first) and (last is None or key <= last):
+                    days.setdefault(key[:8], []).append(key)
+            if self._dirty:
+                # Buckets added but not flushed yet are merged without the cache
+                return self._merge_days(self.bucket_class(), days, sorted(days))
+
+            ordered = sorted(days)
+            settled = tuple((day, self._day_stamps.get(day, 0)) for day in ordered[:-1])
+            newest = tuple((day, self._day_stamps.get(day, 0)) for day in ordered[-1:])
+            cached = self._windows.pop((first, last), None)
+            if cached is not None and cached[0] == settled and cached[2] == newest:
+                base, result = cached[1], cached[3]
+            else:
+                if cached is not None and settled[:len(cached[0])] == cached[0]:
+                    # The window moved past a day: only the days since are merged in
+                    base, done = cached[1], len(cached[0])
+                else:
+                    base, done = self.bucket_class(), 0
+                self._merge_days(base, days, [day for day, _ in settled[done:]])
+                result = self._merge_days(self.bucket_class().merge(base), days, ordered[-1:])
+
+            self._windows[(first, last)] = (settled, base, newest, result)
+            while len(self._windows) > WINDOW_CACHE_ENTRIES:
+                del self._windows[next(iter(self._windows))]
+            return self.bucket_class().merge(result)
+
+    def _merge_days(self, merged, days, ordered):
+        for day in ordered:
+            for key in days[day]:
+                merged.merge(self.buckets[key])
+        return merged
+
+
+class RollupStore(BucketStore):
+    """Hourly rollups of event counts and sketches"""
+
+    version = 2
+    bucket_class = Bucket
+
+    def __init__(self, rollup_dir=ROLLUP_DIR, log_file=MAIN_LOG_FILE):
+        super().__init__(rollup_dir, log_file)
+
+    def total(self, start=None, end=None, exact=False):
+        """Number of events in a window
+
+        Buckets cover whole hours, so a window is widened to the hours it
+        touches; with exact=True the window's raw events are counted instead.
+        """
+        if exact:
+            return sum(1 for _ in read_window(start, end, self.log_file))
+        return self.window(start, end).count
+
+    def unique_count(self, field, start=None, end=None, exact=None):
+        """Distinct values of a field in a window
+
+        Estimated from merged HyperLogLog sketches (see HLL_PRECISION for
+        the error bound). Windows no longer than EXACT_UNIQUE_WINDOW_HOURS
+        are counted exactly from the window's raw events unless exact=False.
+        """
+        if exact is None:
+            exact = start is not None and \
+                (end or datetime.now()) - start <= timedelta(hours=EXACT_UNIQUE_WINDOW_HOURS)
+
+        if exact:
+            df = load_window(start, end, self.log_file)
+            if df.empty or field not in df.columns:
+                return 0
+            return int(df[field].nunique())
+
+        return self.window(start, end).unique[field].count()
+
+    def hourly_counts(self, start=None, end=None, event_type=None):
+        """Events per hour in a window as a Series indexed by hour, oldest first"""
+        first = bucket_key(start) if start is not None else None
+        last = bucket_key(end) if end is not None else None
+        with self._lock:
+            counts = {
+                key: bucket.count if event_type is None else bucket.types.get(event_type, 0)
+                for key, bucket in self.buckets.items()
+                if (first is None or key >= first) and (last is None or key <= last)
+            }
+        series = pd.Series(counts, dtype='int64')
+        series.index = pd.to_datetime(series.index, format=BUCKET_FORMAT)
+        return series.sort_index()
+
+    def top(self, field, n=10, start=None, end=None):
+        """Most frequent values of a field in a window as (value, count) pairs"""
+        return self.window(start, end).heavy[field].top(n)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_rollups(rollup_dir=ROLLUP_DIR, log_file=MAIN_LOG_FILE):
+    """Return the process-wide RollupStore for a log file"""
+    key = (os.path.abspath(rollup_dir), os.path.abspath(log_file))
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = RollupStore(rollup_dir, log_file)
+        return _stores[key]
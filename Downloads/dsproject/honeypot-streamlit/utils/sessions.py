@@ -0,0 +1,563 @@
+"""
+Attacker sessions and the campaigns they belong to
+
+Events are cut into sessions per source address: sorted on (source,
+timestamp), a session ends wherever the source changes or the gap to the
+previous event exceeds SESSION_GAP_SECONDS, so the boundaries come from
+one np.diff and each session is reduced with reduceat. A session keeps
+its span, event count, event types, tool fingerprint (user agent, or the
+SSH auth method and key type) and a MinHash signature of the
+credentials, paths and commands it tried.
+
+At ingest, sessions still open at the newest timestamp stay in the
+manifest and are extended by the next batch; closed ones are stored in
+the hourly bucket in which they started. Campaigns are clustered from the
+sessions of a window: sessions with the same tool and cadence that share
+a band of their signature are linked, and linked sessions form one
+campaign. Labels are cached by a hash of the table's content, so a page
+rerun over unchanged sessions does not cluster them again.
+
+Each bucket also keeps KLL quantile sketches of the time between events
+(overall and per source within a session), the length and event count of
+the sessions that started in it and the size of HTTP requests, so
+percentiles over any range of hours merge a few small sketches.
+"""
+import base64
+import hashlib
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from config.settings import (
+    CAMPAIGN_BAND_HASHES, CAMPAIGN_CACHE_ENTRIES, CAMPAIGN_SIGNATURE_HASHES,
+    MAIN_LOG_FILE, QUANTILE_SKETCH_K, SESSION_DIR, SESSION_GAP_SECONDS
+)
+from utils.data_processor import parse_timestamp
+from utils.rollups import BucketStore, bucket_key
+from utils.sketches import KLL
+from utils.time_index import EPOCH, to_micros
+
+EVENT_FIELDS = ('source_ip', 'type', 'username', 'password', 'path', 'command',
+                'user_agent', 'auth_method', 'key_type', 'request_bytes')
+SESSION_COLUMNS = ('source_ip', 'start', 'end', 'events', 'items', 'tool', 'types')
+DISTRIBUTIONS = ('interarrival', 'source_interarrival', 'session_length', 'session_events', 'request_bytes')
+
+HOUR_MICROS = 3_600_000_000
+EMPTY = np.uint32(0xFFFFFFFF)  # signature value of a session that tried nothing
+SEEDS = np.arange(1, CAMPAIGN_SIGNATURE_HASHES + 1, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+
+# Campaign labels and summaries by table fingerprint, oldest first
+_campaign_cache = {}
+_campaign_lock = threading.Lock()
+
+
+def _mix(values):
+    """splitmix64 finalizer, spreading every input bit over the output"""
+    with np.errstate(over='ignore'):
+        values = values ^ (values >> np.uint64(30))
+        values = values * np.uint64(0xBF58476D1CE4E5B9)
+        values = values ^ (values >> np.uint64(27))
+        values = values * np.uint64(0x94D049BB133111EB)
+        return values ^ (values >> np.uint64(31))
+
+
+def item_signatures(hashes, present):
+    """MinHash values of each item hash, one row per item and EMPTY rows where absent"""
+    signatures = np.full((len(hashes), len(SEEDS)), EMPTY, dtype=np.uint32)
+    if present.any():
+        # Mix each distinct item once
+        codes, uniques = pd.factorize(hashes[present])
+        mixed = (_mix(uniques[:, None] ^ SEEDS[None, :]) >> np.uint64(32)).astype(np.uint32)
+        signatures[present] = np.minimum(mixed, EMPTY - 1)[codes]
+    return signatures
+
+
+def _factorized(frame, field):
+    """Codes of a column (-1 where missing) and its distinct values as strings"""
+    if field not in frame.columns:
+        return np.full(len(frame), -1, dtype=np.int64), np.empty(0, dtype=object)
+    codes, uniques = pd.factorize(frame[field].to_numpy(dtype=object))
+    return codes.astype(np.int64), np.array([str(value) for value in uniques], dtype=object)
+
+
+def _hashed(frame, field):
+    """64-bit hash of each value of a column, and where it is present"""
+    codes, uniques = _factorized(frame, field)
+    hashes = np.append(pd.util.hash_array(uniques), np.uint64(0))
+    return hashes[codes], codes >= 0
+
+
+def _request_bytes(frame):
+    """Logged request sizes and where they are present"""
+    if 'request_bytes' not in frame.columns:
+        return np.empty(0), np.zeros(len(frame), dtype=bool)
+    sizes = pd.to_numeric(frame['request_bytes'], errors='coerce').to_numpy(dtype=float)
+    present = ~np.isnan(sizes)
+    return sizes[present], present
+
+
+def _frame_times(df):
+    """Events with a timestamp and their int64 microsecond times"""
+    df = df[df['timestamp'].notna()]
+    return df, df['timestamp'].to_numpy(dtype='datetime64[us]').astype(np.int64)
+
+
+def _sketches():
+    return {name: KLL(QUANTILE_SKETCH_K) for name in DISTRIBUTIONS}
+
+
+def _labels(columns):
+    """Space-joined strings of the present values of several factorized columns"""
+    key = np.zeros(len(columns[0][0]), dtype=np.int64)
+    for codes, uniques in columns:
+        key = key * (len(uniques) + 1) + codes + 1
+    codes, combinations = pd.factorize(key)
+    labels = []
+    for combination in combinations.tolist():
+        parts = []
+        for _, uniques in reversed(columns):
+            combination, code = divmod(combination, len(uniques) + 1)
+            if code:
+                parts.append(uniques[code - 1])
+        labels.append(' '.join(reversed(parts)))
+    return np.array(labels, dtype=object)[codes]
+
+
+def _union_types(types, first):
+    """Comma-joined union of the types of each run of rows starting at `first`"""
+    codes, uniques = pd.factorize(types)
+    names = sorted({name for value in uniques for name in value.split(',')})
+    bits = {name: 1 << i for i, name in enumerate(names)}
+    masks = np.array([sum(bits[name] for name in set(value.split(','))) for value in uniques], dtype=np.int64)
+    merged, inverse = np.unique(np.bitwise_or.reduceat(masks[codes], first), return_inverse=True)
+    labels = np.array([','.join(name for name in names if mask & bits[name]) for mask in merged.tolist()], dtype=object)
+    return labels[inverse]
+
+
+class SessionTable:
+    """Sessions as columns, with one row of signature values per session"""
+
+    def __init__(self, frame, signatures):
+        self.frame = frame.reset_index(drop=True)
+        self.signatures = signatures
+        self._fingerprint = None
+
+    def __len__(self):
+        return len(self.frame)
+
+    @classmethod
+    def empty(cls):
+        frame = pd.DataFrame({column: pd.Series(dtype=object) for column in SESSION_COLUMNS})
+        frame = frame.astype({'start': np.int64, 'end': np.int64, 'events': np.int64, 'items': np.int64})
+        return cls(frame, np.empty((0, len(SEEDS)), dtype=np.uint32))
+
+    @classmethod
+    def from_events(cls, frame, times):
+        """One single-event session per event of a frame with int64 microsecond `times`
+
+        merged() then joins them into the actual sessions.
+        """
+        sources, addresses = _factorized(frame, 'source_ip')
+        valid = sources >= 0
+        if not valid.all():
+            frame, times, sources = frame[valid], np.asarray(times)[valid], sources[valid]
+        if not len(frame):
+            return cls.empty()
+
+        # Items are hashed from their fields without building strings per event
+        username, has_username = _hashed(frame, 'username')
+        password, has_password = _hashed(frame, 'password')
+        path, has_path = _hashed(frame, 'path')
+        command, has_command = _hashed(frame, 'command')
+        login = has_username | has_password
+        items = np.where(login, _mix(username ^ _mix(password ^ np.uint64(1))),
+                         np.where(has_path, _mix(path ^ np.uint64(2)), _mix(command ^ np.uint64(3))))
+        present = login | has_path | has_command
+
+        types, type_names = _factorized(frame, 'type')
+        agents, agent_names = _factorized(frame, 'user_agent')
+        tool = _labels([(types, type_names), _factorized(frame, 'auth_method'), _factorized(frame, 'key_type')])
+        tool = np.where(agents >= 0, np.append(agent_names, None)[agents], tool)
+        tool[tool == ''] = 'unknown'
+
+        return cls(pd.DataFrame({
+            'source_ip': addresses[sources],
+            'start': np.asarray(times, dtype=np.int64),
+            'end': np.asarray(times, dtype=np.int64),
+            'events': np.ones(len(frame), dtype=np.int64),
+            'items': present.astype(np.int64),
+            'tool': tool,
+            'types': np.append(type_names, 'unknown')[types],
+        }), item_signatures(items, present))
+
+    @classmethod
+    def from_frame(cls, df, gap=SESSION_GAP_SECONDS):
+        """Sessions of a loaded event frame"""
+        if df.empty or 'timestamp' not in df.columns:
+            return cls.empty()
+        return cls.from_events(*_frame_times(df)).merged(gap)
+
+    @classmethod
+    def concat(cls, tables):
+        tables = [table for table in tables if len(table)]
+        if not tables:
+            return cls.empty()
+        if len(tables) == 1:
+            return tables[0]
+        return cls(
+            pd.concat([table.frame for table in tables], ignore_index=True),
+            np.concatenate([table.signatures for table in tables])
+        )
+
+    def take(self, rows):
+        return SessionTable(self.frame.iloc[rows], self.signatures[rows])
+
+    def with_type(self, event_type):
+        """Sessions holding at least one event of a type"""
+        codes, uniques = pd.factorize(self.frame['types'].to_numpy(dtype=object))
+        hit = np.array([event_type in value.split(',') for value in uniques], dtype=bool)
+        return self.take(np.flatnonzero(hit[codes])) if len(uniques) else self
+
+    def merged(self, gap=SESSION_GAP_SECONDS):
+        """Join the sessions of a source that are at most `gap` seconds apart"""
+        if not len(self):
+            return self
+        frame = self.frame
+        codes, _ = pd.factorize(frame['source_ip'].to_numpy())
+        order = np.lexsort((frame['start'].to_numpy(), codes))
+        codes = codes[order]
+        start = frame['start'].to_numpy()[order]
+        end = frame['end'].to_numpy()[order]
+
+        # A session starts where the source changes or the gap is too long
+        breaks = np.r_[True, (np.diff(codes) != 0) | (start[1:] - end[:-1] > gap * 1_000_000)]
+        first = np.flatnonzero(breaks)
+        if len(first) == len(self):
+            return self.take(order)
+
+        return SessionTable(pd.DataFrame({
+            'source_ip': frame['source_ip'].to_numpy()[order][first],
+            'start': start[first],
+            'end': np.maximum.reduceat(end, first),
+            'events': np.add.reduceat(frame['events'].to_numpy()[order], first),
+            'items': np.add.reduceat(frame['items'].to_numpy()[order], first),
+            'tool': frame['tool'].to_numpy()[order][first],
+            'types': _union_types(frame['types'].to_numpy()[order], first),
+        }), np.minimum.reduceat(self.signatures[order], first, axis=0))
+
+    def gaps(self, gap=SESSION_GAP_SECONDS):
+        """Seconds between consecutive sessions of a source at most `gap` apart
+
+        Returns (seconds, start of the later session). On single-event
+        sessions these are the times between a source's events within
+        its sessions.
+        """
+        codes, _ = pd.factorize(self.frame['source_ip'].to_numpy())
+        order = np.lexsort((self.frame['start'].to_numpy(), codes))
+        start = self.frame['start'].to_numpy()[order]
+        between = start[1:] - self.frame['end'].to_numpy()[order][:-1]
+        inside = (np.diff(codes[order]) == 0) & (between <= gap * 1_000_000)
+        return np.maximum(between[inside], 0) / 1e6, start[1:][inside]
+
+    def window(self, start=None, end=None):
+        """Sessions starting within [start, end]"""
+        keep = np.ones(len(self), dtype=bool)
+        if start is not None:
+            keep &= self.frame['start'].to_numpy() >= to_micros(start)
+        if end is not None:
+            keep &= self.frame['start'].to_numpy() <= to_micros(end)
+        return self if keep.all() else self.take(np.flatnonzero(keep))
+
+    def durations(self):
+        """Session lengths in seconds"""
+        return (self.frame['end'].to_numpy() - self.frame['start'].to_numpy()) / 1e6
+
+    def cadence(self):
+        """log2 bucket of the mean seconds between events, -1 for single events"""
+        events = self.frame['events'].to_numpy()
+        interval = self.durations() / np.maximum(events - 1, 1)
+        return np.where(events > 1, np.round(np.log2(interval + 1)), -1).astype(np.int64)
+
+    def fingerprint(self):
+        """Hash of the session rows, identifying the table's campaign results"""
+        if self._fingerprint is None:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(np.ascontiguousarray(self.signatures).tobytes())
+            for column in SESSION_COLUMNS:
+                values = self.frame[column].to_numpy()
+                if values.dtype == object:
+                    digest.update('\n'.join(map(str, values)).encode())
+                else:
+                    digest.update(np.ascontiguousarray(values).tobytes())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def _cached(self, key, compute):
+        key = (self.fingerprint(),) + key
+        with _campaign_lock:
+            value = _campaign_cache.get(key)
+        if value is None:
+            value = compute()
+            with _campaign_lock:
+                _campaign_cache[key] = value
+                while len(_campaign_cache) > CAMPAIGN_CACHE_ENTRIES:
+                    del _campaign_cache[next(iter(_campaign_cache))]
+        return value.copy()
+
+    def campaigns(self, band=CAMPAIGN_BAND_HASHES):
+        """Campaign number of each session
+
+        Sessions with the same tool and cadence whose signatures agree on
+        all `band` values of any band are linked; the smallest session
+        index is then spread through the links until every connected
+        group carries one label.
+        """
+        return self._cached(('labels', band), lambda: self._link(band))
+
+    def _link(self, band):
+        count = len(self)
+        labels = np.arange(count)
+        if not count:
+            return labels
+
+        tools, _ = pd.factorize(self.frame['tool'].to_numpy())
+        context = _mix(tools.astype(np.uint64) << np.uint64(8) ^ (self.cadence() + 1).astype(np.uint64))
+        groups = []
+        for i in range(0, self.signatures.shape[1] - band + 1, band):
+            values = self.signatures[:, i:i + band]
+            rows = np.flatnonzero(values[:, 0] != EMPTY)
+            key = context[rows] ^ np.uint64(i)
+            for column in values[rows].T:
+                key = _mix(key ^ column.astype(np.uint64))
+            codes, _ = pd.factorize(key)
+            order = np.argsort(codes, kind='stable')
+            first = np.flatnonzero(np.r_[True, np.diff(codes[order]) != 0])
+            # Bands nobody else shares link nothing
+            sizes = np.diff(np.r_[first, len(order)])
+            shared = np.repeat(sizes > 1, sizes)
+            if shared.any():
+                groups.append((rows[order][shared], np.repeat(np.arange(len(first))[sizes > 1], sizes[sizes > 1])))
+
+        while groups:
+            previous = labels
+            for rows, group in groups:
+                smallest = np.full(group[-1] + 1, count)
+                np.minimum.at(smallest, group, labels[rows])
+                labels = labels.copy()
+                labels[rows] = np.minimum(labels[rows], smallest[group])
+            labels = labels[labels]
+            if np.array_equal(labels, previous):
+                break
+        return pd.factorize(labels)[0]
+
+    def campaign_summary(self, labels=None, min_sources=2):
+        """One row per campaign of at least `min_sources` sources, largest first
+
+        Summaries of the table's own campaigns (labels=None) are cached.
+        """
+        if labels is None:
+            return self._cached(('summary', min_sources), lambda: self._summary(self.campaigns(), min_sources))
+        return self._summary(labels, min_sources)
+
+    def _summary(self, labels, min_sources):
+        frame = self.frame.assign(campaign=labels, cadence=self.cadence())
+        summary = frame.groupby('campaign').agg(
+            sessions=('start', 'size'),
+            sources=('source_ip', 'nunique'),
+            events=('events', 'sum'),
+            first_seen=('start', 'min'),
+            last_seen=('end', 'max'),
+            tool=('tool', 'first'),
+            types=('types', 'first'),
+            cadence=('cadence', 'first'),
+        )
+        summary = summary[summary['sources'] >= min_sources].sort_values(['sources', 'events'], ascending=False)
+        summary['first_seen'] = pd.to_datetime(summary['first_seen'], unit='us')
+        summary['last_seen'] = pd.to_datetime(summary['last_seen'], unit='us')
+        # Cadence bucket back to a typical interval between events
+        summary['interval'] = np.where(summary['cadence'] >= 0, 2.0 ** summary['cadence'] - 1, np.nan)
+        return summary.drop(columns='cadence').reset_index()
+
+    def to_dict(self):
+        data = {column: self.frame[column].tolist() for column in SESSION_COLUMNS}
+        # One string instead of a list per session keeps the JSON small
+        data['signatures'] = base64.b64encode(self.signatures.astype('<u4').tobytes()).decode('ascii')
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        if not data['start']:
+            return cls.empty()
+        frame = pd.DataFrame({column: data[column] for column in SESSION_COLUMNS})
+        frame = frame.astype({'start': np.int64, 'end': np.int64, 'events': np.int64, 'items': np.int64})
+        signatures = np.frombuffer(base64.b64decode(data['signatures']), dtype='<u4')
+        return cls(frame, signatures.reshape(len(frame), len(SEEDS)).astype(np.uint32))
+
+
+class SessionBucket:
+    """Sessions that started in one hour and the hour's distributions"""
+
+    def __init__(self):
+        self.parts = []
+        self.distributions = _sketches()
+
+    def table(self):
+        table = SessionTable.concat(self.parts)
+        self.parts = [table]
+        return table
+
+    def merge(self, other):
+        self.parts.append(other.table())
+        for name, sketch in other.distributions.items():
+            self.distributions[name].merge(sketch)
+        return self
+
+    def to_dict(self):
+        data = self.table().to_dict()
+        data['distributions'] = {name: sketch.to_dict() for name, sketch in self.distributions.items()}
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        bucket = cls()
+        bucket.parts = [SessionTable.from_dict(data)]
+        for name, sketch in data['distributions'].items():
+            bucket.distributions[name] = KLL.from_dict(sketch)
+        return bucket
+
+
+class SessionStore(BucketStore):
+    """Closed sessions per hour of their start, open ones in the manifest"""
+
+    version = 2
+    bucket_class = SessionBucket
+
+    def __init__(self, session_dir=SESSION_DIR, log_file=MAIN_LOG_FILE, gap=SESSION_GAP_SECONDS):
+        self.gap = gap
+        self._pending = []
+        super().__init__(session_dir, log_file)
+
+    def new_manifest(self):
+        manifest = super().new_manifest()
+        manifest['open'] = SessionTable.empty().to_dict()
+        manifest['watermark'] = None
+        return manifest
+
+    def reset(self):
+        with self._lock:
+            self._pending = []
+            super().reset()
+
+    def rollback(self):
+        with self._lock:
+            self._pending = []
+            super().rollback()
+
+    def add(self, offset, event):
+        timestamp = event.get('_timestamp') or parse_timestamp(event.get('timestamp'))
+        if timestamp is None or not event.get('source_ip'):
+            return
+        self._pending.append((to_micros(timestamp),) + tuple(event.get(field) for field in EVENT_FIELDS))
+
+    def flush(self, checkpoint):
+        with self._lock:
+            if self._pending:
+                events = pd.DataFrame(self._pending, columns=('time',) + EVENT_FIELDS)
+                self._pending = []
+                times = events['time'].to_numpy()
+                fragments = SessionTable.concat([
+                    SessionTable.from_dict(self.manifest['open']),
+                    SessionTable.from_events(events, times),
+                ])
+                sessions = fragments.merged(self.gap)
+
+                ordered = np.sort(times)
+                previous = self.manifest['watermark']
+                between = np.diff(ordered if previous is None else np.r_[previous, ordered])
+                self._observe('interarrival', np.maximum(between, 0) / 1e6, ordered[len(ordered) - len(between):])
+                self._observe('source_interarrival', *fragments.gaps(self.gap))
+                sizes, present = _request_bytes(events)
+                self._observe('request_bytes', sizes, times[present])
+
+                # Sessions idle for longer than the gap can no longer grow
+                watermark = max(int(sessions.frame['end'].max()), previous or 0)
+                closed = sessions.frame['end'].to_numpy() < watermark - self.gap * 1_000_000
+                self._close(sessions.take(np.flatnonzero(closed)))
+                self.manifest['open'] = sessions.take(np.flatnonzero(~closed)).to_dict()
+                self.manifest['watermark'] = watermark
+            super().flush(checkpoint)
+
+    def _bucket(self, hour):
+        key = bucket_key(EPOCH + pd.Timedelta(hours=hour).to_pytimedelta())
+        if key not in self.buckets:
+            self.buckets[key] = SessionBucket()
+        self._dirty.add(key)
+        return self.buckets[key]
+
+    def _observe(self, name, values, times):
+        """Add values to the sketches of the hours of their times"""
+        hours = np.asarray(times, dtype=np.int64) // HOUR_MICROS
+        if not len(hours):
+            return
+        order = np.argsort(hours, kind='stable')
+        hours, values = hours[order], np.asarray(values, dtype=float)[order]
+        first = np.flatnonzero(np.r_[True, np.diff(hours) != 0])
+        for start, end in zip(first.tolist(), np.r_[first[1:], len(hours)].tolist()):
+            self._bucket(int(hours[start])).distributions[name].update(values[start:end])
+
+    def _close(self, table):
+        """Add closed sessions to the buckets of the hours they started in"""
+        hours = table.frame['start'].to_numpy() // HOUR_MICROS
+        for hour in np.unique(hours).tolist():
+            self._bucket(hour).parts.append(table.take(np.flatnonzero(hours == hour)))
+        self._observe('session_length', table.durations(), table.frame['start'].to_numpy())
+        self._observe('session_events', table.frame['events'].to_numpy(), table.frame['start'].to_numpy())
+
+    def table(self, start=None, end=None):
+        """SessionTable of the closed and open sessions starting in a window"""
+        with self._lock:
+            closed = self.window(start, end).table()
+            current = SessionTable.from_dict(self.manifest['open'])
+        return SessionTable.concat([closed, current]).window(start, end)
+
+    def distributions(self, start=None, end=None):
+        """KLL sketches of the DISTRIBUTIONS over the hours overlapping a window
+
+        Sessions count once they are closed.
+        """
+        return self.window(start, end).distributions
+
+
+def frame_distributions(df, sessions=None, gap=SESSION_GAP_SECONDS):
+    """The DISTRIBUTIONS of a loaded event frame, as sketched at ingest
+
+    `sessions` may pass the frame's SessionTable when it is already built.
+    """
+    sketches = _sketches()
+    if df.empty or 'timestamp' not in df.columns:
+        return sketches
+    df, times = _frame_times(df)
+    events = SessionTable.from_events(df, times)
+    sessions = events.merged(gap) if sessions is None else sessions
+
+    sketches['interarrival'].update(np.diff(np.sort(times)) / 1e6)
+    sketches['source_interarrival'].update(events.gaps(gap)[0])
+    sketches['session_length'].update(sessions.durations())
+    sketches['session_events'].update(sessions.frame['events'].to_numpy())
+    sketches['request_bytes'].update(_request_bytes(df)[0])
+    return sketches
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_sessions(session_dir=SESSION_DIR, log_file=MAIN_LOG_FILE):
+    """Return the process-wide SessionStore for a log file"""
+    key = (os.path.abspath(session_dir), os.path.abspath(log_file))
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = SessionStore(session_dir, log_file)
+        return _stores[key]
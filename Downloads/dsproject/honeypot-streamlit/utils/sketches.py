@@ -0,0 +1,323 @@
+"""
+Mergeable streaming sketches used by the rollup layer
+
+All sketches serialize to plain JSON-friendly dicts so they can be stored
+in per-bucket rollup files, and merge() combines sketches built on
+different buckets or sensors.
+"""
+import base64
+import hashlib
+import heapq
+import math
+import zlib
+
+import numpy as np
+
+_rng = np.random.default_rng()
+
+
+def hash64(value):
+    """Stable 64-bit hash of a value (independent of PYTHONHASHSEED)"""
+    digest = hashlib.blake2b(str(value).encode('utf-8', 'replace'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+class HyperLogLog:
+    """HyperLogLog distinct counter
+
+    With precision p the sketch uses 2**p one-byte registers and has a
+    relative standard error of about 1.04 / sqrt(2**p): roughly 1.6% for
+    the default p=12 (4 KB per sketch). Estimates within +/- 3 standard
+    errors hold with ~99.7% probability.
+    """
+
+    def __init__(self, precision=12):
+        if not 4 <= precision <= 16:
+            raise ValueError("precision must be between 4 and 16")
+        self.precision = precision
+        self._registers = np.zeros(1 << precision, dtype=np.uint8)
+        self._buffer = []
+
+    @property
+    def registers(self):
+        """Register array with all buffered values applied"""
+        if self._buffer:
+            values, self._buffer = self._buffer, []
+            self.update(values)
+        return self._registers
+
+    @property
+    def error_bound(self):
+        """Relative standard error of the estimate"""
+        return 1.04 / math.sqrt(len(self._registers))
+
+    def add(self, value):
+        """Add a value to the sketch (applied in batches)"""
+        self._buffer.append(value)
+        if len(self._buffer) >= 4096:
+            self.registers
+
+    def update(self, values):
+        """Add many values at once"""
+        if not len(values):
+            return
+        hashes = np.fromiter((hash64(v) for v in values), dtype=np.uint64, count=len(values))
+        bits = 64 - self.precision
+        index = (hashes >> np.uint64(bits)).astype(np.intp)
+        rest = hashes & np.uint64((1 << bits) - 1)
+
+        # rank = position of the leftmost 1-bit in the remaining bits
+        length = np.zeros(len(rest), dtype=np.int64)
+        for shift in (32, 16, 8, 4, 2, 1):
+            high = rest >= np.uint64(1 << shift)
+            length[high] += shift
+            rest[high] >>= np.uint64(shift)
+        length += rest > 0
+        rank = (bits - length + 1).astype(np.uint8)
+        np.maximum.at(self._registers, index, rank)
+
+    def merge(self, other):
+        """Merge another sketch of the same precision into this one"""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches with different precision")
+        np.maximum(self.registers, other.registers, out=self._registers)
+        return self
+
+    def count(self):
+        """Estimated number of distinct values added"""
+        registers = self.registers
+        m = len(registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -registers.astype(np.int32)))
+
+        zeros = int(np.count_nonzero(registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_dict(self):
+        packed = zlib.compress(self.registers.tobytes())
+        return {'p': self.precision, 'registers': base64.b64encode(packed).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['p'])
+        raw = zlib.decompress(base64.b64decode(data['registers']))
+        sketch._registers = np.frombuffer(raw, dtype=np.uint8).copy()
+        return sketch
+
+
+class SpaceSaving:
+    """Space-Saving heavy hitters summary
+
+    Tracks at most `capacity` items. Any item whose true frequency exceeds
+    N / capacity is guaranteed to be present. Each item keeps an upper
+    bound count and an error; count - error is a guaranteed lower bound.
+    Summaries are merged by adding bounds, treating an item missing from
+    a full summary as seen between zero and that summary's minimum count.
+
+    Eviction candidates come from a min-heap of (count, item) entries.
+    Counts only grow while an item is tracked, so an entry whose count is
+    behind is pushed again with the current count when it reaches the top.
+    """
+
+    def __init__(self, capacity=100):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self._heap = None
+
+    def _min_count(self):
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(self.counts.values())
+
+    def add(self, item, count=1):
+        """Count an occurrence of an item"""
+        if item in self.counts:
+            self.counts[item] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = count
+            self.errors[item] = 0
+        else:
+            victim, floor = self._pop_min()
+            del self.counts[victim]
+            del self.errors[victim]
+            self.counts[item] = floor + count
+            self.errors[item] = floor
+            heapq.heappush(self._heap, (floor + count, item))
+
+    def _pop_min(self):
+        """Remove and return the tracked item with the smallest count"""
+        if self._heap is None:
+            self._heap = [(count, item) for item, count in self.counts.items()]
+            heapq.heapify(self._heap)
+        while True:
+            count, item = heapq.heappop(self._heap)
+            current = self.counts.get(item)
+            if current == count:
+                return item, count
+            if current is not None:
+                heapq.heappush(self._heap, (current, item))
+
+    def merge(self, other):
+        """Merge another summary into this one"""
+        self_min, other_min = self._min_count(), other._min_count()
+        counts, errors = {}, {}
+        for item in set(self.counts) | set(other.counts):
+            counts[item] = self.counts.get(item, self_min) + other.counts.get(item, other_min)
+            errors[item] = self.errors.get(item, self_min) + other.errors.get(item, other_min)
+
+        keep = sorted(counts, key=counts.get, reverse=True)[:self.capacity]
+        self.counts = {item: counts[item] for item in keep}
+        self.errors = {item: errors[item] for item in keep}
+        self._heap = None
+        return self
+
+    def top(self, n=10):
+        """The n most frequent items as (item, guaranteed count) pairs"""
+        guaranteed = {item: count - self.errors[item] for item, count in self.counts.items()}
+        ranked = sorted(guaranteed.items(), key=lambda kv: kv[1], reverse=True)
+        return [(item, count) for item, count in ranked[:n] if count > 0]
+
+    def to_dict(self):
+        return {
+            'capacity': self.capacity,
+            'items': [[item, count, self.errors[item]] for item, count in self.counts.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        summary = cls(data['capacity'])
+        for item, count, error in data['items']:
+            summary.counts[item] = count
+            summary.errors[item] = error
+        return summary
+
+
+class KLL:
+    """KLL quantile sketch
+
+    Values are kept in a stack of compactors: a value at level h stands
+    for 2**h inputs. When a level outgrows its capacity (k at the top,
+    shrinking by 2/3 per level below) it is sorted and every other value,
+    from a random offset, is promoted to the level above. Each compaction
+    at level h moves any rank by at most 2**h, which keeps the rank error
+    of quantile queries around 1.7% of the count for k=200 while the
+    sketch never holds more than about 3k values. The exact minimum and maximum are kept.
+    """
+
+    def __init__(self, k=200):
+        self.k = k
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.levels = [np.empty(0)]
+        self._buffer = []
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            values = self.levels[level]
+            if len(values) >= self._capacity(level):
+                grown = level + 1 == len(self.levels)
+                if grown:
+                    self.levels.append(np.empty(0))
+                values = np.sort(values)
+                # An odd value out stays behind for the next compaction
+                keep = values[len(values) - len(values) % 2:]
+                promoted = values[_rng.integers(2):len(values) - len(values) % 2:2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+                # A new top level shrinks the capacities below it
+                level = 0 if grown else level + 1
+            else:
+                level += 1
+
+    @property
+    def compacted(self):
+        """Levels with all buffered values applied"""
+        if self._buffer:
+            values, self._buffer = self._buffer, []
+            self.update(values)
+        return self.levels
+
+    def add(self, value):
+        """Add a value to the sketch (applied in batches)"""
+        self._buffer.append(value)
+        if len(self._buffer) >= 4096:
+            self.compacted
+
+    def update(self, values):
+        """Add many values at once"""
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other):
+        """Merge another sketch into this one"""
+        levels = other.compacted
+        self.compacted
+        while len(self.levels) < len(levels):
+            self.levels.append(np.empty(0))
+        for level, values in enumerate(levels):
+            self.levels[level] = np.concatenate([self.levels[level], values])
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def quantiles(self, qs):
+        """Estimated values at ranks qs (fractions in [0, 1]), NaN when empty"""
+        qs = np.atleast_1d(np.asarray(qs, dtype=float))
+        levels = self.compacted
+        values = np.concatenate(levels)
+        if not len(values):
+            return np.full(len(qs), np.nan)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(levels)])
+        order = np.argsort(values, kind='stable')
+        ranks = np.cumsum(weights[order])
+        index = np.minimum(np.searchsorted(ranks, qs * ranks[-1], side='left'), len(values) - 1)
+        result = values[order][index]
+        # The ends are known exactly
+        result[qs <= 0] = self.min
+        result[qs >= 1] = self.max
+        return result
+
+    def quantile(self, q):
+        """Estimated value at rank q"""
+        return float(self.quantiles([q])[0])
+
+    def to_dict(self):
+        return {
+            'k': self.k,
+            'count': self.count,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+            'levels': [base64.b64encode(zlib.compress(level.astype('<f8').tobytes())).decode('ascii')
+                       for level in self.compacted],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['k'])
+        sketch.count = data['count']
+        if data['count']:
+            sketch.min, sketch.max = data['min'], data['max']
+        sketch.levels = [
+            np.frombuffer(zlib.decompress(base64.b64decode(level)), dtype='<f8').copy()
+            for level in data['levels']
+        ] or [np.empty(0)]
+        return sketch
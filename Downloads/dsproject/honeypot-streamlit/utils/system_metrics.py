@@ -0,0 +1,179 @@
+"""
+Background sampler for host and service metrics
+
+A daemon thread samples host CPU, memory and disk usage, the resource use
+of each honeypot service process and the size of the storage directories
+every METRICS_SAMPLE_SECONDS into a ring buffer of
+METRICS_HISTORY_SAMPLES entries. Pages read the latest sample and short
+histories from memory and never wait on psutil themselves.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+import psutil
+
+from config.settings import (
+    METRICS_HISTORY_SAMPLES, METRICS_SAMPLE_SECONDS, STORAGE_DIRS
+)
+
+# Service name -> script its process runs (None for this process)
+SERVICES = {
+    'SSH Honeypot': 'honeypot/ssh_honeypot.py',
+    'HTTP Honeypot': 'honeypot/http_honeypot.py',
+    'Log Processor': 'scripts/log_processor.py',
+    'Query API': 'scripts/api_server.py',
+    'Analytics Engine': None,
+}
+
+
+def directory_size(path):
+    """Total size in bytes of the files under a directory"""
+    total = 0
+    stack = [path]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    total += entry.stat(follow_symlinks=False).st_size
+            except OSError:
+                continue
+    return total
+
+
+class MetricsSampler:
+    """Samples metrics on a daemon thread into a ring buffer"""
+
+    def __init__(self, interval=METRICS_SAMPLE_SECONDS, size=METRICS_HISTORY_SAMPLES):
+        self.interval = interval
+        self.samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._processes = {}
+        self._thread = threading.Thread(target=self._run, name='metrics-sampler', daemon=True)
+        # cpu_percent(None) measures since the previous call; prime it
+        psutil.cpu_percent(interval=None)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        # Give the primed CPU counters a moment so the first sample means something
+        time.sleep(min(1, self.interval))
+        while True:
+            try:
+                sample = self.sample()
+            except Exception:
+                sample = None
+            if sample is not None:
+                with self._lock:
+                    self.samples.append(sample)
+            time.sleep(self.interval)
+
+    def _service_process(self, name, script):
+        """Running process of a service, found again if it was restarted"""
+        process = self._processes.get(name)
+        if process is not None and process.is_running():
+            return process
+        process = None
+        if script is None:
+            process = psutil.Process()
+        else:
+            for candidate in psutil.process_iter(['cmdline']):
+                cmdline = candidate.info['cmdline'] or []
+                if any(arg.replace('\\', '/').endswith(script) for arg in cmdline):
+                    process = candidate
+                    break
+        if process is not None:
+            # First call primes the per-process CPU counter
+            process.cpu_percent(interval=None)
+        self._processes[name] = process
+        return process
+
+    def _service_sample(self, name, script):
+        process = self._service_process(name, script)
+        if process is None:
+            return None
+        try:
+            with process.oneshot():
+                sockets = process.connections(kind='inet')
+                return {
+                    'pid': process.pid,
+                    'started': process.create_time(),
+                    'cpu': process.cpu_percent(interval=None),
+                    'rss': process.memory_info().rss,
+                    'threads': process.num_threads(),
+                    'sockets': len(sockets),
+                    'connections': sum(1 for socket in sockets if socket.status == psutil.CONN_ESTABLISHED),
+                }
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            self._processes.pop(name, None)
+            return None
+
+    def sample(self):
+        """Take one sample now"""
+        memory = psutil.virtual_memory()
+        return {
+            'time': time.time(),
+            'cpu': psutil.cpu_percent(interval=None),
+            'memory': memory.percent,
+            'disk': psutil.disk_usage('/').percent,
+            'storage': sum(directory_size(path) for path in STORAGE_DIRS),
+            'services': {name: self._service_sample(name, script) for name, script in SERVICES.items()},
+        }
+
+    def latest(self):
+        """Most recent sample, or None before the first one"""
+        with self._lock:
+            return self.samples[-1] if self.samples else None
+
+    def history(self, key, service=None):
+        """(times, values) of one metric over the buffered samples
+
+        Service metrics are read with service=<name>; samples where the
+        service was not running have None.
+        """
+        with self._lock:
+            samples = list(self.samples)
+        times = [sample['time'] for sample in samples]
+        if service is None:
+            return times, [sample[key] for sample in samples]
+        values = []
+        for sample in samples:
+            stats = sample['services'].get(service)
+            values.append(stats[key] if stats else None)
+        return times, values
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def get_sampler():
+    """Return the process-wide MetricsSampler, starting it on first use"""
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = MetricsSampler()
+            _sampler.start()
+        return _sampler
+
+
+def format_bytes(size):
+    """Human-readable byte count, e.g. 23.4 MB"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.1f} {unit}" if unit != 'B' else f"{size} B"
+        size /= 1024
+
+
+def format_uptime(seconds):
+    """Uptime as e.g. 2h 34m"""
+    seconds = int(seconds)
+    return f"{seconds // 3600}h {seconds % 3600 // 60}m"
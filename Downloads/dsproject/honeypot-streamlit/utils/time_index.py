@@ -0,0 +1,199 @@
+"""
+Sparse timestamp-to-offset index for time-range reads of the raw log
+
+Every TIME_INDEX_STRIDE events the index records a block: its starting
+byte offset and the smallest and largest timestamp inside it. Blocks are
+stored next to the log as `<log>.tidx` (raw int64 triples) with a small
+`<log>.tidx.json` manifest. A window query binary-searches the running
+maximum (and the reverse running minimum) of block timestamps, so it
+reads only the byte range that can hold matching events even when
+writers append slightly out of order.
+"""
+import glob
+import json
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from config.settings import MAIN_LOG_FILE, TIME_INDEX_STRIDE
+from utils.data_processor import (
+    LogConsumer, events_to_frame, file_signature, parse_timestamp,
+    read_events, write_json_atomic
+)
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_micros(timestamp):
+    """Microseconds since 1970-01-01 for a naive datetime"""
+    return (timestamp - EPOCH) // timedelta(microseconds=1)
+
+
+class TimeIndex(LogConsumer):
+    """Sparse block index over one log file"""
+
+    def __init__(self, log_file=MAIN_LOG_FILE, stride=TIME_INDEX_STRIDE):
+        super().__init__(log_file)
+        self.stride = stride
+        self.blocks_path = log_file + '.tidx'
+        self.manifest_path = log_file + '.tidx.json'
+        self._new_blocks = []
+        self._blocks = np.empty((0, 3), dtype=np.int64)
+        self._blocks_size = None
+        self.refresh()
+
+    def new_manifest(self):
+        manifest = super().new_manifest()
+        manifest['open_block'] = None
+        return manifest
+
+    def refresh(self):
+        with self._lock:
+            if os.path.exists(self.manifest_path):
+                with open(self.manifest_path, 'r') as f:
+                    self.manifest = json.load(f)
+
+    def reset(self):
+        with self._lock:
+            self._new_blocks = []
+            self.manifest = self.new_manifest()
+            with open(self.blocks_path, 'wb'):
+                pass
+            write_json_atomic(self.manifest_path, self.manifest)
+
+    def rollback(self):
+        with self._lock:
+            self._new_blocks = []
+            self.manifest = self.new_manifest()
+            self.refresh()
+
+    def add(self, offset, event):
+        timestamp = event.get('_timestamp') or parse_timestamp(event.get('timestamp'))
+        if timestamp is None:
+            return
+        micros = to_micros(timestamp)
+
+        block = self.manifest['open_block']
+        if block is None:
+            block = self.manifest['open_block'] = [offset, 0, micros, micros]
+        block[1] += 1
+        block[2] = min(block[2], micros)
+        block[3] = max(block[3], micros)
+
+        if block[1] >= self.stride:
+            self._new_blocks.append((block[0], block[2], block[3]))
+            self.manifest['open_block'] = None
+
+    def flush(self, checkpoint):
+        with self._lock:
+            if self._new_blocks:
+                with open(self.blocks_path, 'ab') as f:
+                    f.write(np.array(self._new_blocks, dtype=np.int64).tobytes())
+                self._new_blocks = []
+
+            self.manifest['checkpoint'] = checkpoint
+            if self.manifest['log_identity'] is None:
+                self.manifest['log_identity'] = self.new_manifest()['log_identity']
+            write_json_atomic(self.manifest_path, self.manifest)
+
+    def blocks(self):
+        """Indexed blocks as an (n, 3) array of [offset, min ts, max ts]"""
+        with self._lock:
+            try:
+                size = os.path.getsize(self.blocks_path)
+            except OSError:
+                size = 0
+            if size != self._blocks_size:
+                if size:
+                    self._blocks = np.fromfile(self.blocks_path, dtype=np.int64).reshape(-1, 3)
+                else:
+                    self._blocks = np.empty((0, 3), dtype=np.int64)
+                self._blocks_size = size
+
+            blocks = self._blocks
+            open_block = self.manifest.get('open_block')
+            if open_block is not None:
+                blocks = np.vstack([blocks, [[open_block[0], open_block[2], open_block[3]]]])
+            return blocks
+
+    def byte_range(self, start=None, end=None):
+        """Byte range of the indexed log that can hold events in [start, end]
+
+        Returns (first offset, stop offset); a stop offset of None means
+        "through the end of the file". Events past the checkpoint are not
+        indexed yet, so callers with a stop offset still read that tail.
+        """
+        blocks = self.blocks()
+        if not len(blocks):
+            return 0, None
+
+        first = 0
+        if start is not None:
+            running_max = np.maximum.accumulate(blocks[:, 2])
+            first = int(np.searchsorted(running_max, to_micros(start), side='left'))
+        if first >= len(blocks):
+            return self.checkpoint, None
+
+        stop = None
+        if end is not None:
+            # Blocks from `last` on only hold events newer than `end`
+            suffix_min = np.minimum.accumulate(blocks[::-1, 1])[::-1]
+            last = max(first, int(np.searchsorted(suffix_min, to_micros(end), side='right')))
+            if last < len(blocks):
+                stop = int(blocks[last, 0])
+        return int(blocks[first, 0]), stop
+
+def log_segments(log_file=MAIN_LOG_FILE):
+    """Rotated segments of a log (oldest first) followed by the live file"""
+    rotated = []
+    for path in glob.glob(glob.escape(log_file) + '.*'):
+        suffix = path[len(log_file) + 1:]
+        if re.fullmatch(r'\d+', suffix):
+            rotated.append((int(suffix), path))
+    return [path for _, path in sorted(rotated, reverse=True)] + [log_file]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_time_index(log_file=MAIN_LOG_FILE):
+    """Return the process-wide TimeIndex for a log file or segment"""
+    key = os.path.abspath(log_file)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = TimeIndex(log_file)
+        return _indexes[key]
+
+
+def read_window(start=None, end=None, log_file=MAIN_LOG_FILE):
+    """Yield (segment, offset, event) for events in [start, end] across segments
+
+    Rotated segments never change and are indexed on first use; the live
+    log's index is kept current by the Log Processor or sync_consumer().
+    """
+    for segment in log_segments(log_file):
+        if file_signature(segment) is None:
+            continue
+        index = get_time_index(segment)
+        if segment != log_file:
+            index.update()
+
+        first, stop = index.byte_range(start, end)
+        ranges = [(first, stop)]
+        if stop is not None and stop < index.checkpoint:
+            ranges.append((index.checkpoint, None))
+        for range_start, range_stop in ranges:
+            for offset, event in read_events(segment, range_start, range_stop):
+                timestamp = parse_timestamp(event.get('timestamp'))
+                if timestamp is None:
+                    continue
+                if (start is None or timestamp >= start) and (end is None or timestamp <= end):
+                    yield segment, offset, event
+
+def load_window(start=None, end=None, log_file=MAIN_LOG_FILE):
+    """Load only the events in [start, end] into a DataFrame"""
+    return events_to_frame([event for _, _, event in read_window(start, end, log_file)])
@@ -1 +1,98 @@
-# Visualization functions
+"""
+Visualization functions
+
+Time-series charts are downsampled on the server before they are sent to
+the browser: a trace never needs more points than the chart is pixels
+wide. Largest-Triangle-Three-Buckets keeps the shape of a series,
+including its peaks, and a min/max envelope keeps the exact extremes of
+every bucket.
+"""
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from config.settings import CHART_MAX_POINTS
+
+
+def _numeric(values):
+    """Float array for x values that may be datetimes or dates"""
+    values = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype=float)
+    return pd.to_datetime(values).to_numpy(dtype='datetime64[ns]').astype(np.int64).astype(float)
+
+
+def lttb_indices(x, y, max_points=CHART_MAX_POINTS):
+    """Indices of the points kept by Largest-Triangle-Three-Buckets
+
+    The first and last points are always kept. The points in between are
+    split into max_points - 2 buckets, and from each the point forming
+    the largest triangle with the previously kept point and the average
+    of the next bucket is kept.
+    """
+    n = len(y)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    x = _numeric(x)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+
+    # Average of every bucket, with the last point standing in after the last one
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    sizes = np.diff(edges)
+    average_x = np.append(sums_x / sizes, x[-1])
+    average_y = np.append(sums_y / sizes, y[-1])
+
+    kept = np.empty(max_points, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        area = np.abs(
+            (x[previous] - average_x[i + 1]) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (average_y[i + 1] - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        kept[i + 1] = previous
+    return kept
+
+
+def minmax_indices(y, max_points=CHART_MAX_POINTS):
+    """Indices of the minimum and maximum of each of max_points / 2 buckets"""
+    n = len(y)
+    if max_points >= n or max_points < 2:
+        return np.arange(n)
+
+    y = np.asarray(y, dtype=float)
+    starts = np.linspace(0, n, max_points // 2, endpoint=False).astype(np.int64)
+    bucket = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, n)))
+    # Sort by bucket, then value: each bucket's first and last entries are its extremes
+    order = np.lexsort((y, bucket))
+    ends = np.append(starts[1:], n) - 1
+    return np.unique(np.concatenate([order[starts], order[ends]]))
+
+
+def downsample(x, y, max_points=CHART_MAX_POINTS, method='lttb'):
+    """Reduce a series to at most max_points points, returning (x, y)
+
+    method is 'lttb' for line shape or 'minmax' for exact bucket extremes.
+    Series already within the budget are returned unchanged.
+    """
+    if len(y) <= max_points:
+        return x, y
+    if method == 'minmax':
+        kept = minmax_indices(y, max_points)
+    else:
+        kept = lttb_indices(x, y, max_points)
+
+    def take(values):
+        return values.iloc[kept] if isinstance(values, pd.Series) else np.asarray(values)[kept]
+    return take(x), take(y)
+
+
+def timeseries_trace(x, y, max_points=CHART_MAX_POINTS, method='lttb', **kwargs):
+    """Scatter trace of a downsampled time series"""
+    x, y = downsample(x, y, max_points, method)
+    return go.Scatter(x=x, y=y, **kwargs)